@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+聚合插件开销基准测试 - 比较不启用插件、启用单个内置插件和全部插件时的扫描耗时
+
+用法: python benchmarks/bench_aggregators.py [--dirs 2000] [--files 50] [--repeat 3]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.aggregators import AGGREGATORS, CounterAggregator, create_aggregators
+from src.core.size_calculator import SizeCalculator
+
+EXTENSIONS = (".txt", ".log", ".jpg", ".py", ".so", "")
+
+
+def make_tree(root: str, dirs: int, files: int, fanout: int = 8) -> int:
+    """生成固定形状的测试目录树（扩展名和大小各不相同），返回条目总数"""
+    paths = [root]
+    for i in range(1, dirs):
+        parent = paths[(i - 1) // fanout]
+        path = os.path.join(parent, f"d{i}")
+        os.mkdir(path)
+        paths.append(path)
+
+    for path in paths:
+        for j in range(files):
+            with open(os.path.join(path, f"f{j}{EXTENSIONS[j % len(EXTENSIONS)]}"), "wb") as f:
+                f.write(b"x" * (j * 37 % 5000))
+    return dirs * (files + 1)
+
+
+def best_time(names, root: str, repeat: int):
+    """多次扫描取最短耗时，返回 (耗时, 计算器, 目录树)"""
+    best = None
+    calculator = tree = None
+    for _ in range(repeat):
+        calculator = SizeCalculator(aggregators=create_aggregators(names))
+        start = time.perf_counter()
+        tree = calculator.build_tree(root)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, calculator, tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="notos-bench-")
+    try:
+        entries = make_tree(root, args.dirs, args.files)
+        print(f"测试树: {entries} 个条目")
+        best_time([], root, 1)  # 预热目录项缓存
+
+        baseline, _, _ = best_time([], root, args.repeat)
+        print(f"{'插件':<28}{'耗时(s)':>10}{'条目/秒':>14}{'开销':>10}")
+        print(f"{'(无)':<28}{baseline:>10.3f}{entries / baseline:>14.0f}{'-':>10}")
+
+        for names in [[name] for name in AGGREGATORS] + [list(AGGREGATORS)]:
+            elapsed, calculator, tree = best_time(names, root, args.repeat)
+            # 每个计数插件的统计之和应等于整棵树的文件数和大小（age按访问时间分段的部分）
+            for name in names:
+                if not issubclass(AGGREGATORS[name], CounterAggregator):
+                    continue
+                state = calculator.aggregation.state(tree, name)
+                counts = [entry for key, entry in state.items() if name != "age" or key[0] == "atime"]
+                if (sum(count for count, _ in counts), sum(size for _, size in counts)) != \
+                        (calculator.stats.files, tree.size):
+                    print(f"结果不一致: {name}")
+                    return 1
+            label = "+".join(names)
+            print(f"{label:<28}{elapsed:>10.3f}{entries / elapsed:>14.0f}{elapsed / baseline - 1:>10.1%}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
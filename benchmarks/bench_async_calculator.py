@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+高延迟文件系统基准测试 - 用注入延迟的内存假文件系统比较串行、线程池和asyncio后端
+
+用法: python benchmarks/bench_async_calculator.py [--dirs 2000] [--files 20] [--latency 2] [--capacity 32]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.size_calculator import DirectoryListing, SizeCalculator
+from src.core.async_calculator import AsyncSizeCalculator
+from src.models.scan_stats import ScanStats
+
+
+class FakeFileSystem:
+    """内存中的假文件系统 - 每次目录读取注入一次往返延迟
+
+    服务端可同时处理capacity个请求，超过后延迟按排队长度线性增长，
+    用来检验自适应并发能否停在服务端饱和点附近。
+    """
+
+    def __init__(self, root: str, dirs: int, files: int, fanout: int, latency: float, capacity: int):
+        self.latency = latency
+        self.capacity = capacity
+        self.calls = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.tree = {root: []}
+        paths = [root]
+        for i in range(1, dirs):
+            parent = paths[(i - 1) // fanout]
+            path = os.path.join(parent, f"d{i}")
+            self.tree[parent].append(f"d{i}")
+            self.tree[path] = []
+            paths.append(path)
+        self.files = [(f"f{j}", j % 7) for j in range(files)]
+        self.total = dirs * sum(size for _, size in self.files)
+
+    def list_directory(self, path: str) -> DirectoryListing:
+        """模拟一次scandir往返（time.sleep与真实的网络等待一样释放GIL）"""
+        with self._lock:
+            self._in_flight += 1
+            self.calls += 1
+            queued = self._in_flight
+        try:
+            time.sleep(self.latency * max(1.0, queued / self.capacity))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        stats = ScanStats(scandir_calls=1, directories=1, files=len(self.files))
+        return DirectoryListing(list(self.files), list(self.tree[path]), stats)
+
+
+def on_fake_fs(calculator_class, fs: FakeFileSystem):
+    """生成一个从假文件系统读取目录的计算器子类"""
+    class FakeBackedCalculator(calculator_class):
+        def _list_directory(self, path):
+            return fs.list_directory(path)
+    return FakeBackedCalculator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=2.0, help="每次目录读取的往返延迟(毫秒)")
+    parser.add_argument("--capacity", type=int, default=32, help="服务端可同时处理的请求数")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-concurrency", type=int, default=128)
+    args = parser.parse_args()
+
+    root = "/fake"
+    fs = FakeFileSystem(root, args.dirs, args.files, args.fanout, args.latency / 1000, args.capacity)
+    print(f"假文件系统: {args.dirs} 个目录, 延迟 {args.latency}ms, 服务端并发 {args.capacity}")
+
+    candidates = [
+        ("serial", lambda: on_fake_fs(SizeCalculator, fs)()),
+        (f"thread x{args.workers}", lambda: on_fake_fs(SizeCalculator, fs)(workers=args.workers)),
+        ("async adaptive", lambda: on_fake_fs(AsyncSizeCalculator, fs)(max_concurrency=args.max_concurrency)),
+    ]
+
+    print(f"{'后端':<18}{'耗时(s)':>10}{'目录/秒':>12}{'并发':>8}")
+    for label, factory in candidates:
+        calculator = factory()
+        start = time.perf_counter()
+        tree = calculator.build_tree(root)
+        elapsed = time.perf_counter() - start
+        if tree.size != fs.total:
+            print(f"结果不一致: {label} = {tree.size}, 预期 {fs.total}")
+            return 1
+        concurrency = getattr(calculator, "peak_concurrency", None) or calculator.workers
+        print(f"{label:<18}{elapsed:>10.3f}{args.dirs / elapsed:>12.0f}{concurrency:>8}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+多进程扫描后端基准测试 - 比较不同进程数下的扫描吞吐
+
+用法: python benchmarks/bench_process_calculator.py [--dirs 2000] [--files 50] [--processes 1,2,4,8]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.size_calculator import SizeCalculator
+from src.core.process_calculator import ProcessSizeCalculator
+
+
+def make_tree(root: str, dirs: int, files: int, fanout: int = 8) -> int:
+    """生成固定形状的测试目录树，返回条目总数"""
+    paths = [root]
+    for i in range(1, dirs):
+        parent = paths[(i - 1) // fanout]
+        path = os.path.join(parent, f"d{i}")
+        os.mkdir(path)
+        paths.append(path)
+
+    for path in paths:
+        for j in range(files):
+            with open(os.path.join(path, f"f{j}"), "wb") as f:
+                f.write(b"x" * (j % 7))
+    return dirs * (files + 1)
+
+
+def timed(calculator, path):
+    """执行一次扫描并计时"""
+    start = time.perf_counter()
+    tree = calculator.build_tree(path)
+    return time.perf_counter() - start, tree.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=50)
+    default_processes = sorted({1, 2, 4, os.cpu_count() or 1})
+    parser.add_argument("--processes", default=",".join(map(str, default_processes)))
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="notos-bench-")
+    try:
+        entries = make_tree(root, args.dirs, args.files)
+        print(f"测试树: {entries} 个条目, CPU核心数: {os.cpu_count()}")
+
+        baseline, expected = timed(SizeCalculator(), root)
+        print(f"{'后端':<16}{'耗时(s)':>10}{'条目/秒':>14}{'加速比':>10}")
+        print(f"{'serial':<16}{baseline:>10.3f}{entries / baseline:>14.0f}{1.0:>10.2f}")
+
+        for count in (int(p) for p in args.processes.split(",")):
+            elapsed, total = timed(ProcessSizeCalculator(processes=count), root)
+            if total != expected:
+                print(f"结果不一致: process x{count} = {total}, serial = {expected}")
+                return 1
+            label = f"process x{count}"
+            print(f"{label:<16}{elapsed:>10.3f}{entries / elapsed:>14.0f}{baseline / elapsed:>10.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+扫描核心基准套件 - 在各种形状的合成树上比较各扫描方式，并与 du -s 对照
+
+每次测量在新的子进程中进行，子进程结束前报告自身的峰值RSS（多进程后端只含主进程）；取多次中最短的耗时。
+报告 条目/秒、每条目系统调用数、峰值RSS 和相对 du 的耗时比，可保存为JSON作为以后比较的基线。
+
+目标:
+    serial   单线程 SizeCalculator
+    threads  线程池 SizeCalculator（Settings.SCAN_WORKERS）
+    process  多进程后端
+    engine   ScanEngine（图形界面 DiskAnalyzer 运行的同一路径：含聚合插件、压缩目录树和生成结果）
+    du       du -s（只有耗时，最先运行）
+
+用法: python benchmarks/bench_scan_suite.py [--shapes wide,tiny] [--targets serial,threads,du] [--scale 1.0]
+                                            [--repeat 3] [--save out.json] [--baseline out.json]
+                                            [--max-regression 0.15] [--max-du-ratio 10]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_tree import SHAPES, TreeGenerator, remove_tree
+
+TARGETS = ("serial", "threads", "process", "engine", "du")
+
+
+def peak_rss() -> int:
+    """当前进程的峰值RSS（字节）- Linux上读取VmHWM，exec时重置，不含fork前父进程的内存"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def run_target(target: str, root: str) -> dict:
+    """在当前进程执行一次扫描（子进程模式），返回耗时和统计"""
+    from config.settings import Settings
+    from src.core.size_calculator import SizeCalculator
+
+    start = time.perf_counter()
+    if target == "engine":
+        from src.core.engine import ScanEngine, ScanOptions
+        from src.core.tree_cache import SizeTreeCache
+
+        engine = ScanEngine(SizeTreeCache(compact=Settings.COMPACT_TREES), options=ScanOptions())
+        result = engine.scan(root)
+        stats, size = result.scan_stats, result.total_size
+    else:
+        if target == "process":
+            from src.core.process_calculator import ProcessSizeCalculator
+            calculator = ProcessSizeCalculator(processes=Settings.SCAN_PROCESSES)
+        else:
+            calculator = SizeCalculator(workers=Settings.SCAN_WORKERS if target == "threads" else 1)
+        tree = calculator.build_tree(root)
+        stats, size = calculator.stats, tree.size
+    return {"seconds": time.perf_counter() - start, "size": size, "syscalls": stats.syscalls,
+            "files": stats.files, "errors": stats.errors, "rss": peak_rss()}
+
+
+def measure(target: str, root: str) -> dict:
+    """在子进程中测量一次"""
+    if target == "du":
+        # 有无法读取的目录时du返回1，耗时仍然有效
+        start = time.perf_counter()
+        subprocess.run(["du", "-s", root], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return {"seconds": time.perf_counter() - start}
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", target, root],
+                            cwd=project_root, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{target} 扫描失败: {output.stderr.strip()}")
+    return json.loads(output.stdout)
+
+
+def best_of(target: str, root: str, repeat: int) -> dict:
+    """多次测量，耗时和RSS各取最小值"""
+    runs = [measure(target, root) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["seconds"])
+    if target != "du":
+        best["rss"] = min(run["rss"] for run in runs)
+    return best
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """与基线比较吞吐和峰值RSS，返回超出阈值的说明"""
+    failures = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None or key.endswith("/du"):
+            continue
+        if current["entries_per_second"] < previous["entries_per_second"] * (1 - max_regression):
+            failures.append(f"{key}: 吞吐 {current['entries_per_second']:,.0f}/s，"
+                            f"基线 {previous['entries_per_second']:,.0f}/s")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + max_regression):
+            failures.append(f"{key}: 峰值RSS {current['peak_rss_mb']:.1f} MB，基线 {previous['peak_rss_mb']:.1f} MB")
+    return failures
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        print(json.dumps(run_target(sys.argv[2], sys.argv[3])))
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--targets", default="serial,threads,engine,du")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="把结果保存为JSON（可作为以后的基线）")
+    parser.add_argument("--baseline", help="与之前保存的结果比较")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="吞吐下降或峰值RSS增长超过该比例时失败（需要 --baseline）")
+    parser.add_argument("--max-du-ratio", type=float, default=None, help="耗时超过 du 的该倍数时失败")
+    args = parser.parse_args()
+
+    shapes = args.shapes.split(",")
+    targets = args.targets.split(",")
+    for name in shapes + targets:
+        if name not in SHAPES + TARGETS:
+            parser.error(f"未知的形状或目标: {name}")
+    if "du" in targets:
+        targets.remove("du")
+        if shutil.which("du") is None:
+            print("未找到 du，跳过对照")
+        else:
+            targets.insert(0, "du")  # 先测du，其余目标才能给出相对耗时
+
+    results = {}
+    failures = []
+    workspace = tempfile.mkdtemp(prefix="notos-suite-")
+    try:
+        print(f"{'形状/目标':<20}{'条目':>10}{'耗时(s)':>10}{'条目/秒':>12}{'调用/条目':>10}{'RSS(MB)':>10}{'相对du':>8}")
+        for shape in shapes:
+            root = os.path.join(workspace, shape)
+            spec = TreeGenerator(root, args.scale, args.seed).generate(shape)
+            files, size = spec.reachable()
+            # 预热目录项缓存，之后各目标读取的都是内存中的元数据
+            run_target("serial", root)
+
+            du_seconds = None
+            for target in targets:
+                run = best_of(target, root, args.repeat)
+                key = f"{shape}/{target}"
+                entry = {
+                    "entries": spec.entries,
+                    "seconds": run["seconds"],
+                    "entries_per_second": spec.entries / run["seconds"],
+                    "syscalls_per_entry": run["syscalls"] / spec.entries if "syscalls" in run else None,
+                    "peak_rss_mb": run["rss"] / 1024 ** 2 if "rss" in run else None,
+                }
+                results[key] = entry
+                if target == "du":
+                    du_seconds = run["seconds"]
+                elif (run["files"], run["size"]) != (files, size):
+                    failures.append(f"{key}: 结果 {run['files']} 个文件/{run['size']} 字节，"
+                                    f"预期 {files}/{size}")
+
+                ratio = f"{run['seconds'] / du_seconds:.1f}x" if du_seconds and target != "du" else "-"
+                calls = f"{entry['syscalls_per_entry']:.2f}" if entry["syscalls_per_entry"] is not None else "-"
+                rss = f"{entry['peak_rss_mb']:.1f}" if entry["peak_rss_mb"] is not None else "-"
+                print(f"{key:<20}{spec.entries:>10,}{run['seconds']:>10.3f}{entry['entries_per_second']:>12,.0f}"
+                      f"{calls:>10}{rss:>10}{ratio:>8}")
+
+            if du_seconds and args.max_du_ratio is not None:
+                for target in targets:
+                    key = f"{shape}/{target}"
+                    if target != "du" and results[key]["seconds"] > du_seconds * args.max_du_ratio:
+                        failures.append(f"{key}: 耗时为 du 的 {results[key]['seconds'] / du_seconds:.1f} 倍")
+            remove_tree(root)
+    finally:
+        remove_tree(workspace)
+
+    report = {"scale": args.scale, "seed": args.seed, "results": results}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("scale"), baseline.get("seed")) != (args.scale, args.seed):
+            print("基线的规模或种子不同，跳过比较")
+        else:
+            failures += compare(results, baseline["results"], args.max_regression)
+
+    for failure in failures:
+        print(f"失败: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+启动基准测试 - 测量模块导入耗时，以及offscreen平台下从进程启动到首帧、磁盘列表、饼图就绪的时间
+
+每次测量都在新的子进程中进行（模块缓存不共享），取多次的中位数。
+需要PyQt5和matplotlib；只测导入时可用 --imports-only。
+
+用法: python benchmarks/bench_startup.py [--repeat 5] [--json] [--max-first-frame 秒]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(int(any(name.startswith(("matplotlib", "psutil")) for name in sys.modules)))
+"""
+
+# 子进程中启动主窗口，记录各阶段相对于脚本开始（导入之前）的时间，以JSON输出
+STARTUP_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+times = {}
+
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+from src.gui.main_window import MainWindow
+times["import"] = time.perf_counter() - start
+
+app = QApplication(sys.argv)
+window = MainWindow()
+
+
+def finish():
+    print(json.dumps(times))
+    sys.stdout.flush()
+    window.analysis_service.shutdown()
+    os._exit(0)
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "first_frame" not in times:
+            times["first_frame"] = time.perf_counter() - start
+        return False
+
+
+def on_disks(result):
+    # 列表在同一轮事件中更新，下一轮时已完成
+    QTimer.singleShot(0, lambda: times.setdefault("disk_list", time.perf_counter() - start))
+
+
+def poll_chart():
+    # 分析出错时主窗口弹出模态对话框，定时器在其事件循环中仍会触发，记录错误后立即结束而不是等到超时
+    dialog = QApplication.activeModalWidget()
+    if dialog is not None:
+        times["error"] = dialog.text() if hasattr(dialog, "text") else dialog.windowTitle()
+        finish()
+    if window.chart_widget.canvas is not None and "disk_list" in times:
+        times["chart"] = time.perf_counter() - start
+        finish()
+
+
+paint_filter = FirstPaint()
+window.installEventFilter(paint_filter)
+window.analysis_service.analysis_finished.connect(on_disks)
+poller = QTimer()
+poller.timeout.connect(poll_chart)
+poller.start(5)
+QTimer.singleShot(int({timeout} * 1000), finish)
+window.show()
+app.exec_()
+"""
+
+
+def run_child(script: str, env=None) -> str:
+    output = subprocess.run([sys.executable, "-c", script], cwd=project_root, env=env,
+                            capture_output=True, text=True, check=True)
+    return output.stdout
+
+
+def measure_import(module: str):
+    """返回 (导入耗时, 是否顺带导入了matplotlib/psutil)"""
+    lines = run_child(IMPORT_SCRIPT.format(module=module)).split()
+    return float(lines[0]), lines[1] == "1"
+
+
+def measure_startup(timeout: float) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    return json.loads(run_child(STARTUP_SCRIPT.replace("{timeout}", str(timeout)), env).strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0, help="单次启动测量的超时(秒)")
+    parser.add_argument("--imports-only", action="store_true", help="只测量导入，不启动窗口")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果，便于长期记录")
+    parser.add_argument("--max-first-frame", type=float, default=None, help="首帧时间超过该值(秒)时返回1")
+    args = parser.parse_args()
+
+    results = {}
+    heavy = {}
+    modules = ["src.cli"] if args.imports_only else ["src.cli", "src.gui.main_window"]
+    for module in modules:
+        samples = [measure_import(module) for _ in range(args.repeat)]
+        results[f"import {module}"] = statistics.median(elapsed for elapsed, _ in samples)
+        heavy[module] = any(loaded for _, loaded in samples)
+
+    errors = []
+    if not args.imports_only:
+        runs = [measure_startup(args.timeout) for _ in range(args.repeat)]
+        errors = sorted({run["error"] for run in runs if "error" in run})
+        for phase in ("import", "first_frame", "disk_list", "chart"):
+            values = [run[phase] for run in runs if phase in run]
+            if values:
+                results[phase] = statistics.median(values)
+
+    if args.json:
+        print(json.dumps({"seconds": results, "heavy_imports": heavy, "errors": errors}, ensure_ascii=False))
+    else:
+        print(f"{'阶段':<32}{'中位数(ms)':>12}")
+        for phase, seconds in results.items():
+            print(f"{phase:<32}{seconds * 1000:>12.1f}")
+        for name, loaded in heavy.items():
+            if loaded:
+                print(f"注意: {name} 导入了 matplotlib/psutil")
+        for message in errors:
+            print(f"启动后分析失败，磁盘列表和饼图未测量: {message}")
+
+    if errors:
+        return 1
+
+    if args.max_first_frame is not None and results.get("first_frame", 0) > args.max_first_frame:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+目录树内存基准测试 - 比较每个节点在DiskItem列表、SizeNode树和列式TreeStore中占用的字节数，
+以及重新扫描一个子目录后把结果并入TreeStore的耗时（整棵还原再压缩 vs 原地拼接）
+
+用法: python benchmarks/bench_tree_memory.py [--dirs 20000] [--files 50] [--fanout 16]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.models.disk_item import DiskItem
+from src.models.size_node import SizeNode
+from src.models.tree_store import TreeStore
+
+
+def make_size_tree(root: str, dirs: int, files: int, fanout: int) -> SizeNode:
+    """在内存中生成固定形状的SizeNode树（不访问磁盘）"""
+    nodes = [SizeNode(root, "directory")]
+    for i in range(1, dirs):
+        parent = nodes[(i - 1) // fanout]
+        nodes.append(parent.add_child(SizeNode(f"dir_{i:07d}", "directory")))
+    for node in nodes:
+        for j in range(files):
+            node.add_child(SizeNode(f"file_{j:05d}.dat", "file", 4096 + j))
+    for node in reversed(nodes):
+        node.size = sum(child.size for child in node.iter_children())
+    return nodes[0]
+
+
+def make_disk_items(root: SizeNode) -> list:
+    """按当前结果模型为每个节点创建一个DiskItem（含完整路径）"""
+    items = []
+    stack = [(root, root.name)]
+    while stack:
+        node, path = stack.pop()
+        for child in node.iter_children():
+            child_path = os.path.join(path, child.name)
+            items.append(DiskItem(name=child.name, path=child_path, size=child.size, item_type=child.item_type,
+                                  percentage=child.size / node.size * 100 if node.size else 0.0,
+                                  parent_path=path))
+            if child.is_directory:
+                stack.append((child, child_path))
+    return items
+
+
+def measure(factory):
+    """返回 (对象, tracemalloc统计的新增字节数)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = factory()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def measure_refresh(store: TreeStore, files: int):
+    """重新扫描最后一个目录（只有文件）：返回 (整棵还原再压缩的秒数, 原地拼接的秒数)"""
+    index = max(i for i in range(len(store)) if store.is_directory(i))
+    subtree = SizeNode(store.path(index), "directory")
+    for j in range(files + 1):
+        subtree.add_child(SizeNode(f"file_{j:05d}.dat", "file", 4096 + j))
+    subtree.size = sum(child.size for child in subtree.iter_children())
+
+    started = time.perf_counter()
+    TreeStore.from_size_node(store.to_size_node())
+    rebuild = time.perf_counter() - started
+
+    copy, _ = store.copy()
+    started = time.perf_counter()
+    copy.splice(copy.find(subtree.name), subtree)
+    splice = time.perf_counter() - started
+    return rebuild, splice
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=20000)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--fanout", type=int, default=16)
+    args = parser.parse_args()
+
+    root_path = "/benchmark/root"
+    nodes = args.dirs * (args.files + 1)
+    print(f"合成目录树: {args.dirs} 个目录, {nodes:,} 个节点")
+
+    tree, tree_bytes = measure(lambda: make_size_tree(root_path, args.dirs, args.files, args.fanout))
+    store, store_bytes = measure(lambda: TreeStore.from_size_node(tree))
+    items, items_bytes = measure(lambda: make_disk_items(tree))
+    if len(store) != nodes or len(items) != nodes - 1:
+        print(f"节点数不一致: store={len(store)} items={len(items)}, 预期 {nodes}")
+        return 1
+
+    print(f"{'表示':<16}{'总内存(MB)':>12}{'字节/节点':>12}")
+    for label, size in (("DiskItem列表", items_bytes), ("SizeNode树", tree_bytes), ("TreeStore", store_bytes)):
+        print(f"{label:<16}{size / 1024 ** 2:>12.1f}{size / nodes:>12.1f}")
+    print(f"TreeStore数组自身: {store.nbytes / nodes:.1f} 字节/节点")
+
+    rebuild, splice = measure_refresh(store, args.files)
+    print(f"重新扫描一个目录后并入: 整棵还原再压缩 {rebuild * 1000:.1f} ms, 原地拼接 {splice * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+确定性合成目录树 - 相同的形状、规模和种子总是生成相同的树（名称、层级和文件大小）
+
+形状:
+    wide    根目录下大量子目录和文件
+    deep    很深的单链目录，每层少量文件
+    tiny    大量 0-64 字节的小文件（--scale 10 约一百万个）
+    sparse  少量很大的稀疏文件（表观大小为 GB 级，几乎不占磁盘）
+    traps   符号链接环、悬空链接、指向树外的链接、硬链接、FIFO、无权限目录、特殊文件名
+
+用法: python benchmarks/synthetic_tree.py SHAPE ROOT [--scale 1.0] [--seed 0]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import stat
+import sys
+from dataclasses import dataclass, field
+from typing import List
+
+SHAPES = ("wide", "deep", "tiny", "sparse", "traps")
+
+
+@dataclass
+class TreeSpec:
+    """生成结果 - 计数与扫描器的口径一致：普通文件和符号链接计为文件（大小取lstat），不跟随链接"""
+    shape: str
+    root: str
+    files: int = 0
+    directories: int = 0  # 不含根目录
+    bytes: int = 0  # 表观大小之和
+    unreadable: List[str] = field(default_factory=list)  # 去掉读权限的目录
+    unreadable_files: int = 0  # 无权限目录中的文件（当前用户无法读取时扫描器看不到）
+    unreadable_bytes: int = 0
+
+    @property
+    def entries(self) -> int:
+        return self.files + self.directories
+
+    def reachable(self):
+        """当前用户能扫描到的 (文件数, 字节数)，root用户不受权限限制"""
+        if all(os.access(path, os.R_OK | os.X_OK) for path in self.unreadable):
+            return self.files, self.bytes
+        return self.files - self.unreadable_files, self.bytes - self.unreadable_bytes
+
+
+class TreeGenerator:
+    """在root下生成指定形状的树，root必须不存在或为空目录"""
+
+    def __init__(self, root: str, scale: float = 1.0, seed: int = 0):
+        self.root = os.path.abspath(root)
+        self.scale = scale
+        self.rng = random.Random(seed)
+
+    def generate(self, shape: str) -> TreeSpec:
+        if shape not in SHAPES:
+            raise ValueError(f"未知的形状: {shape}")
+        os.makedirs(self.root, exist_ok=True)
+        spec = TreeSpec(shape, self.root)
+        getattr(self, f"_make_{shape}")(spec)
+        return spec
+
+    def _count(self, n: int) -> int:
+        return max(1, int(n * self.scale))
+
+    def _mkdir(self, spec: TreeSpec, path: str) -> str:
+        os.mkdir(path)
+        spec.directories += 1
+        return path
+
+    def _file(self, spec: TreeSpec, path: str, size: int):
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        spec.files += 1
+        spec.bytes += size
+
+    def _symlink(self, spec: TreeSpec, target: str, path: str):
+        os.symlink(target, path)
+        spec.files += 1
+        spec.bytes += os.lstat(path).st_size
+
+    def _make_wide(self, spec: TreeSpec):
+        for i in range(self._count(2000)):
+            directory = self._mkdir(spec, os.path.join(self.root, f"dir_{i:06d}"))
+            for j in range(10):
+                self._file(spec, os.path.join(directory, f"f{j}.dat"), self.rng.randrange(4096))
+        for j in range(self._count(5000)):
+            self._file(spec, os.path.join(self.root, f"file_{j:06d}.txt"), self.rng.randrange(4096))
+
+    def _make_deep(self, spec: TreeSpec):
+        # 两个字符的目录名，1000层时路径约3KB，仍低于PATH_MAX
+        path = self.root
+        for level in range(min(1000, self._count(400))):
+            path = self._mkdir(spec, os.path.join(path, f"d{level % 10}"))
+            for j in range(3):
+                self._file(spec, os.path.join(path, f"f{j}"), self.rng.randrange(1024))
+
+    def _make_tiny(self, spec: TreeSpec):
+        for i in range(self._count(100)):
+            directory = self._mkdir(spec, os.path.join(self.root, f"bucket_{i:05d}"))
+            for j in range(1000):
+                self._file(spec, os.path.join(directory, f"t{j:04d}"), self.rng.randrange(65))
+
+    def _make_sparse(self, spec: TreeSpec):
+        for i in range(4):
+            directory = self._mkdir(spec, os.path.join(self.root, f"images_{i}"))
+            for j in range(2):
+                path = os.path.join(directory, f"disk{j}.img")
+                size = self.rng.randrange(1, 16) << 30
+                with open(path, "wb") as f:
+                    f.truncate(size)
+                spec.files += 1
+                spec.bytes += size
+            self._file(spec, os.path.join(directory, "README"), self.rng.randrange(1024))
+
+    def _make_traps(self, spec: TreeSpec):
+        base = self._mkdir(spec, os.path.join(self.root, "links"))
+        data = self._mkdir(spec, os.path.join(base, "data"))
+        for j in range(self._count(50)):
+            self._file(spec, os.path.join(data, f"f{j}"), self.rng.randrange(8192))
+        self._symlink(spec, "..", os.path.join(data, "loop"))  # 指回上级形成环
+        self._symlink(spec, "self", os.path.join(base, "self"))  # 指向自身
+        self._symlink(spec, "missing/target", os.path.join(base, "dangling"))
+        self._symlink(spec, "/", os.path.join(base, "filesystem_root"))  # 跟随时会扫描整个文件系统
+        self._symlink(spec, data, os.path.join(base, "absolute_data"))
+
+        # 硬链接：同一inode两个名称，表观大小各计一次（与 du --apparent-size -l 相同）
+        original = os.path.join(data, "f0")
+        os.link(original, os.path.join(base, "hardlink"))
+        spec.files += 1
+        spec.bytes += os.lstat(original).st_size
+
+        if hasattr(os, "mkfifo"):
+            os.mkfifo(os.path.join(base, "fifo"))  # 既不是文件也不是目录，扫描器忽略
+
+        names = self._mkdir(spec, os.path.join(self.root, "names"))
+        for name in ("带空格 的名称", "换行\n名称", "emoji_📁", "-leading-dash", "x" * 255):
+            self._file(spec, os.path.join(names, name), self.rng.randrange(100))
+        if sys.platform.startswith("linux"):
+            # 不是合法UTF-8的文件名
+            self._file(spec, os.path.join(names, os.fsdecode(b"invalid_\xff\xfe")), 10)
+
+        locked = self._mkdir(spec, os.path.join(self.root, "locked"))
+        files, size = spec.files, spec.bytes
+        inner = self._mkdir(spec, os.path.join(locked, "inner"))
+        for j in range(self._count(20)):
+            self._file(spec, os.path.join(inner, f"secret{j}"), self.rng.randrange(4096))
+        spec.unreadable_files = spec.files - files
+        spec.unreadable_bytes = spec.bytes - size
+        os.chmod(locked, 0)
+        spec.unreadable.append(locked)
+
+
+def remove_tree(root: str):
+    """删除生成的树（先恢复无权限目录的权限）"""
+    # 自顶向下遍历，先恢复子目录权限再进入
+    for directory, dirs, _ in os.walk(root):
+        for name in dirs:
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                os.chmod(path, stat.S_IRWXU)
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("shape", choices=SHAPES)
+    parser.add_argument("root")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    spec = TreeGenerator(args.root, args.scale, args.seed).generate(args.shape)
+    print(f"{spec.shape}: {spec.directories:,} 个目录, {spec.files:,} 个文件, {spec.bytes:,} 字节 -> {spec.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import os
 import platform
 from pathlib import Path
 
@@ -23,7 +24,31 @@ class Settings:
 
     # 分析配置
     MAX_DIRECTORY_ITEMS = 50  # 最大显示目录项数，小于2%已实际影响显示，所以最大50个
-    SCAN_TIMEOUT = 30  # 扫描超时时间(秒)
+    SCAN_BUDGET_SECONDS = 30  # 单次分析的时间预算(秒)，耗尽后未读取的目录按历史估算并可继续扫描，None为不限
+    SCAN_BUDGET_DIRECTORIES = None  # 单次分析最多读取的目录数(IO预算)，None为不限
+    # 扫描排除/包含规则（写法见 src/core/scan_rules.py），被排除的目录不会被打开，排除的文件大小单独统计
+    SCAN_EXCLUDE = ["path:/proc", "path:/sys", "path:/dev"]
+    SCAN_INCLUDE = []
+    # 扫描时同时统计的聚合插件: 'age'(访问/修改时间分段和冷数据)、'extension'(按扩展名)、'size_histogram'(log2大小分布)、
+    # 'fingerprint'(子树修改时间指纹，快照对比时可发现只改了修改时间的文件)。每个插件约增加一成扫描时间，
+    # 且每个目录多保存一份状态，默认只启用界面"冷数据"按钮需要的age
+    SCAN_AGGREGATORS = ["age"]
+    SCAN_MODE = "exact"  # 'exact'(精确扫描) 或 'estimate'(先抽样估算并逐轮细化，最终得到精确值)
+    SCAN_WORKERS = min(8, (os.cpu_count() or 1) * 2)  # 并行遍历线程数，scandir/stat会释放GIL，1为单线程
+    SCAN_BACKEND = "thread"  # 扫描后端: 'thread'(线程池)、'process'(多进程，适合千万级小文件) 或 'async'(自适应并发，适合NFS/SMB)
+    SCAN_MAX_CONCURRENCY = 64  # async后端的最大在途目录读取数
+    SCAN_PROCESSES = os.cpu_count() or 1  # 多进程后端的进程数
+    PROGRESS_INTERVAL = 0.1  # 进度信号的最小间隔(秒)，即最多10次每秒
+    STREAM_RESULTS = True  # 扫描过程中是否定期推送中间结果
+    STREAM_INTERVAL = 1.0  # 中间结果的推送间隔(秒)
+    SCAN_PROFILE = False  # 是否记录扫描剖析（分阶段耗时、错误类型、工作线程利用率和队列深度），界面中按F12查看
+    SCAN_CACHE_ENABLED = True  # 是否启用持久化扫描缓存（按目录mtime增量复扫）
+    SCAN_CACHE_FILE = Path.home() / ".notos_disk_analyzer" / "scan_cache.db"
+    SCAN_DAEMON_SOCKET = None  # 扫描守护进程（main.py daemon）的套接字路径，None为默认路径；守护进程在运行时界面通过它扫描和查询，否则在本进程扫描
+    COMPACT_TREES = True  # 扫描完成的目录树压缩为列式存储（千万级节点时显著省内存，开启实时监视时不生效）
+    WATCH_ENABLED = False  # 是否用inotify实时更新已分析的目录（仅Linux）
+    WATCH_UPDATE_INTERVAL_MS = 500  # 界面刷新的最小间隔(毫秒)
+    WATCH_POLL_INTERVAL = 30  # inotify watch耗尽后，未监视目录的mtime轮询间隔(秒)
 
     @classmethod
     def get_platform_specific_settings(cls):
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 """
 磁盘空间分析工具 - 主程序入口
+
+不带参数时启动图形界面；`main.py scan PATH ...` 为命令行扫描，`main.py diff 旧.nsnap 新` 对比两次扫描，
+`main.py dupes PATH` 查找重复文件，`main.py daemon` 运行供多个客户端共享的扫描守护进程，
+都不导入Qt（见 src/cli.py）；
+`main.py 快照.nsnap` 启动图形界面并打开命令行保存的扫描快照
 """
 
 import os
@@ -10,7 +15,18 @@ import sys
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from src.gui.main_window import main
+CLI_COMMANDS = ("scan", "diff", "dupes", "daemon")
+
+
+def main():
+    """按第一个参数选择命令行或图形界面，图形界面依赖（PyQt5、matplotlib）只在需要时导入"""
+    if len(sys.argv) > 1 and (sys.argv[1] in CLI_COMMANDS or sys.argv[1] in ("-h", "--help")):
+        from src.cli import main as cli_main
+        return cli_main(sys.argv[1:])
+
+    from src.gui.main_window import main as gui_main
+    return gui_main()
+
 
 if __name__ == "__main__":
     sys.exit(main())
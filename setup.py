@@ -5,6 +5,7 @@ setup(
     version="1.0.0",
     description="A cross-platform disk space analysis tool",
     packages=find_packages(),
+    python_requires=">=3.9",
     install_requires=[
         "PyQt5>=5.15.0",
         "matplotlib>=3.5.0",
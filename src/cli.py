@@ -0,0 +1,496 @@
+"""
+命令行扫描 - 不导入Qt，适合无显示器的服务器和定时任务
+
+用法:
+    diskspace-analyzer scan PATH [--depth N] [--json] [--all] [--budget 秒] [--backend thread|process|async] [--profile]
+                                 [--snapshot FILE.nsnap [--compress zlib|lzma]]
+
+--json 时向标准输出逐行写JSON（NDJSON），每行一个记录，type字段区分:
+    start     开始扫描
+    progress  扫描进度（按 --interval 限频）
+    partial   扫描中的中间结果：根目录当前大小和最大的直接子项
+    estimate  抽样估算模式每轮的估算值
+    entry     扫描完成后深度不超过 --depth 的目录（--all 时包括文件），父目录在子项之前
+    profile   --profile 时的扫描剖析报告（分阶段耗时、错误类型、工作线程利用率、队列深度）
+    snapshot  --snapshot 时保存的快照文件和大小（图形界面可直接打开浏览）
+    summary   最后一行：总大小、统计和退出码
+    error     无法扫描时的错误说明
+否则输出与 du 类似的文本，进度写到标准错误（仅终端）。
+
+    diskspace-analyzer diff OLD.nsnap NEW [--top N] [--json]
+
+对比两次扫描：NEW 为快照文件或目录（目录时现在扫描）。只进入子树指纹不同的目录，
+输出增长和缩小最多的路径（--json 时为一条 diff 记录和若干 change 记录）。
+
+    diskspace-analyzer dupes PATH [--min-size 字节] [--json]
+
+扫描目录后在目录树中查找重复文件（见 src/core/duplicate_finder.py），摘要缓存在扫描缓存中。
+--json 时每组重复文件一条 group 记录（按可释放字节数降序），最后一条 summary 记录给出合计可释放字节数。
+
+    diskspace-analyzer daemon [--socket PATH] [--mode 600] [--warm PATH ...]
+
+在本地Unix套接字上运行扫描守护进程（见 src/core/scan_daemon.py），目录树常驻内存，
+多个图形界面或脚本共享同一份扫描结果；同一路径的并发请求只扫描一次。SIGINT/SIGTERM时退出。
+
+退出码: 0 完整扫描; 1 无法扫描; 2 参数错误; 3 预算耗尽，部分目录未读取;
+        4 部分目录无法读取（大小为下限）; 130 被中断（SIGINT/SIGTERM）
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from config.settings import Settings
+from src.core.backends import open_scan_cache
+from src.core.duplicate_finder import DuplicateFinder, DuplicateGroup
+from src.core.engine import (CancelToken, EVENT_ERROR, EVENT_PARTIAL, EVENT_PROGRESS, ScanEngine, ScanEvent,
+                             ScanOptions)
+from src.core.progress_tracker import ProgressInfo
+from src.core.scan_daemon import DaemonError, ScanDaemon
+from src.core.scan_profile import ScanProfile
+from src.core.snapshot import COMPRESSIONS, SNAPSHOT_SUFFIX, SnapshotError, read_snapshot
+from src.core.snapshot_diff import DIFF_ADDED, DIFF_REMOVED, DiffEntry, diff_snapshots
+from src.core.size_calculator import SizeCalculator
+from src.core.tree_cache import SizeTreeCache
+from src.models.analysis_result import AnalysisResult
+from src.models.disk_item import SIZE_EXACT
+from src.models.size_node import SizeNode
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2  # argparse的默认退出码
+EXIT_PARTIAL = 3
+EXIT_UNREADABLE = 4
+EXIT_INTERRUPTED = 130
+
+PARTIAL_CHILDREN = 20  # 中间结果中最多列出的直接子项数
+
+
+class RecordWriter:
+    """逐行写出记录 - 进度和中间结果可能来自扫描线程，写入时加锁，每行立即刷新以便管道下游实时读取"""
+
+    def __init__(self, stream, as_json: bool):
+        self.stream = stream
+        self.as_json = as_json
+        self.closed = False  # 下游已关闭管道（如 | head）
+        self._lock = threading.Lock()
+
+    def record(self, record_type: str, /, **fields):
+        """写出一个JSON记录，文本模式下忽略"""
+        if self.as_json:
+            self._write(json.dumps(dict(type=record_type, **fields), ensure_ascii=False))
+
+    def line(self, text: str):
+        """写出一行文本，JSON模式下忽略"""
+        if not self.as_json:
+            self._write(text)
+
+    def _write(self, text: str):
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                self.stream.write(text + "\n")
+                self.stream.flush()
+            except BrokenPipeError:
+                self.closed = True
+
+
+class ScanCommand:
+    """执行一次命令行扫描"""
+
+    def __init__(self, args: argparse.Namespace, out=None, err=None):
+        self.args = args
+        self.path = os.path.abspath(args.path)
+        self.out = RecordWriter(out or sys.stdout, args.json)
+        self.err = err or sys.stderr
+        self.show_progress = not args.json and not args.quiet and self.err.isatty()
+        self.token = CancelToken()
+        self.error: Optional[str] = None  # 引擎报告的错误（如根目录无法读取）
+
+    def run(self) -> int:
+        """扫描并输出结果，返回退出码"""
+        if not os.path.isdir(self.path):
+            return self._fail(f"不是可访问的目录: {self.path}")
+
+        options = ScanOptions(backend=self.args.backend, budget_seconds=self.args.budget,
+                              progress_interval=self.args.interval, stream_interval=self.args.interval,
+                              profile=self.args.profile)
+        # 不压缩目录树，扫描后按 --depth 遍历
+        tree_cache = SizeTreeCache()
+        engine = ScanEngine(tree_cache, None if self.args.no_cache else open_scan_cache(), options)
+        job = engine.job(self.path, token=self.token, on_event=self._on_event)
+
+        self.out.record("start", path=self.path, backend=type(job.calculator).__name__, time=time.time())
+        start = time.monotonic()
+        previous = self._install_signal_handlers()
+        try:
+            result = job.run()
+        finally:
+            self._restore_signal_handlers(previous)
+            self._clear_progress()
+        if self.error is not None:
+            return self._fail(self.error)
+
+        elapsed = time.monotonic() - start
+        stats = job.calculator.stats
+        node = tree_cache.lookup(self.path) if result is not None else None
+        frontier = tree_cache.frontier(node) if node is not None else None
+        pending = len(frontier) if frontier is not None else 0
+        if self.token.cancelled or self.out.closed:
+            code = EXIT_INTERRUPTED
+        elif pending:
+            code = EXIT_PARTIAL
+        elif stats.errors:
+            code = EXIT_UNREADABLE
+        else:
+            code = EXIT_OK
+
+        if node is not None and not self.out.closed:
+            self._write_entries(node, frontier.states if frontier is not None else {})
+        if result is not None and result.profile is not None:
+            self._write_profile(result.profile)
+        if self.args.snapshot and node is not None and not self.token.cancelled:
+            if not self._save_snapshot(engine, stats):
+                code = EXIT_ERROR
+        self.out.record("summary", path=self.path, size=node.size if node is not None else 0,
+                        elapsed=round(elapsed, 3), pending=pending, interrupted=self.token.cancelled,
+                        exit_code=code, stats=stats.to_dict(),
+                        largest_files=[(item.path, item.size) for item in result.largest_files[:self.args.largest]]
+                        if result is not None else [],
+                        aggregates=result.aggregates if result is not None else {})
+        if code == EXIT_PARTIAL:
+            self._warn(f"扫描预算已用完，{pending} 个目录未读取，大小为下限")
+        elif code == EXIT_UNREADABLE:
+            self._warn(f"{stats.errors} 个目录无法读取，大小为下限")
+        return code
+
+    def _on_event(self, event: ScanEvent):
+        """引擎事件转换为记录"""
+        if event.kind == EVENT_PROGRESS and event.progress is not None:
+            self._on_progress(event.progress)
+        elif event.kind == EVENT_PARTIAL and event.estimate is not None:
+            estimate = event.estimate
+            self.out.record("estimate", size=estimate.size, error=estimate.relative_error,
+                            directories=estimate.directories, rate=estimate.rate)
+        elif event.kind == EVENT_PARTIAL:
+            self._on_partial(event.result)
+        elif event.kind == EVENT_ERROR:
+            self.error = event.message
+
+    def _write_entries(self, root: SizeNode, states):
+        """先序输出深度不超过 --depth 的节点，同级按大小降序"""
+        for node, path, depth in self._walk(root):
+            state = states.get(node, SIZE_EXACT)
+            if self.args.json:
+                self.out.record("entry", path=path, size=node.size, kind=node.item_type, depth=depth, state=state)
+            else:
+                marker = "" if state == SIZE_EXACT else ">="
+                self.out.line(f"{marker}{SizeCalculator.format_size(node.size)}\t{path}")
+
+    def _save_snapshot(self, engine: ScanEngine, stats) -> bool:
+        """把扫描得到的整棵树保存为快照"""
+        try:
+            size = engine.save_snapshot(self.path, self.args.snapshot, self.args.compress,
+                                        metadata={"scan_stats": stats.to_dict(), "app_version": Settings.APP_VERSION})
+        except OSError as e:
+            self.out.record("error", path=self.path, message=f"无法保存快照: {e}")
+            self._warn(f"无法保存快照: {e}")
+            return False
+        self.out.record("snapshot", file=os.path.abspath(self.args.snapshot), bytes=size,
+                        compression=self.args.compress)
+        self._warn(f"快照已保存: {self.args.snapshot}（{SizeCalculator.format_size(size)}）")
+        return True
+
+    def _write_profile(self, report):
+        """剖析报告：JSON模式下为一条记录，文本模式下写到标准错误（不混入du格式的输出）"""
+        self.out.record("profile", **report)
+        if not self.args.json and not self.args.quiet:
+            self.err.write("\n".join(ScanProfile.format_report(report)) + "\n")
+
+    def _walk(self, root: SizeNode) -> Iterator[Tuple[SizeNode, str, int]]:
+        stack = [(root, root.path, 0)]
+        while stack:
+            node, path, depth = stack.pop()
+            yield node, path, depth
+            if depth >= self.args.depth:
+                continue
+            children = [child for child in node.iter_children() if self.args.all or child.is_directory]
+            children.sort(key=lambda child: child.size)
+            stack.extend((child, os.path.join(path, child.name), depth + 1) for child in children)
+
+    def _on_progress(self, info: ProgressInfo):
+        self.out.record("progress", entries=info.entries, bytes=info.bytes, elapsed=round(info.elapsed, 3),
+                        entries_per_second=round(info.entries_per_second), percent=info.percent,
+                        eta=None if info.eta is None else round(info.eta, 1))
+        if self.show_progress:
+            self.err.write(f"\r已扫描 {info.entries:,} 项 / {SizeCalculator.format_size(info.bytes)}"
+                           f" · {info.entries_per_second:,.0f} 项/秒\033[K")
+            self.err.flush()
+        if self.out.closed:
+            self.token.cancel()
+
+    def _on_partial(self, result: AnalysisResult):
+        self.out.record("partial", path=result.path, size=result.total_size,
+                        children=[{"name": item.name, "size": item.size, "kind": item.item_type,
+                                   "state": item.size_state}
+                                  for item in result.items[:PARTIAL_CHILDREN]])
+
+    def _install_signal_handlers(self):
+        """SIGINT/SIGTERM时停止扫描，已读取的部分仍然输出"""
+        def stop(signum, frame):
+            self.token.cancel()
+
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, stop)
+        return previous
+
+    @staticmethod
+    def _restore_signal_handlers(previous):
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+    def _clear_progress(self):
+        if self.show_progress:
+            self.err.write("\r\033[K")
+            self.err.flush()
+
+    def _warn(self, message: str):
+        if not self.args.quiet and not self.args.json:
+            self.err.write(message + "\n")
+
+    def _fail(self, message: str) -> int:
+        self.out.record("error", path=self.path, message=message)
+        if not self.args.json:
+            self.err.write(message + "\n")
+        return EXIT_ERROR
+
+
+class DiffCommand:
+    """对比旧快照和新快照（或现在扫描的目录）"""
+
+    STATUS_TEXT = {DIFF_ADDED: "新增", DIFF_REMOVED: "已删除"}
+
+    def __init__(self, args: argparse.Namespace, out=None, err=None):
+        self.args = args
+        self.out = RecordWriter(out or sys.stdout, args.json)
+        self.err = err or sys.stderr
+
+    def run(self) -> int:
+        """对比并输出，返回退出码"""
+        try:
+            if os.path.isdir(self.args.new):
+                # 扫描目录后与旧快照对比（扫描时计算子树指纹）
+                path = os.path.abspath(self.args.new)
+                engine = ScanEngine(SizeTreeCache(), None if self.args.no_cache else open_scan_cache(),
+                                    ScanOptions())
+                if engine.scan(path) is None:
+                    return self._fail(f"扫描失败: {path}")
+                diff = engine.diff_snapshot(self.args.old, path)
+            else:
+                diff = diff_snapshots(read_snapshot(self.args.old), read_snapshot(self.args.new))
+        except (OSError, SnapshotError, ValueError) as e:
+            return self._fail(f"无法对比: {e}")
+
+        root = diff.root
+        old_size = root.old_size if root is not None else None
+        new_size = root.new_size if root is not None else None
+        self.out.record("diff", old=diff.old_root, new=diff.new_root, old_created=diff.old_created,
+                        new_created=diff.new_created, old_size=old_size, new_size=new_size,
+                        delta=root.delta if root is not None else 0,
+                        compared=diff.compared, skipped=diff.skipped, changed=len(diff.entries))
+        if root is None:
+            self.out.line("没有变化")
+            return EXIT_OK
+
+        self.out.line(f"{diff.new_root}: {SizeCalculator.format_size(old_size)} -> "
+                      f"{SizeCalculator.format_size(new_size)} ({self._signed(root.delta)})")
+        for title, entries in (("增长最多", diff.top_growers(self.args.top)),
+                               ("缩小最多", diff.top_shrinkers(self.args.top))):
+            if entries:
+                self.out.line(f"\n{title}:")
+            for entry in entries:
+                self._write_change(entry)
+        return EXIT_OK
+
+    def _write_change(self, entry: DiffEntry):
+        self.out.record("change", path=entry.path, kind=entry.item_type, status=entry.status,
+                        old_size=entry.old_size, new_size=entry.new_size, delta=entry.delta)
+        status = self.STATUS_TEXT.get(entry.status)
+        self.out.line(f"{self._signed(entry.delta)}\t{entry.path}" + (f"\t({status})" if status else ""))
+
+    @staticmethod
+    def _signed(delta: int) -> str:
+        return ("+" if delta >= 0 else "-") + SizeCalculator.format_size(abs(delta))
+
+    def _fail(self, message: str) -> int:
+        self.out.record("error", message=message)
+        if not self.args.json:
+            self.err.write(message + "\n")
+        return EXIT_ERROR
+
+
+class DupesCommand:
+    """扫描目录并在扫描得到的目录树中查找重复文件"""
+
+    def __init__(self, args: argparse.Namespace, out=None, err=None):
+        self.args = args
+        self.path = os.path.abspath(args.path)
+        self.out = RecordWriter(out or sys.stdout, args.json)
+        self.err = err or sys.stderr
+
+    def run(self) -> int:
+        """查找并输出重复文件组，返回退出码"""
+        if not os.path.isdir(self.path):
+            return self._fail(f"不是可访问的目录: {self.path}")
+
+        scan_cache = None if self.args.no_cache else open_scan_cache()
+        tree_cache = SizeTreeCache()
+        engine = ScanEngine(tree_cache, scan_cache, ScanOptions())
+        start = time.monotonic()
+        job = engine.job(self.path)
+        node = tree_cache.lookup(self.path) if job.run() is not None else None
+        if node is None:
+            return self._fail(f"扫描失败: {self.path}")
+
+        report = DuplicateFinder(cache=scan_cache, min_size=self.args.min_size).find(node)
+        for group in report.groups:
+            self._write_group(group)
+        errors = job.calculator.stats.errors + report.errors
+        code = EXIT_UNREADABLE if errors else EXIT_OK
+        self.out.record("summary", path=self.path, groups=len(report.groups), reclaimable=report.reclaimable,
+                        candidates=report.candidates, partial_hashed=report.partial_hashed,
+                        full_hashed=report.full_hashed, cache_hits=report.cache_hits, bytes_read=report.bytes_read,
+                        errors=errors, elapsed=round(time.monotonic() - start, 3), exit_code=code)
+        self.out.line(f"{len(report.groups)} 组重复文件，可释放 {SizeCalculator.format_size(report.reclaimable)}")
+        if errors and not self.args.json:
+            self.err.write(f"{errors} 个目录或文件无法读取，结果可能不完整\n")
+        return code
+
+    def _write_group(self, group: DuplicateGroup):
+        self.out.record("group", size=group.size, digest=group.digest, count=len(group.paths),
+                        reclaimable=group.reclaimable, paths=group.paths)
+        self.out.line(f"{SizeCalculator.format_size(group.reclaimable)}\t{len(group.paths)} × "
+                      f"{SizeCalculator.format_size(group.size)}")
+        for path in group.paths:
+            self.out.line(f"\t{path}")
+
+    def _fail(self, message: str) -> int:
+        self.out.record("error", path=self.path, message=message)
+        if not self.args.json:
+            self.err.write(message + "\n")
+        return EXIT_ERROR
+
+
+class DaemonCommand:
+    """在前台运行扫描守护进程，直到收到SIGINT/SIGTERM"""
+
+    def __init__(self, args: argparse.Namespace, err=None):
+        self.args = args
+        self.err = err or sys.stderr
+        self.stopped = threading.Event()
+
+    def run(self) -> int:
+        if not ScanDaemon.is_available():
+            self.err.write("当前平台不支持Unix套接字\n")
+            return EXIT_ERROR
+        daemon = ScanDaemon(self.args.socket, mode=int(self.args.mode, 8))
+        if self.args.no_cache:
+            daemon.engine.scan_cache = None
+        try:
+            daemon.start()
+        except (DaemonError, OSError) as e:
+            self.err.write(f"无法启动守护进程: {e}\n")
+            return EXIT_ERROR
+
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, lambda signum, frame: self.stopped.set())
+        try:
+            self.err.write(f"扫描守护进程已启动: {daemon.socket_path}\n")
+            if self.args.warm:
+                daemon.warm(self.args.warm)
+            while not self.stopped.wait(1):
+                pass
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            daemon.shutdown()
+        return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="diskspace-analyzer", description=f"{Settings.APP_NAME} 命令行")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="扫描目录并输出各级大小")
+    scan.add_argument("path", help="要扫描的目录")
+    scan.add_argument("--depth", type=int, default=1, help="输出的最大深度，0只输出根目录（默认1）")
+    scan.add_argument("--json", action="store_true", help="以NDJSON流式输出")
+    scan.add_argument("--all", action="store_true", help="同时输出文件，而不只是目录")
+    scan.add_argument("--budget", type=float, default=None, help="扫描时间预算(秒)，默认不限")
+    scan.add_argument("--backend", choices=["thread", "process", "async"], default=None,
+                      help=f"扫描后端（默认 {Settings.SCAN_BACKEND}）")
+    scan.add_argument("--no-cache", action="store_true", help="不使用持久化扫描缓存")
+    scan.add_argument("--interval", type=float, default=Settings.STREAM_INTERVAL,
+                      help="进度和中间结果的输出间隔(秒)")
+    scan.add_argument("--largest", type=int, default=10, help="摘要中列出的最大文件数")
+    scan.add_argument("--snapshot", metavar="FILE", help=f"把扫描得到的整棵树保存为快照（建议扩展名 {SNAPSHOT_SUFFIX}）")
+    scan.add_argument("--compress", choices=sorted(COMPRESSIONS), default="none",
+                      help="快照压缩方式；未压缩的快照打开时直接内存映射，最快")
+    scan.add_argument("--profile", action="store_true", help="输出扫描剖析报告（各阶段耗时、错误类型、工作线程利用率）")
+    scan.add_argument("-q", "--quiet", action="store_true", help="不在标准错误输出进度和警告")
+
+    diff = commands.add_parser("diff", help="对比两次扫描，列出增长和缩小最多的路径")
+    diff.add_argument("old", help="旧的快照文件")
+    diff.add_argument("new", help="新的快照文件，或现在扫描并对比的目录")
+    diff.add_argument("--top", type=int, default=20, help="列出的增长/缩小最多的路径数（默认20）")
+    diff.add_argument("--json", action="store_true", help="以NDJSON输出")
+    diff.add_argument("--no-cache", action="store_true", help="扫描目录时不使用持久化扫描缓存")
+
+    dupes = commands.add_parser("dupes", help="扫描目录并查找重复文件")
+    dupes.add_argument("path", help="要查找的目录")
+    dupes.add_argument("--min-size", type=int, default=1, help="只比较不小于此大小的文件(字节，默认1)")
+    dupes.add_argument("--json", action="store_true", help="以NDJSON输出")
+    dupes.add_argument("--no-cache", action="store_true", help="不使用持久化扫描缓存（摘要也不缓存）")
+
+    daemon = commands.add_parser("daemon", help="运行扫描守护进程，为多个客户端提供共享的扫描结果")
+    daemon.add_argument("--socket", default=Settings.SCAN_DAEMON_SOCKET,
+                        help="Unix套接字路径（默认 $XDG_RUNTIME_DIR/notos-scan-<uid>.sock，"
+                             "没有XDG_RUNTIME_DIR时为临时目录下仅本用户可访问的 notos-scan-<uid>/scan.sock）")
+    daemon.add_argument("--mode", default="600", help="套接字文件权限（八进制，多个用户共享时如660）")
+    daemon.add_argument("--warm", nargs="+", metavar="PATH", default=[], help="启动后在后台预先扫描的目录")
+    daemon.add_argument("--no-cache", action="store_true", help="不使用持久化扫描缓存")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "diff":
+        return DiffCommand(args).run()
+    if args.command == "dupes":
+        return DupesCommand(args).run()
+    if args.command == "daemon":
+        return DaemonCommand(args).run()
+    if args.depth < 0:
+        build_parser().error("--depth 不能为负数")
+    code = ScanCommand(args).run()
+    if code == EXIT_INTERRUPTED and sys.stdout is not None:
+        # 下游关闭管道后不再向标准输出写入，避免解释器退出时再次报错
+        try:
+            sys.stdout.flush()
+        except BrokenPipeError:
+            sys.stdout = open(os.devnull, "w")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from src.models.size_node import SizeNode
+
+
+class Aggregator:
+    """单次遍历聚合插件 - 扫描时每个文件只交给插件一次
+
+    插件不保存数据，状态由create创建，由框架按目录保存：每个目录先累积其直接文件，
+    扫描结束后自底向上合并到祖先目录。状态只能包含可pickle的简单对象，
+    这样多进程后端可以在工作进程中累积、在父进程中合并。
+    merge和subtract必须互逆，子树重新扫描时用subtract从祖先中扣除旧状态。
+    """
+
+    name = ""  # 插件标识，也是结果中的键
+    title = ""  # 界面显示的名称
+
+    def create(self) -> Any:
+        """创建空状态"""
+        raise NotImplementedError
+
+    def add(self, state: Any, name: str, size: int, atime: Optional[int], mtime: Optional[int]):
+        """累积一个文件，访问/修改时间（秒）取自扫描时的lstat，未知时为None"""
+        raise NotImplementedError
+
+    def merge(self, state: Any, other: Any):
+        """把other合并到state"""
+        raise NotImplementedError
+
+    def subtract(self, state: Any, other: Any):
+        """从state中扣除other"""
+        raise NotImplementedError
+
+    def summarize(self, state: Any) -> List[Tuple[str, int, int]]:
+        """生成 (标签, 文件数, 字节数) 列表"""
+        raise NotImplementedError
+
+
+class CounterAggregator(Aggregator):
+    """按键计数的聚合器 - 状态为 {键: [文件数, 字节数]}，子类只需给出文件的键"""
+
+    def key(self, name: str, size: int):
+        """文件归入的键"""
+        raise NotImplementedError
+
+    def label(self, key) -> str:
+        """键的显示文字"""
+        return str(key)
+
+    def create(self) -> Dict[Any, List[int]]:
+        return {}
+
+    def add(self, state, name, size, atime, mtime):
+        self._count(state, self.key(name, size), size)
+
+    @staticmethod
+    def _count(state, key, size: int):
+        """键对应的文件数和字节数各加上一个文件"""
+        entry = state.get(key)
+        if entry is None:
+            state[key] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def merge(self, state, other):
+        for key, (count, size) in other.items():
+            entry = state.get(key)
+            if entry is None:
+                state[key] = [count, size]
+            else:
+                entry[0] += count
+                entry[1] += size
+
+    def subtract(self, state, other):
+        for key, (count, size) in other.items():
+            entry = state.get(key)
+            if entry is None:
+                continue
+            entry[0] -= count
+            entry[1] -= size
+            if entry[0] <= 0:
+                del state[key]
+
+    def summarize(self, state):
+        """按字节数降序"""
+        return sorted(((self.label(key), count, size) for key, (count, size) in state.items()),
+                      key=lambda row: row[2], reverse=True)
+
+
+class ExtensionAggregator(CounterAggregator):
+    """按扩展名统计字节数"""
+
+    name = "extension"
+    title = "按扩展名"
+
+    def key(self, name, size):
+        # 以点开头的隐藏文件（如 .bashrc）没有扩展名
+        dot = name.rfind('.')
+        return name[dot:].lower() if dot > 0 else ''
+
+    def label(self, key):
+        return key or "(无扩展名)"
+
+
+class SizeHistogramAggregator(CounterAggregator):
+    """按log2大小分桶的文件大小分布：第k桶为 [2^(k-1), 2^k) 字节，0字节文件在第0桶"""
+
+    name = "size_histogram"
+    title = "大小分布"
+
+    def key(self, name, size):
+        return size.bit_length()
+
+    def label(self, key):
+        if key == 0:
+            return "0 B"
+        return f"{_format_bound(1 << (key - 1))} - {_format_bound(1 << key)}"
+
+    def summarize(self, state):
+        """按桶从小到大"""
+        return [(self.label(key), count, size) for key, (count, size) in sorted(state.items())]
+
+
+class AgeAggregator(CounterAggregator):
+    """按访问时间和修改时间分段统计文件，并统计冷数据（两者都早于COLD_DAYS天）
+
+    状态的键为 ('atime', 段) / ('mtime', 段) / ('cold', True)，段为AGE_DAYS中的下标。
+    时间取自扫描时本来就会发出的lstat，不增加系统调用；年龄相对于插件创建（扫描开始）的时刻。
+    """
+
+    name = "age"
+    title = "冷数据"
+
+    AGE_DAYS = (30, 90, 365, 3 * 365)  # 分段边界（天），最后一段为超过3年
+    COLD_DAYS = 365
+    COLD_KEY = ('cold', True)
+
+    def __init__(self, now: float = None):
+        self.now = time.time() if now is None else now
+        self._bounds = [self.now - days * 86400 for days in self.AGE_DAYS]
+        self._cold_before = self.now - self.COLD_DAYS * 86400
+
+    def _segment(self, moment: int) -> int:
+        """时间点所在的分段，越旧下标越大"""
+        segment = 0
+        for bound in self._bounds:
+            if moment >= bound:
+                break
+            segment += 1
+        return segment
+
+    def add(self, state, name, size, atime, mtime):
+        if atime is None or mtime is None:
+            return
+        self._count(state, ('atime', self._segment(atime)), size)
+        self._count(state, ('mtime', self._segment(mtime)), size)
+        if atime < self._cold_before and mtime < self._cold_before:
+            self._count(state, self.COLD_KEY, size)
+
+    def label(self, key):
+        kind, segment = key
+        if kind == 'cold':
+            return f"超过{self.COLD_DAYS}天未访问且未修改"
+        action = "访问" if kind == 'atime' else "修改"
+        if segment == 0:
+            return f"{self.AGE_DAYS[0]}天内{action}"
+        if segment == len(self.AGE_DAYS):
+            return f"超过{self.AGE_DAYS[-1]}天未{action}"
+        return f"{self.AGE_DAYS[segment - 1]}-{self.AGE_DAYS[segment]}天前{action}"
+
+    def summarize(self, state):
+        """冷数据在前，然后是访问时间和修改时间各段（从新到旧）"""
+        order = {'cold': 0, 'atime': 1, 'mtime': 2}
+        return [(self.label(key), count, size)
+                for key, (count, size) in sorted(state.items(), key=lambda item: (order[item[0][0]], item[0][1]))]
+
+    @classmethod
+    def cold_bytes(cls, state) -> int:
+        """冷数据字节数"""
+        entry = state.get(cls.COLD_KEY)
+        return entry[1] if entry else 0
+
+
+class FingerprintAggregator(Aggregator):
+    """子树修改时间指纹 - 各文件 (名称, 大小, 修改时间) 散列值之和（模2^64）
+
+    求和与顺序无关，且可以直接相减，所以和其他插件一样按目录累积、向上合并、重新扫描时扣除。
+    快照用它和目录树的名称、大小、条目数一起生成每个子树的指纹（见 snapshot.fingerprint_tree），
+    对比快照时指纹相同的子树直接跳过。状态为 [散列值]，不在结果中显示。
+    """
+
+    name = "fingerprint"
+    title = "修改时间指纹"
+
+    MASK = (1 << 64) - 1
+
+    def create(self):
+        return [0]
+
+    def add(self, state, name, size, atime, mtime):
+        value = zlib.crc32(os.fsencode(name)) * 0x9E3779B97F4A7C15
+        value ^= size * 0xC2B2AE3D27D4EB4F ^ (mtime or 0) * 0x165667B19E3779F9
+        state[0] = (state[0] + value) & self.MASK
+
+    def merge(self, state, other):
+        state[0] = (state[0] + other[0]) & self.MASK
+
+    def subtract(self, state, other):
+        state[0] = (state[0] - other[0]) & self.MASK
+
+    def summarize(self, state):
+        return []
+
+
+def _format_bound(size: int) -> str:
+    """分桶边界的简短显示"""
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024:
+            return f"{size} {unit}"
+        size //= 1024
+    return f"{size} PB"
+
+
+# 内置聚合器，键为配置中使用的名称
+AGGREGATORS = {
+    ExtensionAggregator.name: ExtensionAggregator,
+    SizeHistogramAggregator.name: SizeHistogramAggregator,
+    AgeAggregator.name: AgeAggregator,
+    FingerprintAggregator.name: FingerprintAggregator,
+}
+
+
+def create_aggregators(names: Iterable[str]) -> Tuple[Aggregator, ...]:
+    """按名称创建内置聚合器"""
+    aggregators = []
+    for name in names:
+        if name not in AGGREGATORS:
+            raise ValueError(f"未知的聚合器: {name}")
+        aggregators.append(AGGREGATORS[name]())
+    return tuple(aggregators)
+
+
+class Aggregation:
+    """一次扫描中各目录的聚合状态
+
+    状态按目录节点保存，不保存路径：SizeNode树用节点对象作键（多进程工作进程中用打包记录的编号），
+    压缩为列式存储（TreeStore）后改用节点编号作键（见rekey），不再引用扫描树。
+    扫描期间每个目录只有直接文件的状态；rollup后每个目录的状态包含整棵子树。
+    """
+
+    def __init__(self, aggregators: Sequence[Aggregator] = ()):
+        self.aggregators = tuple(aggregators)
+        self.states: Dict[Union[SizeNode, int], List[Any]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.aggregators)
+
+    def _state(self, key) -> List[Any]:
+        """取出或创建某个目录的状态"""
+        states = self.states.get(key)
+        if states is None:
+            states = self.states[key] = [aggregator.create() for aggregator in self.aggregators]
+        return states
+
+    def add_files(self, key, files: Sequence[Tuple[str, int]], times: Sequence[Tuple[int, int]] = None):
+        """累积一个目录的直接文件，times为与files对应的(访问时间, 修改时间)"""
+        states = self._state(key)
+        if not times or len(times) != len(files):
+            times = [(None, None)] * len(files)
+        for aggregator, state in zip(self.aggregators, states):
+            add = aggregator.add
+            for (name, size), (atime, mtime) in zip(files, times):
+                add(state, name, size, atime, mtime)
+
+    def add_states(self, node: SizeNode, states: List[Any]):
+        """并入在其他进程中累积的目录状态"""
+        self._merge_into(self._state(node), states)
+
+    def _merge_into(self, target: List[Any], states: List[Any]):
+        for aggregator, state, other in zip(self.aggregators, target, states):
+            aggregator.merge(state, other)
+
+    def rollup(self, root: SizeNode):
+        """自底向上把各目录的状态合并到父目录，root之上的祖先不变"""
+        if not self.aggregators:
+            return
+        order = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(child for child in node.iter_children() if child.is_directory)
+        for node in reversed(order):
+            states = self.states.get(node)
+            if states is not None and node is not root:
+                self._merge_into(self._state(node.parent), states)
+
+    def rekey(self, pairs: Iterable[Tuple[Any, Any]]):
+        """按 (旧键, 新键) 换键（树压缩或还原时），不在pairs中的状态丢弃"""
+        states = self.states
+        self.states = {key: states[old] for old, key in pairs if old in states}
+
+    def state(self, key, name: str):
+        """目录子树中某个聚合器的状态，没有时返回None"""
+        states = self.states.get(key)
+        if states is None:
+            return None
+        for aggregator, state in zip(self.aggregators, states):
+            if aggregator.name == name:
+                return state
+        return None
+
+    def summary(self, key) -> Dict[str, List[Tuple[str, int, int]]]:
+        """目录子树的各项统计，{聚合器名称: [(标签, 文件数, 字节数)]}"""
+        states = self.states.get(key)
+        if states is None:
+            return {}
+        return {aggregator.name: aggregator.summarize(state)
+                for aggregator, state in zip(self.aggregators, states)}
+
+    def merge_subtree(self, other: 'Aggregation', root, ancestors: Iterable, removed: Iterable = ()):
+        """并入扫描root子树得到的（已rollup、键已与本对象一致的）状态，并更新root之上的祖先
+
+        removed为被重新扫描替换掉的旧子树中的目录（第一个为旧子树的根）：先从祖先中扣除旧状态再删除；
+        为空时按增量合并（继续扫描）。
+        """
+        ancestors = [self.states[key] for key in ancestors if key in self.states]
+        removed = list(removed)
+        if removed:
+            old = self.states.get(removed[0])
+            if old is not None:
+                for target in ancestors:
+                    for aggregator, state, gone in zip(self.aggregators, target, old):
+                        aggregator.subtract(state, gone)
+            for key in removed:
+                self.states.pop(key, None)
+
+        for key, states in other.states.items():
+            self._merge_into(self._state(key), states)
+        added = other.states.get(root)
+        if added is not None:
+            for target in ancestors:
+                self._merge_into(target, added)
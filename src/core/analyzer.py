@@ -1,197 +1,109 @@
-import os
-import platform
-from typing import List
 from PyQt5.QtCore import QThread, pyqtSignal
 
-from src.models.disk_item import DiskItem
-from src.models.analysis_result import AnalysisResult
-from src.core.file_utils import FileUtils
-from src.core.size_calculator import SizeCalculator
+from src.core.engine import (CancelToken, EVENT_ERROR, EVENT_FINISHED, EVENT_PARTIAL, EVENT_PROGRESS,
+                             ScanEngine, ScanEvent)
+from src.core.scan_daemon import DaemonError, DaemonUnavailable, ScanClient, decode_result
 
 
 class DiskAnalyzer(QThread):
-    """磁盘分析器 - 修复版本，支持停止功能"""
+    """磁盘分析器 - 在QThread中运行ScanEngine的一次分析，把事件转换为信号"""
 
     progress_updated = pyqtSignal(int, str)
     analysis_finished = pyqtSignal(object)
+    partial_result = pyqtSignal(object)  # 扫描过程中定期推送的中间AnalysisResult
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, path=None):
+    def __init__(self, engine: ScanEngine, path=None, refresh: bool = False, resume: bool = False):
         super().__init__()
-        self._is_running = True
-        self._current_path = path
-        self.size_calculator = SizeCalculator()  # 创建计算器实例
-
-    def analyze_path(self, path: str = None):
-        """分析指定路径"""
-        if path is not None:
-            self._current_path = path
-        self._is_running = True
-        self.size_calculator._is_running = True  # 重置计算器状态
+        self.token = CancelToken()
+        # path为None时分析所有磁盘；refresh重新扫描该子树；resume继续读取上次预算耗尽时未读取的目录
+        self.job = engine.job(path, refresh, resume, self.token, self._on_event)
+
+    def analyze_path(self):
+        """在线程中开始分析"""
         self.start()
 
     def run(self):
         """线程执行方法"""
         try:
-            if not self._is_running:
-                return
-
-            if self._current_path is None:
-                result = self._analyze_disks()
-            else:
-                result = self._analyze_directory(self._current_path)
-
-            if self._is_running:
-                self.analysis_finished.emit(result)
-
+            self.job.run()
         except Exception as e:
-            if self._is_running:
+            if not self.token.cancelled:
                 self.error_occurred.emit(f"分析错误: {str(e)}")
 
     def stop_analysis(self):
         """停止分析"""
-        self._is_running = False
-        self.size_calculator.stop_calculation()  # 停止计算器
+        self.token.cancel()
         if self.isRunning():
             self.wait(1000)
 
-    def _analyze_disks(self) -> AnalysisResult:
-        """分析所有磁盘"""
-        disks = []
+    def _on_event(self, event: ScanEvent):
+        """引擎事件转换为信号（事件已限频，信号跨线程排队到界面线程）"""
+        if event.kind == EVENT_PROGRESS:
+            self.progress_updated.emit(event.percent, event.message)
+        elif event.kind == EVENT_PARTIAL:
+            if event.message:
+                self.progress_updated.emit(event.percent, event.message)
+            self.partial_result.emit(event.result)
+        elif event.kind == EVENT_ERROR:
+            self.error_occurred.emit(event.message)
+        elif event.kind == EVENT_FINISHED:
+            self.analysis_finished.emit(event.result)
 
-        if platform.system() == "Windows":
-            disks = self._get_windows_disks()
-        else:
-            disks = self._get_linux_disks()
 
-        # 计算总大小和百分比
-        total_used = sum(disk.size for disk in disks)
-        for disk in disks:
-            if total_used > 0:
-                disk.percentage = (disk.size / total_used) * 100
+class DaemonAnalyzer(QThread):
+    """守护进程分析器 - 由扫描守护进程扫描（与其他客户端的相同请求合并），信号与DiskAnalyzer相同"""
 
-        return AnalysisResult(
-            items=disks,
-            total_size=total_used,
-            path="",
-            result_type="disk"
-        )
+    progress_updated = pyqtSignal(int, str)
+    analysis_finished = pyqtSignal(object)
+    partial_result = pyqtSignal(object)
+    error_occurred = pyqtSignal(str)
+    daemon_lost = pyqtSignal()  # 守护进程已退出或无法连接，由调用者改为在本进程扫描
 
-    def _analyze_directory(self, path: str) -> AnalysisResult:
-        """分析指定目录 - 支持停止功能"""
-        items = []
+    def __init__(self, socket_path: str, path=None, refresh: bool = False, resume: bool = False):
+        super().__init__()
+        self.client = ScanClient(socket_path)
+        self.path = path
+        self.refresh = refresh
+        self.resume = resume
+        self.stopped = False
+
+    def analyze_path(self):
+        """在线程中开始分析"""
+        self.start()
 
+    def run(self):
+        """线程执行方法"""
         try:
-            if not self._is_running:
-                return AnalysisResult(items=[], total_size=0, path=path, result_type="directory")
-
-            dir_items = FileUtils.list_directory(path)
-            total_items = len(dir_items)
-
-            for i, item_name in enumerate(dir_items):
-                if not self._is_running:
-                    break
-
-                item_path = os.path.join(path, item_name)
-
-                try:
-                    if os.path.isdir(item_path):
-                        # 使用计算器计算目录大小
-                        size = self.size_calculator.calculate_directory_size_iterative(item_path)
-                        item_type = "directory"
-                    else:
-                        size = os.path.getsize(item_path)
-                        item_type = "file"
-
-                    disk_item = DiskItem(
-                        name=item_name,
-                        path=item_path,
-                        size=size,
-                        item_type=item_type,
-                        parent_path=path
-                    )
-                    items.append(disk_item)
-
-                except (PermissionError, OSError, MemoryError) as e:
-                    continue
-
-                # 更新进度
-                if total_items > 0:
-                    progress = int((i + 1) / total_items * 100)
-                    self.progress_updated.emit(progress, f"正在分析: {item_name}")
-
-        except (PermissionError, MemoryError, OSError) as e:
-            self.error_occurred.emit(f"无法访问目录: {path} - {str(e)}")
-
-        # 按大小排序并计算百分比
-        total_size = sum(item.size for item in items)
-        items.sort(key=lambda x: x.size, reverse=True)
-
-        for item in items:
-            if total_size > 0:
-                item.percentage = (item.size / total_size) * 100
-
-        return AnalysisResult(
-            items=items,
-            total_size=total_size,
-            path=path,
-            result_type="directory"
-        )
-
-    def _get_windows_disks(self) -> List[DiskItem]:
-        """获取Windows磁盘"""
-        import string
-        import ctypes
-
-        disks = []
-        bitmask = ctypes.windll.kernel32.GetLogicalDrives()
-
-        for letter in string.ascii_uppercase:
-            if bitmask & 1:
-                drive = f"{letter}:\\"
-                try:
-                    import psutil
-                    usage = psutil.disk_usage(drive)
-                    disk_item = DiskItem(
-                        name=drive,
-                        path=drive,
-                        size=usage.used,
-                        item_type="disk",
-                        total_size=usage.total,
-                        used_size=usage.used,
-                        free_size=usage.free
-                    )
-                    disks.append(disk_item)
-                except (OSError, ImportError) as e:
-                    continue
-            bitmask >>= 1
-
-        return disks
-
-    def _get_linux_disks(self) -> List[DiskItem]:
-        """获取Linux磁盘"""
-        import psutil
-
-        disks = []
-        partitions = psutil.disk_partitions()
-
-        for partition in partitions:
-            try:
-                if partition.fstype in ['squashfs', 'tmpfs', 'devtmpfs']:
-                    continue
-
-                usage = psutil.disk_usage(partition.mountpoint)
-                disk_item = DiskItem(
-                    name=partition.mountpoint,
-                    path=partition.mountpoint,
-                    size=usage.used,
-                    item_type="disk",
-                    total_size=usage.total,
-                    used_size=usage.used,
-                    free_size=usage.free
-                )
-                disks.append(disk_item)
-            except (PermissionError, OSError):
-                continue
-
-        return disks
+            result = self.client.scan(self.path, self.refresh, self.resume, self._on_message)
+        except DaemonUnavailable:
+            if not self.stopped:
+                self.daemon_lost.emit()
+            return
+        except DaemonError as e:
+            if not self.stopped:
+                self.error_occurred.emit(f"分析错误: {str(e)}")
+            return
+        if not self.stopped:
+            self.analysis_finished.emit(result)
+
+    def stop_analysis(self):
+        """停止等待（守护进程中的扫描继续，结果留给之后的请求）"""
+        self.stopped = True
+        self.client.close()
+        if self.isRunning():
+            self.wait(1000)
+
+    def _on_message(self, message: dict):
+        """守护进程推送的消息转换为信号"""
+        if self.stopped:
+            return
+        kind = message.get("type")
+        if kind == "progress":
+            self.progress_updated.emit(message["percent"], message["message"])
+        elif kind == "partial":
+            if message.get("message"):
+                self.progress_updated.emit(message["percent"], message["message"])
+            self.partial_result.emit(decode_result(message["result"]))
+        elif kind == "warning":
+            self.error_occurred.emit(message["message"])
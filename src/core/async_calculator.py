@@ -0,0 +1,123 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+from src.core.aggregators import Aggregator
+from src.core.scan_cache import ScanCache
+from src.core.scan_rules import ScanRules
+from src.core.scan_scheduler import ScanQueue
+from src.core.size_calculator import DirectoryListing, SizeCalculator
+from src.models.size_node import SizeNode
+
+
+class AdaptiveLimit:
+    """按观测到的目录读取延迟调整并发数
+
+    延迟接近基线（最小延迟）时说明服务端仍有余量，每个窗口加1；
+    延迟明显变长时说明请求开始排队，按比例减小。窗口长度等于当前并发数，
+    即大约每一轮往返调整一次。
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64,
+                 tolerance: float = 2.0, backoff: float = 0.75, smoothing: float = 0.2,
+                 drift: float = 0.001):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.current = min(max(initial, self.minimum), self.maximum)
+        self.tolerance = tolerance  # 平均延迟超过基线的这个倍数时减小并发
+        self.backoff = backoff
+        self.smoothing = smoothing  # 平均延迟的指数平滑系数
+        self.drift = drift  # 基线每次观测允许的上浮比例，跟随网络状况缓慢变化
+        self.baseline: Optional[float] = None
+        self.average: Optional[float] = None
+        self._samples = 0
+
+    def observe(self, latency: float):
+        """记录一次读取的延迟（秒）"""
+        if self.baseline is None:
+            self.baseline = self.average = latency
+        else:
+            self.baseline = min(latency, self.baseline * (1 + self.drift))
+            self.average += self.smoothing * (latency - self.average)
+
+        self._samples += 1
+        if self._samples < self.current:
+            return
+        self._samples = 0
+        if self.average <= self.baseline * self.tolerance:
+            self.current = min(self.maximum, self.current + 1)
+        else:
+            self.current = max(self.minimum, int(self.current * self.backoff))
+
+
+class AsyncSizeCalculator(SizeCalculator):
+    """asyncio大小计算器 - 面向NFS/SMB等高延迟文件系统
+
+    阻塞的scandir/stat放到线程池中执行，事件循环保持AdaptiveLimit.current个目录读取在途，
+    并根据每次读取的延迟调整在途数量。树的合并、调度顺序和预算与SizeCalculator相同。
+    """
+
+    def __init__(self, max_concurrency: int = 64, cache: ScanCache = None, initial_concurrency: int = 4,
+                 rules: ScanRules = None, aggregators: Sequence[Aggregator] = None):
+        super().__init__(cache=cache, rules=rules, aggregators=aggregators)
+        self.max_concurrency = max(1, max_concurrency)
+        self.initial_concurrency = initial_concurrency
+        self.limit = AdaptiveLimit(initial_concurrency, maximum=self.max_concurrency)
+        self.peak_concurrency = 0  # 最近一次扫描中实际达到的最大在途读取数
+
+    def _walk(self, root: SizeNode, queue: ScanQueue):
+        """在独立的事件循环中遍历，预算耗尽或停止时剩下的目录记入frontier"""
+        self.limit = AdaptiveLimit(self.initial_concurrency, maximum=self.max_concurrency)
+        self.peak_concurrency = 0
+        started = time.perf_counter()
+        asyncio.run(self._walk_async(root, queue))
+        self._timed("walk", started)
+
+        for node, path, expected, history in queue.drain():
+            self.frontier.add(node, path, expected, history)
+
+    async def _walk_async(self, root: SizeNode, queue: ScanQueue):
+        """保持limit.current个读取在途，按完成顺序合并"""
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="async-walker")
+        pending = {}
+        try:
+            while self._is_running:
+                while queue and len(pending) < self.limit.current and not self._budget_exhausted():
+                    item = queue.pop()
+                    pending[loop.create_task(self._timed_read(loop, executor, item[1]))] = item
+                self.peak_concurrency = max(self.peak_concurrency, len(pending))
+                if not pending:
+                    break
+
+                if self.profile is not None:
+                    self.profile.sample_queue(len(queue), len(pending))
+                started = time.perf_counter()
+                done, _ = await asyncio.wait(pending, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                self._timed("wait", started)
+                for task in done:
+                    node, node_path, expected, history = pending.pop(task)
+                    try:
+                        listing, latency = task.result()
+                    except (PermissionError, OSError) as e:
+                        if node is root:
+                            raise
+                        self._skip_directory(node, e)
+                        continue
+                    self.limit.observe(latency)
+                    self._enqueue_children(queue, node, node_path, expected, listing)
+        finally:
+            for task in pending:
+                task.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        # 停止时未合并的目录放回队列，记入frontier
+        for item in pending.values():
+            queue.push(*item)
+
+    async def _timed_read(self, loop, executor, path: str):
+        """在线程池中读取目录，返回 (读取结果, 延迟秒数)"""
+        start = time.monotonic()
+        listing: DirectoryListing = await loop.run_in_executor(executor, self._read_directory, path)
+        return listing, time.monotonic() - start
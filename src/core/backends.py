@@ -0,0 +1,41 @@
+from typing import Optional
+
+from config.settings import Settings
+from src.core.aggregators import create_aggregators
+from src.core.scan_cache import ScanCache
+from src.core.scan_rules import ScanRules
+from src.core.size_calculator import SizeCalculator
+from src.core.size_estimator import SizeEstimator
+
+
+def create_calculator(scan_cache: ScanCache = None, backend: str = None, mode: str = None) -> SizeCalculator:
+    """按配置选择扫描后端（多进程后端不使用持久化缓存），backend/mode为None时使用Settings中的值
+
+    多进程和asyncio后端在选中时才导入（asyncio连同ssl等依赖的导入耗时与其余扫描模块相当）。
+    """
+    backend = backend or Settings.SCAN_BACKEND
+    mode = mode or Settings.SCAN_MODE
+    rules = ScanRules(Settings.SCAN_EXCLUDE, Settings.SCAN_INCLUDE)
+    aggregators = create_aggregators(Settings.SCAN_AGGREGATORS)
+    if mode == "estimate":
+        return SizeEstimator(workers=Settings.SCAN_WORKERS, cache=scan_cache, rules=rules,
+                             aggregators=aggregators)
+    if backend == "process":
+        from src.core.process_calculator import ProcessSizeCalculator
+        return ProcessSizeCalculator(processes=Settings.SCAN_PROCESSES, rules=rules, aggregators=aggregators)
+    if backend == "async":
+        from src.core.async_calculator import AsyncSizeCalculator
+        return AsyncSizeCalculator(max_concurrency=Settings.SCAN_MAX_CONCURRENCY, cache=scan_cache,
+                                   rules=rules, aggregators=aggregators)
+    return SizeCalculator(workers=Settings.SCAN_WORKERS, cache=scan_cache, rules=rules,
+                          aggregators=aggregators)
+
+
+def open_scan_cache() -> Optional[ScanCache]:
+    """打开持久化缓存，未启用或失败时退化为无缓存扫描"""
+    if not Settings.SCAN_CACHE_ENABLED:
+        return None
+    try:
+        return ScanCache(Settings.SCAN_CACHE_FILE)
+    except Exception:
+        return None
@@ -0,0 +1,189 @@
+import hashlib
+import mmap
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from src.core.scan_cache import ScanCache
+
+
+@dataclass
+class DuplicateGroup:
+    """一组内容相同的文件"""
+    size: int  # 单个文件的大小
+    digest: str  # 内容摘要（十六进制）
+    paths: List[str]
+
+    @property
+    def reclaimable(self) -> int:
+        """只保留一份时可释放的字节数"""
+        return self.size * (len(self.paths) - 1)
+
+
+@dataclass
+class DuplicateReport:
+    """重复文件查找结果，各组按可释放字节数降序"""
+    groups: List[DuplicateGroup] = field(default_factory=list)
+    candidates: int = 0  # 存在同样大小文件的候选数
+    partial_hashed: int = 0  # 实际读取首尾的文件数
+    full_hashed: int = 0  # 实际读取全文的文件数
+    cache_hits: int = 0  # 摘要来自缓存的次数
+    bytes_read: int = 0
+    errors: int = 0
+
+    @property
+    def reclaimable(self) -> int:
+        """所有重复组合计可释放的字节数"""
+        return sum(group.reclaimable for group in self.groups)
+
+
+class DuplicateFinder:
+    """重复文件查找 - 复用已扫描的目录树，逐级缩小候选范围
+
+    1. 按大小分组（树中已有，不访问磁盘），只保留有同样大小文件的候选
+    2. 读取首尾各PARTIAL_BYTES字节计算摘要，按(大小, 首尾摘要)再分组
+    3. 只对仍然相同的文件读取全文计算摘要
+    读取使用mmap，在线程池中并行（hashlib处理大块数据时释放GIL）。
+    设置cache时摘要按(dev, inode, 大小, mtime)缓存，文件未变化时不再读取。
+    同一inode的硬链接只计一次，删除其中一个并不能释放空间。
+    """
+
+    PARTIAL_BYTES = 4096
+    CHUNK_BYTES = 1 << 20  # 全文摘要每次处理的字节数，两次之间检查停止标志
+
+    def __init__(self, workers: int = 4, cache: ScanCache = None, min_size: int = 1):
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.min_size = max(1, min_size)  # 空文件没有可释放的空间
+        self._is_running = True
+
+    def stop(self):
+        """停止查找"""
+        self._is_running = False
+
+    def find(self, node) -> DuplicateReport:
+        """在节点（SizeNode或StoreNode）子树内查找重复文件"""
+        self._is_running = True
+        report = DuplicateReport()
+
+        by_size: Dict[int, List[str]] = defaultdict(list)
+        for path, size in self._iter_files(node):
+            if size >= self.min_size:
+                by_size[size].append(path)
+        candidates = [(path, size) for size, paths in by_size.items() if len(paths) > 1 for path in paths]
+        report.candidates = len(candidates)
+
+        cache_rows = {}
+        whole = 2 * self.PARTIAL_BYTES  # 不超过首尾两段的文件，首尾摘要就是全文摘要
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="duplicate-hash") as pool:
+            partials = self._hash_all(pool, candidates, False, report, cache_rows)
+            survivors = [entry for group in self._group(partials) for entry in group]
+            fulls = [entry for entry in survivors if entry[1] <= whole]
+            fulls += self._hash_all(pool, [(path, size) for path, size, _ in survivors if size > whole],
+                                    True, report, cache_rows)
+
+        if self.cache is not None and cache_rows:
+            self.cache.put_hashes(cache_rows.values())
+
+        report.groups = [
+            DuplicateGroup(size=group[0][1], digest=group[0][2].hex(), paths=sorted(path for path, _, _ in group))
+            for group in self._group(fulls)
+        ]
+        report.groups.sort(key=lambda group: (-group.reclaimable, group.paths[0]))
+        return report
+
+    @staticmethod
+    def _iter_files(node):
+        """遍历子树中的文件 (路径, 大小)"""
+        stack = [(node, node.path)]
+        while stack:
+            current, path = stack.pop()
+            for child in current.iter_children():
+                child_path = os.path.join(path, child.name)
+                if child.is_directory:
+                    stack.append((child, child_path))
+                else:
+                    yield child_path, child.size
+
+    def _hash_all(self, pool, files, full, report, cache_rows) -> List[Tuple[str, int, bytes]]:
+        """并行计算摘要，返回 [(路径, 大小, 摘要)]，同一inode只保留一个路径"""
+        results = []
+        seen = set()
+        for path, size, hashed in pool.map(lambda item: self._hash_file(*item, full, cache_rows), files):
+            if hashed is None:
+                report.errors += 1
+                continue
+            inode, digest, bytes_read, from_cache = hashed
+            if from_cache:
+                report.cache_hits += 1
+            elif full:
+                report.full_hashed += 1
+            else:
+                report.partial_hashed += 1
+            report.bytes_read += bytes_read
+            if inode not in seen:
+                seen.add(inode)
+                results.append((path, size, digest))
+        return results
+
+    def _hash_file(self, path: str, size: int, full: bool, cache_rows):
+        """计算单个文件的摘要，返回 (路径, 大小, (inode, 摘要, 读取字节数, 是否来自缓存))，失败时摘要部分为None"""
+        if not self._is_running:
+            return path, size, None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path, size, None
+        if st.st_size != size:
+            # 扫描后文件已变化，不再参与比较
+            return path, size, None
+
+        inode = (st.st_dev, st.st_ino)
+        row = cache_rows.get(inode)
+        if row is None and self.cache is not None:
+            cached = self.cache.get_hash(st, self.PARTIAL_BYTES)
+            if cached is not None:
+                row = (st.st_dev, st.st_ino, size, st.st_mtime_ns, self.PARTIAL_BYTES) + cached
+        if row is not None and row[6 if full else 5] is not None:
+            return path, size, (inode, row[6 if full else 5], 0, True)
+
+        try:
+            digest, bytes_read = self._digest(path, size, full)
+        except (OSError, ValueError, InterruptedError):
+            return path, size, None
+
+        if full:
+            # 进入全文阶段的文件在首尾阶段已有记录
+            cache_rows[inode] = row[:6] + (digest,)
+        else:
+            whole = digest if size <= 2 * self.PARTIAL_BYTES else None
+            cache_rows[inode] = (st.st_dev, st.st_ino, size, st.st_mtime_ns, self.PARTIAL_BYTES, digest, whole)
+        return path, size, (inode, digest, bytes_read, False)
+
+    def _digest(self, path: str, size: int, full: bool) -> Tuple[bytes, int]:
+        """用mmap读取文件计算摘要，full为False时只读取首尾，返回 (摘要, 读取字节数)"""
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                if not full and size > 2 * self.PARTIAL_BYTES:
+                    hasher.update(view[:self.PARTIAL_BYTES])
+                    hasher.update(view[-self.PARTIAL_BYTES:])
+                    return hasher.digest(), 2 * self.PARTIAL_BYTES
+                for offset in range(0, len(view), self.CHUNK_BYTES):
+                    if not self._is_running:
+                        raise InterruptedError(path)
+                    hasher.update(view[offset:offset + self.CHUNK_BYTES])
+                return hasher.digest(), len(view)
+            finally:
+                view.release()
+
+    @staticmethod
+    def _group(hashed: List[Tuple[str, int, bytes]]) -> List[List[Tuple[str, int, bytes]]]:
+        """按(大小, 摘要)分组，只返回有两个以上文件的组"""
+        groups: Dict[Tuple[int, bytes], List[Tuple[str, int, bytes]]] = defaultdict(list)
+        for entry in hashed:
+            groups[(entry[1], entry[2])].append(entry)
+        return [group for group in groups.values() if len(group) > 1]
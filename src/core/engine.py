@@ -0,0 +1,539 @@
+import os
+import platform
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from config.settings import Settings
+from src.core.backends import create_calculator
+from src.core.progress_tracker import ProgressInfo, ProgressTracker
+from src.core.scan_cache import ScanCache
+from src.core.scan_profile import ScanProfile
+from src.core.scan_scheduler import ScanBudget
+from src.core.largest_files import LargestFiles
+from src.core.aggregators import FingerprintAggregator
+from src.core.snapshot import Snapshot, fingerprint_tree, read_snapshot, write_snapshot
+from src.core.snapshot_diff import SnapshotDiff, diff_stores
+from src.core.size_calculator import SizeCalculator
+from src.core.size_estimator import SizeEstimate, SizeEstimator
+from src.core.tree_cache import SizeTreeCache
+from src.models.analysis_result import AnalysisResult
+from src.models.disk_item import DiskItem, SIZE_GROWING
+from src.models.tree_store import StoreNode, TreeStore
+
+# 事件类型
+EVENT_PROGRESS = "progress"  # 扫描进度，按progress_interval限频
+EVENT_PARTIAL = "partial"  # 扫描中的中间结果（抽样估算时附带估算值）
+EVENT_ERROR = "error"  # 无法访问目录等错误，之后仍会产出一个（空的）结果
+EVENT_FINISHED = "finished"  # 分析完成，取消时不产出
+
+
+@dataclass
+class ScanEvent:
+    """扫描引擎产出的事件"""
+    kind: str
+    percent: int = -1  # 进度百分比，-1为未知
+    message: str = ""
+    progress: Optional[ProgressInfo] = None  # progress事件的原始进度
+    result: Optional[AnalysisResult] = None  # partial/finished事件的结果
+    estimate: Optional[SizeEstimate] = None  # 抽样估算时partial事件对应的估算
+
+
+@dataclass
+class ScanOptions:
+    """扫描参数，None表示使用Settings中的值"""
+    backend: Optional[str] = None
+    mode: Optional[str] = None
+    budget_seconds: Optional[float] = None  # 整次分析的时间预算，None为不限
+    budget_directories: Optional[int] = None  # 整次分析最多读取的目录数，None为不限
+    progress_interval: float = 0.1
+    stream: bool = True  # 扫描过程中是否定期产出中间结果
+    stream_interval: float = 1.0
+    profile: bool = False  # 是否记录扫描剖析，报告见AnalysisResult.profile
+
+    @classmethod
+    def from_settings(cls) -> 'ScanOptions':
+        """按Settings创建（图形界面使用的参数）"""
+        return cls(budget_seconds=Settings.SCAN_BUDGET_SECONDS,
+                   budget_directories=Settings.SCAN_BUDGET_DIRECTORIES,
+                   progress_interval=Settings.PROGRESS_INTERVAL,
+                   stream=Settings.STREAM_RESULTS,
+                   stream_interval=Settings.STREAM_INTERVAL,
+                   profile=Settings.SCAN_PROFILE)
+
+
+class CancelToken:
+    """取消令牌 - 可在任意线程调用cancel，扫描在读取下一批目录前停止"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """请求取消，已注册的回调各调用一次"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """注册取消时的回调，已取消时立即调用"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class ScanEngine:
+    """Qt无关的扫描引擎 - 持有跨多次分析共享的目录树缓存和持久化缓存
+
+    scan在当前线程同步分析，start在后台线程分析并返回ScanJob，iter_scan逐个产出事件。
+    进度和中间结果通过普通回调产出（已限频），不依赖事件循环，可用于脚本、测试和命令行。
+    """
+
+    def __init__(self, tree_cache: SizeTreeCache = None, scan_cache: ScanCache = None,
+                 options: ScanOptions = None):
+        self.tree_cache = tree_cache
+        self.scan_cache = scan_cache
+        self.options = options or ScanOptions.from_settings()
+
+    def job(self, path: str = None, refresh: bool = False, resume: bool = False, token: CancelToken = None,
+            on_event: Callable[[ScanEvent], None] = None) -> 'ScanJob':
+        """创建一次分析，path为None时分析所有磁盘；refresh重新扫描已缓存的子树，resume继续读取未读完的目录"""
+        return ScanJob(self, path, refresh, resume, token or CancelToken(), on_event)
+
+    def scan(self, path: str = None, refresh: bool = False, resume: bool = False, token: CancelToken = None,
+             on_event: Callable[[ScanEvent], None] = None) -> Optional[AnalysisResult]:
+        """同步分析，被取消时返回None"""
+        return self.job(path, refresh, resume, token, on_event).run()
+
+    def start(self, path: str = None, refresh: bool = False, resume: bool = False, token: CancelToken = None,
+              on_event: Callable[[ScanEvent], None] = None) -> 'ScanJob':
+        """在后台线程分析，on_event在扫描线程中调用"""
+        return self.job(path, refresh, resume, token, on_event).start()
+
+    def iter_scan(self, path: str = None, refresh: bool = False, resume: bool = False,
+                  token: CancelToken = None) -> Iterator[ScanEvent]:
+        """在后台线程分析并逐个产出事件，提前结束迭代时取消扫描；扫描中的异常在迭代结束时抛出"""
+        events: queue.Queue = queue.Queue()
+        job = self.job(path, refresh, resume, token, events.put)
+        job.on_done = lambda: events.put(None)
+        job.start()
+        finished = False
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    finished = True
+                    break
+                yield event
+        finally:
+            if not finished:
+                job.cancel()
+            job.wait()
+
+    def cached_result(self, path: str) -> Optional[AnalysisResult]:
+        """从目录树缓存生成结果，未缓存时返回None"""
+        node = self.tree_cache.lookup(path) if self.tree_cache is not None else None
+        return self.tree_cache.result(node) if node is not None else None
+
+    def save_snapshot(self, path: str, file: str, compression: str = "none", metadata: dict = None) -> int:
+        """把目录树缓存中path的子树保存为快照文件，返回文件大小；path尚未扫描时抛出ValueError"""
+        node, store, fingerprints = self._export(path)
+        return write_snapshot(file, store, self.tree_cache.largest_files(node),
+                              complete=self.tree_cache.frontier(node) is None,
+                              compression=compression, metadata=metadata, fingerprints=fingerprints)
+
+    def open_snapshot(self, file: str) -> Tuple[Snapshot, AnalysisResult]:
+        """打开快照并加入目录树缓存，之后可以像扫描过的目录一样浏览，返回快照和根目录的结果"""
+        snapshot = read_snapshot(file)
+        largest = LargestFiles(SizeCalculator.LARGEST_FILES)
+        largest.merge(snapshot.largest_files)
+        self.tree_cache.load_store(snapshot.store, largest, snapshot.fingerprints)
+        return snapshot, self.tree_cache.result(snapshot.store.node())
+
+    def diff_snapshot(self, file: str, path: str = None) -> SnapshotDiff:
+        """以快照文件为旧版本，对比目录树缓存中的同一目录（默认为快照的根目录）
+
+        缓存中的树可以是刚扫描的，也可以是打开的另一个快照；尚未扫描时抛出ValueError。
+        """
+        old = read_snapshot(file)
+        _, store, fingerprints = self._export(path or old.root)
+        diff = diff_stores(old.store, store, old.fingerprints, fingerprints)
+        diff.old_created = old.created
+        diff.new_created = time.time()
+        return diff
+
+    def _export(self, path: str) -> Tuple[object, TreeStore, object]:
+        """path子树的节点、列式目录树和子树指纹（从快照打开的树直接用保存的指纹）"""
+        node = self.tree_cache.lookup(path) if self.tree_cache is not None else None
+        if node is None:
+            raise ValueError(f"尚未扫描: {path}")
+        if isinstance(node, StoreNode) and node.index == 0 and not node.store.garbage:
+            store = node.store
+            fingerprints = self.tree_cache.fingerprints(store)
+            if fingerprints is not None:
+                return node, store, fingerprints
+            keys = range(len(store))
+        elif isinstance(node, StoreNode):
+            # 拼接过重新扫描的子树时去掉不再可达的行，快照仍按广度优先编号
+            store, keys = node.store.copy(node.index)
+        else:
+            keys = []
+            store = TreeStore.from_size_node(node, node.path, keys)
+
+        # 目录的修改时间散列来自FingerprintAggregator的状态（未启用该插件时为0），keys为各编号在聚合状态中的键
+        aggregation = self.tree_cache.aggregation(node)
+
+        def mtime_hash(index):
+            state = aggregation.state(keys[index], FingerprintAggregator.name)
+            return state[0] if state is not None else 0
+        return node, store, fingerprint_tree(store, mtime_hash if aggregation is not None else None)
+
+
+class ScanJob:
+    """一次分析 - run在当前线程执行，start在后台线程执行后用wait取结果"""
+
+    def __init__(self, engine: ScanEngine, path: Optional[str], refresh: bool, resume: bool,
+                 token: CancelToken, on_event: Optional[Callable[[ScanEvent], None]]):
+        self.engine = engine
+        self.path = path
+        self.refresh = refresh  # 为True时忽略缓存，重新扫描该子树
+        self.resume = resume  # 为True时继续读取该子树中上次预算耗尽时未读取的目录
+        self.token = token
+        self.on_event = on_event
+        self.on_done: Optional[Callable[[], None]] = None  # 后台线程结束时调用
+        self.result: Optional[AnalysisResult] = None
+        self.error: Optional[BaseException] = None
+        self.calculator = create_calculator(engine.scan_cache, engine.options.backend, engine.options.mode)
+        # 重新扫描时逐个文件重新stat，原地增长的文件也能反映出来
+        self.calculator.revalidate = refresh
+        # 剖析关闭时为None，计算器和引擎只多一次 is None 判断
+        self.profile = ScanProfile() if engine.options.profile else None
+        self.calculator.profile = self.profile
+        self._thread: Optional[threading.Thread] = None
+        token.on_cancel(self.calculator.stop_calculation)
+
+    @property
+    def tree_cache(self) -> Optional[SizeTreeCache]:
+        return self.engine.tree_cache
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    def cancel(self):
+        """取消分析"""
+        self.token.cancel()
+
+    def start(self) -> 'ScanJob':
+        """在后台线程执行run"""
+        self._thread = threading.Thread(target=self._run_in_thread, name="scan-job", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run_in_thread(self):
+        try:
+            self.run()
+        except BaseException as e:
+            self.error = e
+        finally:
+            if self.on_done is not None:
+                self.on_done()
+
+    def wait(self, timeout: float = None) -> Optional[AnalysisResult]:
+        """等待后台分析结束，返回结果（取消时为None）并抛出分析中的异常"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    @property
+    def done(self) -> bool:
+        return self._thread is None or not self._thread.is_alive()
+
+    def run(self) -> Optional[AnalysisResult]:
+        """执行分析，被取消时返回None"""
+        if self.cancelled:
+            return None
+        if self.path is None:
+            result = self._analyze_disks()
+        else:
+            result = self._analyze_directory(self.path)
+        if self.cancelled:
+            return None
+        if self.profile is not None:
+            result.profile = self.profile.report(result.scan_stats, path=self.path,
+                                                 backend=type(self.calculator).__name__)
+        self.result = result
+        self._emit(ScanEvent(EVENT_FINISHED, percent=100, result=result))
+        return result
+
+    def _emit(self, event: ScanEvent):
+        if self.on_event is not None and not self.cancelled:
+            if self.profile is None:
+                self.on_event(event)
+            else:
+                started = time.perf_counter()
+                self.on_event(event)
+                self.profile.add("events", time.perf_counter() - started)
+
+    def _error(self, message: str):
+        self._emit(ScanEvent(EVENT_ERROR, message=message))
+
+    def _status(self, percent: int, message: str):
+        self._emit(ScanEvent(EVENT_PROGRESS, percent=percent, message=message))
+
+    def _analyze_disks(self) -> AnalysisResult:
+        """分析所有磁盘"""
+        disks = []
+
+        if platform.system() == "Windows":
+            disks = self._get_windows_disks()
+        else:
+            disks = self._get_linux_disks()
+
+        # 计算总大小和百分比
+        total_used = sum(disk.size for disk in disks)
+        for disk in disks:
+            if total_used > 0:
+                disk.percentage = (disk.size / total_used) * 100
+
+        return AnalysisResult(
+            items=disks,
+            total_size=total_used,
+            path="",
+            result_type="disk"
+        )
+
+    def _analyze_directory(self, path: str) -> AnalysisResult:
+        """分析指定目录 - 优先复用目录树缓存，未命中时在预算内整树扫描一次"""
+        node = None
+        if self.tree_cache is not None and not self.refresh:
+            node = self.tree_cache.lookup(path)
+
+        if node is not None and self.resume:
+            frontier = self.tree_cache.frontier(node)
+            if frontier is not None:
+                return self._resume_directory(node, frontier)
+
+        if node is None:
+            self._status(-1, f"正在扫描: {path}")
+            self._prepare_calculator(path)
+            try:
+                if isinstance(self.calculator, SizeEstimator):
+                    node = self._estimate_directory(path)
+                else:
+                    node = self.calculator.build_tree(path, self._create_budget())
+            except (PermissionError, MemoryError, OSError) as e:
+                self._error(f"无法访问目录: {path} - {str(e)}")
+                return AnalysisResult(items=[], total_size=0, path=path, result_type="directory")
+
+            if self.cancelled:
+                # 扫描被中断，树不完整，不写入缓存
+                return AnalysisResult(items=[], total_size=0, path=path, result_type="directory")
+
+            frontier = self.calculator.frontier
+            if self.tree_cache is not None:
+                started = time.perf_counter()
+                largest = self.calculator.largest
+                aggregation = self.calculator.aggregation
+                if self.refresh:
+                    self.tree_cache.replace_subtree(node, frontier, largest, aggregation)
+                else:
+                    self.tree_cache.store(node, frontier, largest, aggregation)
+                self._timed("store", started)
+            return self._finished_result(node, frontier.states)
+
+        return self.tree_cache.result(node)
+
+    def _estimate_directory(self, path: str):
+        """抽样估算模式：每轮抽样后产出带置信区间的中间结果，最后一轮读取全部目录得到精确的树"""
+        estimator = self.calculator
+        for estimate in estimator.estimate_tree(path):
+            if estimate.exact or self.cancelled:
+                break
+            self._emit(ScanEvent(
+                EVENT_PARTIAL,
+                message=f"估算: ~{SizeCalculator.format_size(estimate.size)} ±{estimate.relative_error:.0%}"
+                        f"（已读取 {estimate.directories:,} 个目录，抽样比例 {estimate.rate:.1%}）",
+                result=AnalysisResult.from_size_node(estimate.root, estimate.states, is_partial=True,
+                                                     size_errors=estimate.errors),
+                estimate=estimate))
+        return estimator.root
+
+    def _resume_directory(self, node, frontier) -> AnalysisResult:
+        """继续扫描子树中尚未读取的目录，结果直接合并到缓存的目录树"""
+        path = node.path
+        self._status(-1, f"继续扫描: {path}")
+        self._prepare_calculator(path)
+        try:
+            self.calculator.resume_tree(node, frontier, self._create_budget())
+        except (PermissionError, MemoryError, OSError) as e:
+            self._error(f"无法访问目录: {path} - {str(e)}")
+            return AnalysisResult.from_size_node(node, frontier.states)
+        # 中途停止时未读完的目录已放回frontier，树仍然一致
+        started = time.perf_counter()
+        self.tree_cache.merge_scan(node, self.calculator.largest, self.calculator.aggregation)
+        self._timed("store", started)
+        return self._finished_result(node, frontier.states)
+
+    def _prepare_calculator(self, path: str):
+        """设置进度上报和中间结果推送"""
+        options = self.engine.options
+        tracker = ProgressTracker(self._emit_progress, interval=options.progress_interval,
+                                  expected_entries=self._expected_entries(path))
+        self.calculator.progress = tracker
+        if options.stream and not isinstance(self.calculator, SizeEstimator):
+            self.calculator.on_snapshot = self._emit_snapshot
+            self.calculator.snapshot_interval = options.stream_interval
+
+    def _create_budget(self) -> ScanBudget:
+        """创建整次分析的扫描预算"""
+        options = self.engine.options
+        return ScanBudget(seconds=options.budget_seconds, directories=options.budget_directories)
+
+    def _finished_result(self, node, states) -> AnalysisResult:
+        """扫描结束：上报统计并生成结果，预算耗尽时说明尚有多少目录未读取"""
+        stats = self.calculator.stats
+        message = f"扫描完成: {node.path}" + self._format_cache_stats(stats) + self._format_excluded(stats)
+        pending = len(self.calculator.frontier)
+        if pending:
+            message = f"扫描预算已用完: {node.path}（{pending} 个目录未读取，可继续扫描）"
+        self._status(100, message)
+
+        started = time.perf_counter()
+        if self.tree_cache is not None:
+            if self.tree_cache.compact and not pending:
+                # 已压缩为列式存储时从缓存生成结果，子项按需创建
+                node = self.tree_cache.lookup(node.path) or node
+            result = self.tree_cache.result(node)
+        else:
+            result = AnalysisResult.from_size_node(node, states)
+            result.set_largest_files(self.calculator.largest.items())
+            result.aggregates = self.calculator.aggregation.summary(node)
+        result.scan_stats = stats
+        self._timed("result", started)
+        return result
+
+    def _timed(self, phase: str, started: float):
+        """剖析时记录从started（perf_counter）到现在的耗时"""
+        if self.profile is not None:
+            self.profile.add(phase, time.perf_counter() - started)
+
+    def _expected_entries(self, path: str):
+        """预计条目总数，用于计算百分比和剩余时间"""
+        history = None
+        scan_cache = self.engine.scan_cache
+        if scan_cache is not None:
+            totals = scan_cache.get_totals(os.path.normpath(path))
+            history = totals[1] if totals else None
+        return ProgressTracker.estimate_entries(path, history)
+
+    def _emit_snapshot(self, root, growing):
+        """产出中间结果，仍在统计的子目录标记为增长中"""
+        if not self.cancelled:
+            started = time.perf_counter()
+            states = {child: SIZE_GROWING for child in growing}
+            result = AnalysisResult.from_size_node(root, states, is_partial=True)
+            result.set_largest_files(self.calculator.largest.items())
+            self._timed("partial_result", started)
+            self._emit(ScanEvent(EVENT_PARTIAL, result=result))
+
+    def _emit_progress(self, info: ProgressInfo):
+        """把合并后的进度转换为事件，百分比未知时为-1"""
+        if self.cancelled:
+            # 扫描开始时计算器会重置停止标志，取消早于扫描开始时在这里补上
+            self.calculator.stop_calculation()
+            return
+        message = (f"已扫描 {info.entries:,} 项 / {SizeCalculator.format_size(info.bytes)}"
+                   f" · {info.entries_per_second:,.0f} 项/秒")
+        if info.eta is not None and info.percent is not None and info.percent < 100:
+            message += f" · 预计剩余 {ProgressTracker.format_duration(info.eta)}"
+        self._emit(ScanEvent(EVENT_PROGRESS, percent=info.percent if info.percent is not None else -1,
+                             message=message, progress=info))
+
+    @staticmethod
+    def _format_cache_stats(stats) -> str:
+        """格式化增量复扫统计"""
+        if not stats.revalidated and not stats.reread:
+            return ""
+        return f"（复用缓存 {stats.revalidated} 个目录，重新读取 {stats.reread} 个）"
+
+    @staticmethod
+    def _format_excluded(stats) -> str:
+        """格式化排除统计 - 被排除的字节不计入总大小，单独说明"""
+        if not stats.excluded_entries:
+            return ""
+        return (f"（已按规则排除 {stats.excluded_entries:,} 项"
+                f"，其中文件 {SizeCalculator.format_size(stats.excluded_bytes)}）")
+
+    def _get_windows_disks(self) -> List[DiskItem]:
+        """获取Windows磁盘"""
+        import string
+        import ctypes
+
+        disks = []
+        bitmask = ctypes.windll.kernel32.GetLogicalDrives()
+
+        for letter in string.ascii_uppercase:
+            if bitmask & 1:
+                drive = f"{letter}:\\"
+                try:
+                    import psutil
+                    usage = psutil.disk_usage(drive)
+                    disk_item = DiskItem(
+                        name=drive,
+                        path=drive,
+                        size=usage.used,
+                        item_type="disk",
+                        total_size=usage.total,
+                        used_size=usage.used,
+                        free_size=usage.free
+                    )
+                    disks.append(disk_item)
+                except (OSError, ImportError) as e:
+                    continue
+            bitmask >>= 1
+
+        return disks
+
+    def _get_linux_disks(self) -> List[DiskItem]:
+        """获取Linux磁盘"""
+        import psutil
+
+        disks = []
+        partitions = psutil.disk_partitions()
+
+        for partition in partitions:
+            try:
+                if partition.fstype in ['squashfs', 'tmpfs', 'devtmpfs']:
+                    continue
+
+                usage = psutil.disk_usage(partition.mountpoint)
+                disk_item = DiskItem(
+                    name=partition.mountpoint,
+                    path=partition.mountpoint,
+                    size=usage.used,
+                    item_type="disk",
+                    total_size=usage.total,
+                    used_size=usage.used,
+                    free_size=usage.free
+                )
+                disks.append(disk_item)
+            except (PermissionError, OSError):
+                continue
+
+        return disks
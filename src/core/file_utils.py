@@ -1,6 +1,7 @@
 import os
-import psutil
-from typing import List
+from typing import Iterator, List
+
+from src.models.scan_stats import ScanStats
 
 
 class FileUtils:
@@ -10,6 +11,7 @@ class FileUtils:
     def get_disk_usage(path: str) -> tuple:
         """获取磁盘使用情况"""
         try:
+            import psutil
             usage = psutil.disk_usage(path)
             return usage.total, usage.used, usage.free
         except:
@@ -29,6 +31,25 @@ class FileUtils:
         except (PermissionError, FileNotFoundError):
             return []
 
+    @staticmethod
+    def scan_directory(path: str, stats: ScanStats = None) -> Iterator[os.DirEntry]:
+        """列出目录条目 - 保留DirEntry，后续判断类型和取大小都复用其缓存的d_type/stat
+
+        目录不可访问时抛出OSError，由调用方决定是否跳过
+        """
+        if stats is not None:
+            stats.scandir_calls += 1
+            stats.directories += 1
+        with os.scandir(path) as it:
+            yield from it
+
+    @staticmethod
+    def entry_stat(entry: os.DirEntry, stats: ScanStats = None) -> os.stat_result:
+        """获取条目stat - 不跟随符号链接，每个条目至多一次系统调用（Windows下无需系统调用）"""
+        if stats is not None:
+            stats.stat_calls += 1
+        return entry.stat(follow_symlinks=False)
+
     @staticmethod
     def is_accessible(path: str) -> bool:
         """检查路径是否可访问"""
@@ -0,0 +1,459 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.core.scan_rules import ScanRules
+from src.core.size_calculator import SizeCalculator
+from src.models.size_node import SizeNode
+
+# inotify常量（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify:
+    """inotify的ctypes封装 - 仅Linux可用"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        """添加监视，watch数耗尽时抛出errno为ENOSPC的OSError"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def remove_watch(self, wd: int):
+        """移除监视（目录已删除时内核会自动移除，忽略错误）"""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> List[Tuple[int, int, int, str]]:
+        """等待并读取事件，返回 (wd, mask, cookie, name) 列表"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        """关闭inotify实例"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class TreeWatcher:
+    """目录树监视器 - 把inotify事件作为增量应用到已缓存的目录树上
+
+    后台线程只负责收集事件并按(目录, 名称)合并，真正修改树的apply_pending由树的所有者线程调用。
+    应用时以lstat得到的当前状态为准，而不是逐条重放事件，因此合并后的事件顺序无关紧要。
+    inotify watch耗尽（max_user_watches）时，剩余目录改为按mtime轮询。
+
+    新出现的目录在后台线程中扫描并添加watch，完成后的子树由apply_pending挂到树上，
+    所有者线程不做整棵子树的IO；后台线程只遍历尚未挂到树上的子树（以及初次添加watch时、
+    apply_pending开始生效之前的整棵树），不会与所有者线程同时读写同一个children字典。
+    事件溢出后的整树重新同步每次apply_pending最多读取RESYNC_BATCH个目录，分多次完成。
+    """
+
+    RESYNC_BATCH = 200
+
+    def __init__(self, root: SizeNode, poll_interval: float = 30.0, rules: ScanRules = None):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.rules = rules or ScanRules()  # 与扫描时相同的排除规则，被排除的条目不加入树
+
+        self._inotify: Optional[Inotify] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+
+        self._watches: Dict[int, SizeNode] = {}
+        self._watch_ids: Dict[SizeNode, int] = {}
+        self._polled: Dict[SizeNode, int] = {}  # 未能watch的目录 -> 上次的mtime_ns
+
+        # 待应用的变化（受_lock保护）
+        self._changed: Set[Tuple[SizeNode, str]] = set()
+        self._moves: Dict[int, List[Optional[Tuple[SizeNode, str]]]] = {}
+        self._resync: Set[SizeNode] = set()
+        self._new_directories: List[Tuple[SizeNode, str]] = []  # 等待后台扫描的新目录 (父目录, 名称)
+        self._scanned: List[Tuple[SizeNode, str, SizeNode]] = []  # 扫描完成、等待挂到树上的子树
+
+        # 只由所有者线程访问
+        self._scanning: Set[Tuple[SizeNode, str]] = set()  # 已交给后台扫描、尚未挂上的新目录
+        self._resync_stack: List[SizeNode] = []  # 未完成的重新同步
+        self._ready = threading.Event()  # 初次添加watch完成后apply_pending才开始修改树
+        self._calculator: Optional[SizeCalculator] = None  # 后台线程正在扫描新目录时的计算器
+
+    @staticmethod
+    def is_supported() -> bool:
+        """当前平台是否支持inotify"""
+        return hasattr(os, 'uname') and os.uname().sysname == 'Linux'
+
+    @property
+    def watched_count(self) -> int:
+        """inotify监视的目录数"""
+        return len(self._watches)
+
+    @property
+    def polled_count(self) -> int:
+        """退化为轮询的目录数"""
+        return len(self._polled)
+
+    def start(self):
+        """启动后台监视线程"""
+        self._inotify = Inotify()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="tree-watcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        """初次添加watch是否已完成"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """等待初次添加watch完成"""
+        return self._ready.wait(timeout)
+
+    def stop(self):
+        """停止监视并释放inotify实例"""
+        self._running = False
+        calculator = self._calculator
+        if calculator is not None:
+            calculator.stop_calculation()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _run(self):
+        """后台线程：先为所有目录添加watch，然后循环收集事件、扫描新目录并轮询未监视的目录"""
+        self._watch_subtree(self.root)
+        self._ready.set()
+        last_poll = time.monotonic()
+
+        while self._running:
+            try:
+                events = self._inotify.read_events(0.5)
+            except OSError:
+                break
+            if events:
+                self._collect(events)
+            self._scan_new_directories()
+
+            if self._polled and time.monotonic() - last_poll >= self.poll_interval:
+                self._poll()
+                last_poll = time.monotonic()
+
+    def _watch_subtree(self, node: SizeNode):
+        """为子树中的所有目录添加watch，耗尽后其余目录加入轮询（在后台线程中调用）"""
+        directories = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            directories.append(current)
+            stack.extend(child for child in current.iter_children() if child.is_directory)
+
+        exhausted = False
+        for current in directories:
+            if not self._running:
+                break
+            path = current.path
+
+            if not exhausted:
+                try:
+                    wd = self._inotify.add_watch(path)
+                    with self._lock:
+                        self._watches[wd] = current
+                        self._watch_ids[current] = wd
+                    continue
+                except OSError as e:
+                    if e.errno != errno.ENOSPC:
+                        continue
+                    exhausted = True
+
+            try:
+                mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                continue
+            with self._lock:
+                self._polled[current] = mtime
+
+    def _scan_new_directories(self):
+        """扫描所有者线程发现的新目录并添加watch，完成的子树交给下一次apply_pending"""
+        while self._running:
+            with self._lock:
+                if not self._new_directories:
+                    return
+                parent, name = self._new_directories.pop(0)
+            path = os.path.join(parent.path, name)
+            self._calculator = SizeCalculator(rules=self.rules)
+            try:
+                subtree = self._calculator.build_tree(path)
+            except OSError:
+                subtree = None
+            finally:
+                self._calculator = None
+            if subtree is not None:
+                # 子树尚未挂到树上，只有本线程访问；添加watch时根节点名仍为完整路径
+                self._watch_subtree(subtree)
+                subtree.name = name
+            with self._lock:
+                self._scanned.append((parent, name, subtree))
+
+    def _collect(self, events):
+        """按(目录, 名称)合并事件"""
+        with self._lock:
+            for wd, mask, cookie, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # 队列溢出说明有事件丢失，只能整树重新同步
+                    self._resync.add(self.root)
+                    continue
+                if mask & IN_IGNORED:
+                    node = self._watches.pop(wd, None)
+                    if node is not None and self._watch_ids.get(node) == wd:
+                        del self._watch_ids[node]
+                    continue
+
+                node = self._watches.get(wd)
+                if node is None or not name:
+                    continue
+
+                if mask & (IN_MOVED_FROM | IN_MOVED_TO) and mask & IN_ISDIR:
+                    # 树内的目录移动直接搬移节点，无需重新扫描
+                    pair = self._moves.setdefault(cookie, [None, None])
+                    pair[0 if mask & IN_MOVED_FROM else 1] = (node, name)
+                else:
+                    self._changed.add((node, name))
+
+    def _poll(self):
+        """检查未被watch的目录，mtime变化的目录在下次应用时重新同步"""
+        with self._lock:
+            polled = list(self._polled.items())
+        for node, mtime in polled:
+            try:
+                current = os.stat(node.path, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                with self._lock:
+                    self._polled[node] = current
+                    self._resync.add(node)
+
+    def apply_pending(self) -> List[SizeNode]:
+        """把累计的变化应用到树上（在树的所有者线程中调用），返回大小发生变化的目录
+
+        只做单个条目的lstat和已扫描子树的挂接，新目录的扫描在后台线程中进行。
+        """
+        if not self._ready.is_set():
+            return []
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            moves, self._moves = self._moves, {}
+            resync, self._resync = self._resync, set()
+            scanned, self._scanned = self._scanned, []
+
+        touched: List[SizeNode] = []
+        for parent, name, subtree in scanned:
+            self._graft(parent, name, subtree, touched)
+        for source, target in moves.values():
+            if source is not None and target is not None and self._move(source, target, touched):
+                continue
+            # 只有一半的移动事件（移入或移出监视范围）按普通变化处理
+            for half in (source, target):
+                if half is not None:
+                    changed.add(half)
+
+        for node, name in changed:
+            self._reconcile(node, name, touched)
+        self._resync_stack.extend(resync)
+        if self._resync_stack:
+            self._resync_directories(touched)
+        return touched
+
+    def _move(self, source: Tuple[SizeNode, str], target: Tuple[SizeNode, str], touched) -> bool:
+        """在树内搬移目录节点"""
+        (from_parent, from_name), (to_parent, to_name) = source, target
+        node = from_parent.children.get(from_name) if from_parent.children else None
+        if node is None or not node.is_directory or not self._attached(from_parent) or not self._attached(to_parent):
+            return False
+
+        del from_parent.children[from_name]
+        self._propagate(from_parent, -node.size, touched)
+        self._remove_child(to_parent, to_name, touched)
+        node.name = to_name
+        to_parent.add_child(node)
+        self._propagate(to_parent, node.size, touched)
+        return True
+
+    def _reconcile(self, parent: SizeNode, name: str, touched):
+        """以磁盘当前状态为准更新parent下名为name的条目（已移出树的目录中的事件忽略）"""
+        if parent.children is None or not self._attached(parent):
+            return
+        path = os.path.join(parent.path, name)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            self._remove_child(parent, name, touched)
+            return
+
+        existing = parent.children.get(name)
+        if stat.S_ISDIR(st.st_mode):
+            if self.rules.excludes_directory(name, path) or (existing is not None and existing.is_directory):
+                # 已存在的目录内部变化由其自身的watch负责
+                return
+            self._remove_child(parent, name, touched)
+            self._add_directory(parent, path, touched)
+        elif stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode):
+            if self.rules.active and self.rules.excludes_file(name, path, st):
+                self._remove_child(parent, name, touched)
+                return
+            if existing is not None and existing.is_directory:
+                self._remove_child(parent, name, touched)
+                existing = None
+            if existing is None:
+                parent.add_child(SizeNode(name, "file", st.st_size))
+                self._propagate(parent, st.st_size, touched)
+            elif existing.size != st.st_size:
+                delta = st.st_size - existing.size
+                existing.size = st.st_size
+                self._propagate(parent, delta, touched)
+
+    def _resync_directories(self, touched):
+        """重新读取目录（用于轮询和事件溢出），子目录递归同步；本次最多读取RESYNC_BATCH个目录，
+        其余留到下一次apply_pending"""
+        stack = self._resync_stack
+        for _ in range(self.RESYNC_BATCH):
+            if not stack:
+                break
+            current = stack.pop()
+            if current.children is None or not self._attached(current):
+                continue
+            try:
+                listing = SizeCalculator(rules=self.rules)._list_directory(current.path)
+            except OSError:
+                continue
+
+            names = {name for name, _ in listing.files} | set(listing.dirs)
+            for name in [name for name in current.children if name not in names]:
+                self._remove_child(current, name, touched)
+            for name, _ in listing.files:
+                self._reconcile(current, name, touched)
+            for name in listing.dirs:
+                child = current.children.get(name)
+                if child is not None and child.is_directory:
+                    stack.append(child)
+                else:
+                    self._reconcile(current, name, touched)
+
+    def _add_directory(self, parent: SizeNode, path: str, touched):
+        """新出现的目录：交给后台线程扫描这一棵子树并加入监视，已在扫描时不重复提交"""
+        key = (parent, os.path.basename(path))
+        if key in self._scanning:
+            return
+        self._scanning.add(key)
+        with self._lock:
+            self._new_directories.append(key)
+
+    def _graft(self, parent: SizeNode, name: str, subtree: Optional[SizeNode], touched):
+        """把后台扫描完成的子树挂到树上；父目录已移除或目录已不存在时丢弃"""
+        self._scanning.discard((parent, name))
+        if subtree is None:
+            return
+        path = os.path.join(parent.path, name)
+        try:
+            is_directory = stat.S_ISDIR(os.lstat(path).st_mode)
+        except OSError:
+            is_directory = False
+        if not is_directory or parent.children is None or not self._attached(parent):
+            self._forget_subtree(subtree)
+            return
+        self._remove_child(parent, name, touched)
+        parent.add_child(subtree)
+        self._propagate(parent, subtree.size, touched)
+
+    def _attached(self, node: SizeNode) -> bool:
+        """节点是否仍在监视的树中"""
+        while node.parent is not None:
+            node = node.parent
+        return node is self.root
+
+    def _remove_child(self, parent: SizeNode, name: str, touched):
+        """移除子节点并扣减祖先大小"""
+        child = parent.children.pop(name, None)
+        if child is None:
+            return
+        child.parent = None  # 之后到达的子树内事件不再累加到祖先
+        self._propagate(parent, -child.size, touched)
+        if child.is_directory:
+            self._forget_subtree(child)
+
+    def _forget_subtree(self, node: SizeNode):
+        """清理已删除子树的watch与轮询记录"""
+        stack = [node]
+        with self._lock:
+            while stack:
+                current = stack.pop()
+                self._polled.pop(current, None)
+                wd = self._watch_ids.pop(current, None)
+                if wd is not None:
+                    self._watches.pop(wd, None)
+                    # 移出监视范围的目录仍然存在，需要主动移除watch
+                    if self._inotify is not None:
+                        self._inotify.remove_watch(wd)
+                stack.extend(child for child in current.iter_children() if child.is_directory)
+
+    @staticmethod
+    def _propagate(node: SizeNode, delta: int, touched):
+        """把大小变化累加到node及其所有祖先"""
+        if delta == 0:
+            return
+        touched.append(node)
+        while node is not None:
+            node.size += delta
+            node = node.parent
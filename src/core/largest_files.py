@@ -0,0 +1,68 @@
+import heapq
+import os
+from itertools import count
+from typing import Iterable, List, Tuple, Union
+
+from src.models.size_node import SizeNode
+
+
+class LargestFiles:
+    """扫描过程中维护的最大文件 - 容量为limit的小顶堆
+
+    堆满后只有大于堆顶（当前第limit大）的文件才入堆，代价O(log N)；
+    绝大多数文件只与threshold比较一次。扫描期间条目保存文件节点，路径在freeze时才拼接。
+    """
+
+    def __init__(self, limit: int = 100):
+        self.limit = max(0, limit)
+        self.threshold = -1  # 堆满后为堆顶大小，不大于它的文件可以直接跳过
+        self._heap: List[Tuple[int, int, Union[SizeNode, str]]] = []  # (大小, 序号, 文件节点或路径)
+        self._seq = count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, size: int, entry: Union[SizeNode, str]):
+        """记录一个文件（节点或完整路径）"""
+        if size <= self.threshold or not self.limit:
+            return
+        item = (size, next(self._seq), entry)
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+        if len(self._heap) == self.limit:
+            self.threshold = self._heap[0][0]
+
+    def freeze(self):
+        """把节点条目换成路径，不再引用扫描树（树可以被压缩或释放）"""
+        self._heap = [(size, seq, entry if isinstance(entry, str) else entry.path)
+                      for size, seq, entry in self._heap]
+
+    def items(self) -> List[Tuple[str, int]]:
+        """按大小降序的 (路径, 大小)"""
+        return [(entry if isinstance(entry, str) else entry.path, size)
+                for size, _, entry in sorted(self._heap, key=lambda item: (-item[0], item[1]))]
+
+    def under(self, path: str) -> List[Tuple[str, int]]:
+        """位于path子树内的最大文件"""
+        prefix = os.path.join(os.path.normpath(path), '')
+        return [(file_path, size) for file_path, size in self.items() if file_path.startswith(prefix)]
+
+    def replace(self, path: str, entries: Iterable[Tuple[str, int]]):
+        """子树重新扫描后，丢弃其中的旧条目并并入新条目
+
+        之前被挤出列表的子树外文件无法恢复，可能遗漏少量本应入选的文件，完整结果需重新扫描根目录。
+        """
+        prefix = os.path.join(os.path.normpath(path), '')
+        kept = [(file_path, size) for file_path, size in self.items() if not file_path.startswith(prefix)]
+        self.merge(kept, reset=True)
+        self.merge(entries)
+
+    def merge(self, entries: Iterable[Tuple[str, int]], reset: bool = False):
+        """并入 (路径, 大小) 条目，reset为True时先清空"""
+        if reset:
+            self._heap = []
+            self.threshold = -1
+        for file_path, size in entries:
+            self.push(size, file_path)
@@ -0,0 +1,265 @@
+import os
+import multiprocessing
+import time
+from array import array
+from dataclasses import astuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Optional, Sequence, Tuple
+
+from src.core.aggregators import Aggregation, Aggregator
+from src.core.largest_files import LargestFiles
+from src.core.scan_profile import ScanProfile
+from src.core.scan_rules import ScanRules
+from src.core.scan_scheduler import ScanBudget
+from src.core.size_calculator import SizeCalculator
+from src.models.scan_stats import ScanStats
+from src.models.size_node import SizeNode
+
+# 打包记录中的类型编码
+TYPE_DIRECTORY = 0
+TYPE_FILE = 1
+
+# 工作进程内的全局状态（由进程池initializer设置）
+_worker_stop_event = None
+_worker_calculator = None
+
+
+def _init_worker(stop_event, rules, aggregators=(), profile=False):
+    """工作进程初始化"""
+    global _worker_stop_event, _worker_calculator
+    _worker_stop_event = stop_event
+    _worker_calculator = SizeCalculator(rules=rules, aggregators=aggregators)
+    if profile:
+        _worker_calculator.profile = ScanProfile()
+        # 各工作进程的主线程同名，按进程号区分
+        _worker_calculator.profile.worker().name = f"process-{os.getpid()}"
+
+
+def _walk_subtree(path: str) -> Tuple[bytes, bytes, bytes, bytes, tuple, list, Optional[dict]]:
+    """在工作进程中遍历一棵子树，结果打包为紧凑缓冲区而不是对象
+
+    返回 (parents, sizes, types, names, stats, aggregates, profile)：
+    parents/sizes 为 array('i')/array('q') 的原始字节，types 每条记录一个字节，
+    names 为以\\0分隔的UTF-8名称表，stats 为ScanStats各字段组成的元组，
+    aggregates 为 [(目录记录编号, 各聚合器对其直接文件的状态)]，
+    profile 为剖析时本任务的计时增量（WorkerProfile.take），否则为None。
+    第0条记录是子树根目录本身。
+    """
+    stats = ScanStats()
+    aggregation = Aggregation(_worker_calculator.aggregators)
+    parents = array('i', [-1])
+    sizes = array('q', [0])
+    types = bytearray([TYPE_DIRECTORY])
+    names = [b'']
+
+    stack = [(0, path)]
+    while stack and not _worker_stop_event.is_set():
+        index, dir_path = stack.pop()
+        try:
+            listing = _worker_calculator._list_directory(dir_path)
+        except (PermissionError, OSError) as e:
+            stats.errors += 1
+            if _worker_calculator.profile is not None:
+                _worker_calculator.profile.worker().error(e)
+            continue
+        stats.merge(listing.stats)
+        if aggregation:
+            aggregation.add_files(index, listing.files, listing.times)
+
+        for name, size in sorted(listing.files):
+            parents.append(index)
+            sizes.append(size)
+            types.append(TYPE_FILE)
+            names.append(os.fsencode(name))
+
+        for name in sorted(listing.dirs):
+            stack.append((len(parents), os.path.join(dir_path, name)))
+            parents.append(index)
+            sizes.append(0)
+            types.append(TYPE_DIRECTORY)
+            names.append(os.fsencode(name))
+
+    profile = _worker_calculator.profile
+    return (parents.tobytes(), sizes.tobytes(), bytes(types), b'\0'.join(names), astuple(stats),
+            list(aggregation.states.items()), profile.worker().take() if profile is not None else None)
+
+
+def unpack_subtree(node: SizeNode, packed: Tuple[bytes, bytes, bytes, bytes, tuple, list, Optional[dict]],
+                   largest: LargestFiles = None, aggregation: Aggregation = None) -> ScanStats:
+    """把工作进程返回的打包结果还原并挂到node下，返回该子树的扫描统计
+
+    设置largest时同时记录最大文件，设置aggregation时并入各目录的聚合状态。
+    """
+    parents_raw, sizes_raw, types, names_raw, stats, aggregates, _ = packed
+    parents = array('i')
+    parents.frombytes(parents_raw)
+    sizes = array('q')
+    sizes.frombytes(sizes_raw)
+    names = names_raw.split(b'\0')
+
+    nodes = [node]
+    for i in range(1, len(parents)):
+        if types[i] == TYPE_FILE:
+            child = SizeNode(os.fsdecode(names[i]), "file", sizes[i])
+            if largest is not None and sizes[i] > largest.threshold:
+                largest.push(sizes[i], child)
+        else:
+            child = SizeNode(os.fsdecode(names[i]), "directory")
+        nodes.append(nodes[parents[i]].add_child(child))
+    if aggregation is not None:
+        for index, states in aggregates:
+            aggregation.add_states(nodes[index], states)
+    return ScanStats(*stats)
+
+
+class ProcessSizeCalculator(SizeCalculator):
+    """多进程大小计算器 - 按子树划分到工作进程，绕开GIL处理海量小文件"""
+
+    # 每个进程至少分到的子树数量，用于平衡负载
+    TASKS_PER_PROCESS = 4
+    # 父进程最多向下展开的层数
+    MAX_PARTITION_DEPTH = 3
+
+    def __init__(self, processes: int = None, rules: ScanRules = None, aggregators: Sequence[Aggregator] = None):
+        # 工作进程直接遍历子树，不使用持久化缓存
+        super().__init__(rules=rules, aggregators=aggregators)
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self._stop_event = None
+
+    def stop_calculation(self):
+        """停止计算，同时通知所有工作进程"""
+        super().stop_calculation()
+        stop_event = self._stop_event
+        if stop_event is not None:
+            stop_event.set()
+
+    def build_tree(self, path: str, budget: ScanBudget = None) -> SizeNode:
+        """构建整棵目录树 - 父进程负责划分与合并，子树遍历交给进程池
+
+        预算按划分粒度生效：耗尽后尚未开始的子树记入self.frontier，已开始的子树会完整读完。
+        停止时工作进程在下一个目录处返回，未合并的子树（含正在读的）同样记入self.frontier。
+        """
+        path = os.path.normpath(path)
+        root = SizeNode(path, "directory")
+        self._begin_scan(root, budget)
+
+        try:
+            started = time.perf_counter()
+            partitions = self._partition(root, path)
+            if partitions and self._is_running:
+                self._walk_partitions(partitions)
+            else:
+                for node, node_path in partitions:
+                    self.frontier.add(node, node_path, 1.0)
+            self._timed("walk", started)
+
+            started = time.perf_counter()
+            root.aggregate()
+            self.aggregation.rollup(root)
+            self.frontier.apply()
+            self._timed("rollup", started)
+        finally:
+            self._end_scan()
+        return root
+
+    def _partition(self, root: SizeNode, path: str) -> List[Tuple[SizeNode, str]]:
+        """在父进程中逐层展开，直到子树数量足够分给所有进程"""
+        target = self.processes * self.TASKS_PER_PROCESS
+        frontier = [(root, path)]
+
+        for _ in range(self.MAX_PARTITION_DEPTH):
+            if not frontier or not self._is_running or len(frontier) >= target:
+                break
+            next_frontier = []
+            for position, (node, node_path) in enumerate(frontier):
+                try:
+                    listing = self._list_directory(node_path)
+                except (PermissionError, OSError) as e:
+                    if node is root:
+                        raise
+                    self._skip_directory(node, e)
+                    continue
+                if not self._is_running:
+                    # 停止时正在读的目录可能不完整，连同本层尚未读取的目录一起返回
+                    return next_frontier + frontier[position:]
+                next_frontier.extend(self._merge_listing(node, node_path, listing))
+            frontier = next_frontier
+
+        return frontier
+
+    def _report_progress(self, node: SizeNode, packed):
+        """按子树上报进度和流式快照（多进程后端的粒度为一个划分）"""
+        if self.progress is None and self.on_snapshot is None:
+            return
+        sizes = array('q')
+        sizes.frombytes(packed[1])
+        subtree_bytes = sum(sizes)
+        if self.progress is not None:
+            self.progress.add(len(sizes) - 1, subtree_bytes)
+        if self.on_snapshot is not None:
+            self._track_directory(node, subtree_bytes, [])
+
+    @staticmethod
+    def _context():
+        """进程池的启动方式：扫描在后台线程中运行，fork时其他线程持有的锁会被复制到子进程中造成死锁，
+        因此用forkserver（不支持时用spawn），工作进程状态由_init_worker重建"""
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+    def _walk_partitions(self, partitions: List[Tuple[SizeNode, str]]):
+        """把子树分发到进程池，按完成顺序合并（合并结果与完成顺序无关）"""
+        context = self._context()
+        self._stop_event = context.Event()
+        pool = ProcessPoolExecutor(
+            max_workers=min(self.processes, len(partitions)),
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._stop_event, self.rules, self.aggregators, self.profile is not None)
+        )
+        try:
+            pending = {pool.submit(_walk_subtree, node_path): (node, node_path)
+                       for node, node_path in partitions}
+            profile = self.profile
+            while pending and self._is_running:
+                if self._budget_exhausted():
+                    self._defer_partitions(pending)
+                if profile is not None:
+                    # 多进程后端按子树调度：已提交未完成的子树都计为在途
+                    profile.sample_queue(0, len(pending))
+                started = time.perf_counter()
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                self._timed("wait", started)
+                if not self._is_running:
+                    # 停止后完成的子树可能只读了一部分，不合并
+                    break
+                for future in done:
+                    if not self._is_running:
+                        # 同一批完成的子树中途被停止，其余留在pending记入frontier
+                        break
+                    node, _ = pending.pop(future)
+                    try:
+                        packed = future.result()
+                    except (PermissionError, OSError) as e:
+                        self._skip_directory(node, e)
+                        continue
+                    started = time.perf_counter()
+                    self.stats.merge(unpack_subtree(node, packed, self.largest, self.aggregation))
+                    self._timed("merge", started)
+                    if profile is not None and packed[6] is not None:
+                        profile.merge_worker(packed[6])
+                    self._report_progress(node, packed)
+        finally:
+            self._stop_event.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._stop_event = None
+
+        # 停止时未合并的子树记入frontier，树仍然一致，可以继续扫描
+        for node, node_path in pending.values():
+            self.frontier.add(node, node_path, 1.0)
+
+    def _defer_partitions(self, pending):
+        """预算耗尽：取消尚未开始的子树，记入frontier"""
+        for future, (node, node_path) in list(pending.items()):
+            if future.cancel():
+                del pending[future]
+                self.frontier.add(node, node_path, 1.0)
@@ -0,0 +1,90 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class ProgressInfo:
+    """扫描进度快照"""
+    entries: int  # 已扫描条目数
+    bytes: int  # 已统计字节数
+    elapsed: float  # 已用时间(秒)
+    entries_per_second: float
+    bytes_per_second: float
+    expected_entries: Optional[int] = None  # 预计条目总数，未知时为None
+    percent: Optional[int] = None  # 0-100，无法估计时为None
+    eta: Optional[float] = None  # 预计剩余时间(秒)
+
+
+class ProgressTracker:
+    """按已扫描条目数和字节数计算进度，并把回调合并到固定频率
+
+    扫描线程每读完一个目录调用一次add，只有距上次回调超过interval时才真正回调，
+    因此无论扫描多快，发往界面的进度信号都不超过 1 / interval 次每秒。
+    扫描结束时的100%由引擎随完成消息一起发出。
+    """
+
+    def __init__(self, callback: Callable[[ProgressInfo], None], interval: float = 0.1,
+                 expected_entries: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.callback = callback
+        self.interval = interval
+        self.expected_entries = expected_entries
+        self.entries = 0
+        self.bytes = 0
+        self._clock = clock
+        self._start = clock()
+        self._last_emit = float("-inf")
+
+    @staticmethod
+    def estimate_entries(path: str, history: Optional[int] = None) -> Optional[int]:
+        """估计条目总数：优先使用上次扫描的记录，扫描挂载点时使用文件系统已用inode数"""
+        if history:
+            return history
+        if hasattr(os, 'statvfs') and os.path.ismount(path):
+            try:
+                st = os.statvfs(path)
+                return max(0, st.f_files - st.f_ffree) or None
+            except OSError:
+                return None
+        return None
+
+    def add(self, entries: int, size: int):
+        """累加一个目录的读取结果"""
+        self.entries += entries
+        self.bytes += size
+        now = self._clock()
+        if now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.callback(self.snapshot(now))
+
+    def snapshot(self, now: float = None) -> ProgressInfo:
+        """生成当前进度"""
+        elapsed = max((self._clock() if now is None else now) - self._start, 1e-6)
+        rate = self.entries / elapsed
+        info = ProgressInfo(
+            entries=self.entries,
+            bytes=self.bytes,
+            elapsed=elapsed,
+            entries_per_second=rate,
+            bytes_per_second=self.bytes / elapsed,
+            expected_entries=self.expected_entries
+        )
+
+        if self.expected_entries:
+            # 实际条目数可能超过历史记录，完成前最多显示99%
+            expected = max(self.expected_entries, self.entries)
+            info.percent = min(99, int(self.entries * 100 / expected))
+            if rate > 0:
+                info.eta = (expected - self.entries) / rate
+        return info
+
+    @staticmethod
+    def format_duration(seconds: float) -> str:
+        """格式化剩余时间"""
+        seconds = int(seconds)
+        if seconds < 60:
+            return f"{seconds}秒"
+        if seconds < 3600:
+            return f"{seconds // 60}分{seconds % 60}秒"
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
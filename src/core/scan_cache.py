@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import threading
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class CachedDirectory:
+    """缓存中的单个目录记录"""
+    path: str
+    dev: int
+    ino: int
+    mtime_ns: int
+    ctime_ns: int
+    size: int  # 聚合大小
+    entry_count: int  # 聚合条目数
+    files: List[Tuple[str, int]]  # 直接包含的(文件名, 大小)
+    subdirs: List[str]  # 直接包含的子目录名
+    file_times: List[Tuple[int, int]] = field(default_factory=list)  # 与files对应的(访问时间, 修改时间)
+    subdir_sizes: List[int] = field(default_factory=list)  # 与subdirs对应的子目录聚合大小
+    excluded_entries: int = 0  # 被排除规则跳过的直接条目数
+    excluded_bytes: int = 0  # 被排除的直接文件大小
+
+    def subdir_history(self) -> Dict[str, int]:
+        """子目录名 -> 上次扫描的聚合大小，用于安排扫描顺序和估算未读取的目录"""
+        return dict(zip(self.subdirs, self.subdir_sizes))
+
+    def matches(self, st: os.stat_result) -> bool:
+        """目录自上次扫描后是否未变化（同一inode且mtime/ctime未变）"""
+        return (self.dev == st.st_dev and self.ino == st.st_ino and
+                self.mtime_ns == st.st_mtime_ns and self.ctime_ns == st.st_ctime_ns)
+
+
+def _pack_names(names: Iterable[str]) -> bytes:
+    """名称列表打包为\\0分隔的字节串"""
+    return b'\0'.join(os.fsencode(name) for name in names)
+
+
+def _unpack_names(blob: bytes) -> List[str]:
+    """还原名称列表"""
+    if not blob:
+        return []
+    return [os.fsdecode(name) for name in blob.split(b'\0')]
+
+
+class ScanCache:
+    """持久化扫描缓存 - SQLite保存每个目录的聚合结果，按目录mtime增量复扫
+
+    目录的mtime只在其直接条目增删改名时变化，所以复扫时仍需逐个目录stat一次来验证；
+    验证通过的目录直接使用缓存的条目列表，不再scandir和stat其中的文件。
+    文件内容追加写入不会改变目录mtime，这类变化需要"重新扫描"才能反映（重新扫描时不复用条目列表，
+    见 SizeCalculator.revalidate）。
+    """
+
+    SCHEMA_VERSION = 4
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS directories (
+            dev INTEGER NOT NULL,
+            ino INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            ctime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            entry_count INTEGER NOT NULL,
+            file_names BLOB NOT NULL,
+            file_sizes BLOB NOT NULL,
+            file_atimes BLOB NOT NULL,
+            file_mtimes BLOB NOT NULL,
+            subdirs BLOB NOT NULL,
+            subdir_sizes BLOB NOT NULL,
+            excluded_entries INTEGER NOT NULL,
+            excluded_bytes INTEGER NOT NULL,
+            PRIMARY KEY (dev, ino, path)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_directories_path ON directories (path);
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            dev INTEGER NOT NULL,
+            ino INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            partial_bytes INTEGER NOT NULL,
+            partial BLOB NOT NULL,
+            full BLOB,
+            PRIMARY KEY (dev, ino)
+        );
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 并行扫描时由多个工作线程读取，统一用锁串行化
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            # 缓存可以随时重建，格式变化时直接丢弃旧表
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS directories; DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS file_hashes;")
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._conn.executescript(self.SCHEMA)
+
+    def bind_rules(self, signature: str):
+        """记录生成缓存时的排除规则，与上次不同时清空缓存"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'rules'").fetchone()
+            if row is not None and row[0] == signature:
+                return
+            if row is not None:
+                self._conn.execute("DELETE FROM directories")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('rules', ?)", (signature,))
+
+    def get(self, path: str, st: os.stat_result) -> Optional[CachedDirectory]:
+        """按(st_dev, st_ino, path)读取目录记录，不存在时返回None（不判断是否过期）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dev, ino, path, mtime_ns, ctime_ns, size, entry_count, "
+                "file_names, file_sizes, subdirs, subdir_sizes, excluded_entries, excluded_bytes, "
+                "file_atimes, file_mtimes "
+                "FROM directories "
+                "WHERE dev = ? AND ino = ? AND path = ?",
+                (st.st_dev, st.st_ino, path)
+            ).fetchone()
+        if row is None:
+            return None
+
+        sizes = array('q')
+        sizes.frombytes(row[8])
+        subdir_sizes = array('q')
+        subdir_sizes.frombytes(row[10])
+        atimes = array('q')
+        atimes.frombytes(row[13])
+        mtimes = array('q')
+        mtimes.frombytes(row[14])
+        return CachedDirectory(
+            path=row[2], dev=row[0], ino=row[1], mtime_ns=row[3], ctime_ns=row[4],
+            size=row[5], entry_count=row[6],
+            files=list(zip(_unpack_names(row[7]), sizes)),
+            file_times=list(zip(atimes, mtimes)),
+            subdirs=_unpack_names(row[9]),
+            subdir_sizes=subdir_sizes.tolist(),
+            excluded_entries=row[11], excluded_bytes=row[12]
+        )
+
+    def get_totals(self, path: str) -> Optional[Tuple[int, int]]:
+        """读取路径上次扫描的(聚合大小, 聚合条目数)，不验证是否过期"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, entry_count FROM directories WHERE path = ?", (path,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_many(self, records: Iterable[CachedDirectory]):
+        """批量写入目录记录（单个事务）"""
+        rows = [
+            (r.dev, r.ino, r.path, r.mtime_ns, r.ctime_ns, r.size, r.entry_count,
+             _pack_names(name for name, _ in r.files),
+             array('q', (size for _, size in r.files)).tobytes(),
+             array('q', (atime for atime, _ in r.file_times)).tobytes(),
+             array('q', (mtime for _, mtime in r.file_times)).tobytes(),
+             _pack_names(r.subdirs),
+             array('q', r.subdir_sizes).tobytes(),
+             r.excluded_entries, r.excluded_bytes)
+            for r in records
+        ]
+        with self._lock, self._conn:
+            # 同一路径换了inode（删除后重建）时旧记录一并清理
+            self._conn.executemany(
+                "DELETE FROM directories WHERE path = ? AND NOT (dev = ? AND ino = ?)",
+                [(row[2], row[0], row[1]) for row in rows]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def get_hash(self, st: os.stat_result, partial_bytes: int) -> Optional[Tuple[bytes, Optional[bytes]]]:
+        """按(dev, inode, 大小, mtime)读取文件的(首尾摘要, 完整摘要)，文件变化或首尾长度不同时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT partial, full FROM file_hashes "
+                "WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND partial_bytes = ?",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, partial_bytes)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_hashes(self, rows: Iterable[Tuple[int, int, int, int, int, bytes, Optional[bytes]]]):
+        """批量写入 (dev, ino, 大小, mtime_ns, 首尾长度, 首尾摘要, 完整摘要)"""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def remove_tree(self, paths: Iterable[str]):
+        """删除已不存在的目录及其所有后代记录"""
+        with self._lock, self._conn:
+            for path in paths:
+                prefix = path.rstrip(os.sep) + os.sep
+                self._conn.execute(
+                    "DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (path, len(prefix), prefix)
+                )
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM directories")
+            self._conn.execute("DELETE FROM file_hashes")
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
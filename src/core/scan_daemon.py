@@ -0,0 +1,402 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import Settings
+from src.core.backends import open_scan_cache
+from src.core.engine import EVENT_ERROR, EVENT_PARTIAL, EVENT_PROGRESS, ScanEngine, ScanEvent, ScanOptions
+from src.core.tree_cache import SizeTreeCache
+from src.models.analysis_result import AnalysisResult
+
+PROTOCOL_VERSION = 1
+DEFAULT_LIMIT = 1000  # 结果中最多返回的子项数
+PARTIAL_LIMIT = Settings.MAX_DIRECTORY_ITEMS  # 中间结果中的子项数（只够图表和列表首屏使用）
+MAX_REQUEST = 64 * 1024
+
+# 扫描类请求: 操作 -> 扫描方式
+SCAN_OPS = {"scan": "scan", "top": "scan", "refresh": "refresh", "resume": "resume"}
+
+
+def default_socket_path() -> str:
+    """默认套接字路径，按用户区分；多个用户共享时用 --socket 指定同一路径并用 --mode 放开组权限
+
+    没有XDG_RUNTIME_DIR时放在临时目录下只有本用户可访问的子目录中（见check_private_directory），
+    其他用户无法抢先创建同名套接字冒充守护进程。
+    """
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    user = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    if runtime:
+        return os.path.join(runtime, f"notos-scan-{user}.sock")
+    return os.path.join(_private_directory(), "scan.sock")
+
+
+def _private_directory() -> str:
+    """没有XDG_RUNTIME_DIR时存放默认套接字的目录"""
+    user = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(tempfile.gettempdir(), f"notos-scan-{user}")
+
+
+def check_private_directory(socket_path: str, create: bool = False):
+    """套接字位于默认的私有目录时，确认该目录属于当前用户且只有当前用户可访问（create为True时先创建）
+
+    目录不存在（守护进程未运行）时抛出DaemonUnavailable，属主或权限不对时抛出DaemonError。
+    """
+    directory = os.path.dirname(socket_path)
+    if not hasattr(os, "getuid") or directory != _private_directory():
+        return
+    if create:
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    try:
+        st = os.lstat(directory)
+    except FileNotFoundError:
+        raise DaemonUnavailable(f"扫描守护进程未运行: {socket_path}")
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise DaemonError(f"套接字目录不属于当前用户或其他用户可访问，拒绝使用: {directory}")
+
+
+class DaemonError(Exception):
+    """守护进程不可用或请求失败"""
+
+
+class DaemonUnavailable(DaemonError):
+    """无法连接守护进程，或守护进程中途断开（已退出）"""
+
+
+def encode_result(result: AnalysisResult, limit: int = DEFAULT_LIMIT) -> Dict[str, Any]:
+    """结果转为可JSON序列化的字典，子项、最大文件和冷数据排行各取前limit个"""
+    data = replace(result, items=list(result.items[:limit]), largest_files=result.largest_files[:limit],
+                   cold_items=result.cold_items[:limit]).to_dict()
+    data["total_items"] = len(result.items)
+    return data
+
+
+def decode_result(data: Optional[Dict[str, Any]]) -> Optional[AnalysisResult]:
+    """encode_result的逆操作"""
+    if data is None:
+        return None
+    data = dict(data)
+    data.pop("total_items", None)
+    return AnalysisResult.from_dict(data)
+
+
+class _Flight:
+    """一次进行中的扫描 - 等待它的请求共享同一个结果，进度推送给所有等待者"""
+
+    def __init__(self, path: str, kind: str):
+        self.path = path
+        self.kind = kind
+        self.done = threading.Event()
+        self.result: Optional[AnalysisResult] = None
+        self.error: Optional[BaseException] = None
+        self.errors: List[str] = []  # 扫描中报告的错误（如目录无法读取）
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def add(self, listener):
+        if listener is not None:
+            with self._lock:
+                self.listeners.append(listener)
+
+    def remove(self, listener):
+        with self._lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def notify(self, message: Dict[str, Any]):
+        """推送给所有等待者，已断开的连接不再推送（扫描继续，结果留在缓存中）"""
+        with self._lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(message)
+            except OSError:
+                self.remove(listener)
+
+
+class ScanDaemon:
+    """扫描守护进程 - 持有扫描引擎和目录树缓存，通过本地Unix套接字为多个客户端提供查询
+
+    协议为每个连接一个请求，请求和响应各占一行JSON。扫描类请求在最终的 result 行之前
+    可能先收到 progress/partial/warning 行。同一路径（或其祖先）正在扫描时，新请求等待
+    同一次扫描而不再重复读盘；扫描逐个执行，多个卷的扫描不互相争抢IO。客户端断开不会取消扫描，
+    结果仍留在缓存中供之后的请求使用。
+
+    请求: {"op": 操作, "path": 路径, ...}
+        ping      版本、已缓存的根目录和进行中的扫描
+        children  已缓存目录的直接子项（不访问磁盘），未缓存时result为null
+        scan      目录的结果，未缓存时扫描；path为null时返回磁盘列表
+        top       子树内最大的limit个文件和最大的limit个直接子项，未缓存时扫描
+        refresh   重新扫描子树
+        resume    继续读取上次预算耗尽时未读取的目录
+    """
+
+    def __init__(self, socket_path: str = None, engine: ScanEngine = None, mode: int = 0o600):
+        self.socket_path = socket_path or default_socket_path()
+        if engine is None:
+            # 守护进程在后台把树读完整，不设时间预算
+            options = replace(ScanOptions.from_settings(), budget_seconds=None, budget_directories=None)
+            engine = ScanEngine(SizeTreeCache(compact=Settings.COMPACT_TREES), open_scan_cache(), options)
+        self.engine = engine
+        self.mode = mode
+        self.scans = 0  # 实际启动的扫描次数
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()  # 同一时刻只运行一次扫描
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def is_available() -> bool:
+        """当前平台是否支持Unix套接字"""
+        return hasattr(socket, "AF_UNIX")
+
+    def start(self) -> 'ScanDaemon':
+        """绑定套接字并在后台线程中处理请求；已有守护进程在监听或套接字目录不安全时抛出DaemonError"""
+        check_private_directory(self.socket_path, create=True)
+        if os.path.exists(self.socket_path):
+            try:
+                ScanClient(self.socket_path, timeout=1).ping()
+            except DaemonError:
+                os.remove(self.socket_path)  # 上次异常退出留下的套接字文件
+            else:
+                raise DaemonError(f"已有守护进程在监听: {self.socket_path}")
+
+        daemon = self
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            scan_daemon = daemon
+
+        self._server = Server(self.socket_path, _RequestHandler)
+        os.chmod(self.socket_path, self.mode)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="scan-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        """停止接受请求并删除套接字文件（进行中的扫描随进程退出）"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def warm(self, paths: List[str]) -> threading.Thread:
+        """在后台依次扫描这些目录，之后的请求直接从缓存回答"""
+        def run():
+            for path in paths:
+                try:
+                    self._scan(os.path.abspath(path), "scan")
+                except (DaemonError, OSError):
+                    pass
+
+        thread = threading.Thread(target=run, name="scan-daemon-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def handle(self, request: Dict[str, Any], send: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """执行一个请求，send用于推送进度等中间消息；返回最终响应的字段"""
+        op = request.get("op")
+        path = request.get("path")
+        path = os.path.normpath(os.path.abspath(path)) if path else None
+        limit = int(request.get("limit", DEFAULT_LIMIT))
+
+        if op == "ping":
+            with self._lock:
+                flights = [{"path": flight.path, "kind": flight.kind, "clients": len(flight.listeners)}
+                           for flight in self._flights.values()]
+            roots = self.engine.tree_cache.root_paths() if self.engine.tree_cache is not None else []
+            return {"version": PROTOCOL_VERSION, "app_version": Settings.APP_VERSION, "scans": self.scans,
+                    "in_flight": flights, "roots": roots}
+        if op == "children":
+            if path is None:
+                raise DaemonError("缺少path")
+            result = self.engine.cached_result(path)
+            return {"result": encode_result(result, limit) if result is not None else None}
+        if op not in SCAN_OPS:
+            raise DaemonError(f"未知的请求: {op}")
+
+        if path is None:
+            if op != "scan":
+                raise DaemonError("缺少path")
+            # 磁盘列表只读取分区信息，不需要去重
+            return {"result": encode_result(self.engine.scan(None), limit), "errors": []}
+        result, errors = self._scan(path, SCAN_OPS[op], send)
+        if op == "top":
+            return {"path": path, "largest_files": [(item.path, item.size) for item in result.largest_files[:limit]],
+                    "children": [(item.path, item.size, item.item_type) for item in result.items[:limit]],
+                    "errors": errors}
+        return {"result": encode_result(result, limit), "errors": errors}
+
+    def _scan(self, path: str, kind: str, listener=None) -> Tuple[AnalysisResult, List[str]]:
+        """取得path的结果：已缓存时直接返回，否则加入或发起一次扫描并等待"""
+        if kind == "scan":
+            result = self.engine.cached_result(path)
+            if result is not None:
+                return result, []
+
+        flight, owner = self._join(path, kind, listener)
+        try:
+            if owner:
+                self._run(flight)
+            else:
+                flight.done.wait()
+        finally:
+            flight.remove(listener)
+
+        if flight.error is not None:
+            raise DaemonError(f"扫描失败: {flight.error}")
+        result = flight.result if flight.path == path else self.engine.cached_result(path)
+        if result is None:
+            raise DaemonError(f"扫描未完成: {path}")
+        return result, flight.errors
+
+    def _join(self, path: str, kind: str, listener) -> Tuple[_Flight, bool]:
+        """加入能回答该请求的进行中扫描，没有时登记一次新扫描；返回 (扫描, 是否由调用者执行)"""
+        with self._lock:
+            for flight in self._flights.values():
+                if self._covers(flight, path, kind):
+                    flight.add(listener)
+                    return flight, False
+            flight = self._flights[(path, kind)] = _Flight(path, kind)
+            flight.add(listener)
+            return flight, True
+
+    @staticmethod
+    def _covers(flight: _Flight, path: str, kind: str) -> bool:
+        """进行中的扫描完成后是否能回答该请求：普通请求可以等待同一路径或祖先的任何扫描，
+        重新扫描只等待同一路径或祖先的重新扫描，继续扫描只等待同一路径的继续扫描"""
+        within = path == flight.path or path.startswith(flight.path.rstrip(os.sep) + os.sep)
+        if kind == "scan":
+            return within
+        if kind == "refresh":
+            return within and flight.kind == "refresh"
+        return path == flight.path and flight.kind == kind
+
+    def _run(self, flight: _Flight):
+        """执行一次扫描（在发起请求的连接线程中），完成后唤醒所有等待者"""
+        try:
+            with self._scan_lock:
+                job = self.engine.job(flight.path, refresh=flight.kind == "refresh", resume=flight.kind == "resume",
+                                      on_event=lambda event: self._on_event(flight, event))
+                self.scans += 1
+                flight.result = job.run()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop((flight.path, flight.kind), None)
+            flight.done.set()
+
+    @staticmethod
+    def _on_event(flight: _Flight, event: ScanEvent):
+        """引擎事件转为推送消息（事件已限频）"""
+        if event.kind == EVENT_PROGRESS:
+            flight.notify({"type": "progress", "percent": event.percent, "message": event.message})
+        elif event.kind == EVENT_PARTIAL:
+            flight.notify({"type": "partial", "percent": event.percent, "message": event.message,
+                           "result": encode_result(event.result, PARTIAL_LIMIT)})
+        elif event.kind == EVENT_ERROR:
+            flight.errors.append(event.message)
+            flight.notify({"type": "warning", "message": event.message})
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """读取一行请求，推送中间消息，最后写出 result 或 error 行"""
+
+    def handle(self):
+        lock = threading.Lock()
+
+        def send(message):
+            with lock:
+                self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+        try:
+            request = json.loads(self.rfile.readline(MAX_REQUEST))
+            if not isinstance(request, dict):
+                raise ValueError("请求必须是JSON对象")
+            response = self.server.scan_daemon.handle(request, send)
+        except (DaemonError, ValueError, TypeError) as e:
+            response = {"type": "error", "message": str(e)}
+        else:
+            response = dict(response, type="result")
+        try:
+            send(response)
+        except OSError:
+            pass  # 客户端已断开
+
+
+class ScanClient:
+    """守护进程客户端 - 每个请求一个连接，close可从其他线程中止正在等待的请求"""
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout  # 连接和每次读取的超时（秒），None为一直等待（扫描可能很久）
+        self._sock: Optional[socket.socket] = None
+
+    def request(self, op: str, path: str = None, on_message: Callable[[Dict[str, Any]], None] = None,
+                **params) -> Dict[str, Any]:
+        """发送请求，中间消息交给on_message，返回最终响应；连接失败时抛出DaemonUnavailable，守护进程报错时抛出DaemonError"""
+        if not ScanDaemon.is_available():
+            raise DaemonUnavailable("当前平台不支持Unix套接字")
+        check_private_directory(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        self._sock = sock
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps(dict(params, op=op, path=path), ensure_ascii=False) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    message = json.loads(line)
+                    if message.get("type") == "result":
+                        return message
+                    if message.get("type") == "error":
+                        raise DaemonError(message.get("message", "守护进程返回错误"))
+                    if on_message is not None:
+                        on_message(message)
+        except (OSError, ValueError) as e:
+            raise DaemonUnavailable(f"无法连接扫描守护进程 {self.socket_path}: {e}")
+        finally:
+            self._sock = None
+            sock.close()
+        raise DaemonUnavailable("扫描守护进程关闭了连接")
+
+    def close(self):
+        """中止正在等待的请求（守护进程中的扫描继续进行）"""
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def ping(self) -> Dict[str, Any]:
+        return self.request("ping")
+
+    def children(self, path: str, limit: int = DEFAULT_LIMIT) -> Optional[AnalysisResult]:
+        """已缓存目录的结果，未缓存时返回None（不会触发扫描）"""
+        return decode_result(self.request("children", path, limit=limit)["result"])
+
+    def scan(self, path: Optional[str], refresh: bool = False, resume: bool = False,
+             on_message: Callable[[Dict[str, Any]], None] = None, limit: int = DEFAULT_LIMIT) -> AnalysisResult:
+        """目录的结果（未缓存时由守护进程扫描，与其他客户端的相同请求合并），path为None时为磁盘列表"""
+        op = "refresh" if refresh else "resume" if resume else "scan"
+        return decode_result(self.request(op, path, on_message, limit=limit)["result"])
+
+    def top(self, path: str, limit: int = 10) -> Dict[str, Any]:
+        """子树内最大的文件和最大的直接子项"""
+        return self.request("top", path, limit=limit)
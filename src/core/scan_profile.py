@@ -0,0 +1,203 @@
+import errno
+import threading
+import time
+from typing import Any, Dict, List
+
+from src.models.scan_stats import ScanStats
+
+# 各阶段的说明，报告和调试面板按此顺序列出（未出现的阶段省略）
+PHASES = {
+    "cache_lookup": "缓存验证（stat目录、查询缓存）",
+    "scandir": "打开和遍历目录（含逐项判断类型）",
+    "stat": "lstat文件和符号链接",
+    "merge": "合并到目录树（Python簿记）",
+    "wait": "扫描线程等待工作线程",
+    "events": "事件/信号投递",
+    "partial_result": "生成中间结果",
+    "rollup": "汇总目录大小和聚合状态",
+    "cache_save": "写回持久化缓存",
+    "store": "存入目录树缓存（压缩）",
+    "result": "生成最终结果",
+}
+
+
+def _accumulate(phases: Dict[str, List[float]], phase: str, seconds: float, count: int):
+    entry = phases.get(phase)
+    if entry is None:
+        phases[phase] = [seconds, count]
+    else:
+        entry[0] += seconds
+        entry[1] += count
+
+
+def error_type(error: OSError) -> str:
+    """错误的分类名：有errno时取其符号名（如EACCES），否则取异常类名"""
+    return errno.errorcode.get(error.errno, type(error).__name__) if error.errno else type(error).__name__
+
+
+class WorkerProfile:
+    """单个工作线程（或工作进程）的计时和错误计数 - 只由所属线程写入，无需加锁"""
+
+    __slots__ = ("name", "busy", "directories", "phases", "errors")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.busy = 0.0  # 读取目录的总耗时（各阶段之和）
+        self.directories = 0
+        self.phases: Dict[str, List[float]] = {}  # 阶段 -> [秒数, 次数]
+        self.errors: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float, count: int = 1):
+        _accumulate(self.phases, phase, seconds, count)
+        self.busy += seconds
+
+    def error(self, error: OSError):
+        key = error_type(error)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def take(self) -> Dict[str, Any]:
+        """取出当前计数并清零（工作进程每个任务返回一次增量）"""
+        data = {"name": self.name, "busy": self.busy, "directories": self.directories,
+                "phases": self.phases, "errors": self.errors}
+        self.busy = 0.0
+        self.directories = 0
+        self.phases = {}
+        self.errors = {}
+        return data
+
+
+class ScanProfile:
+    """扫描剖析 - 分阶段计时、按类型统计错误、各工作线程的利用率和待读队列深度
+
+    只在开启剖析时创建，关闭时计算器和引擎上为None，热路径上只多一次 is None 判断。
+    扫描线程上的阶段直接累加；工作线程各自写入线程局部的WorkerProfile，生成报告时再合并。
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, List[float]] = {}  # 阶段 -> [秒数, 次数]
+        self.errors: Dict[str, int] = {}  # 扫描线程上发现的错误（如目录无法打开）
+        self.workers: Dict[str, WorkerProfile] = {}
+        self.queue_samples = 0
+        self.queued_total = 0
+        self.queued_max = 0
+        self.in_flight_total = 0
+        self.in_flight_max = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def add(self, phase: str, seconds: float, count: int = 1):
+        """累加扫描线程上一个阶段的耗时"""
+        _accumulate(self.phases, phase, seconds, count)
+
+    def error(self, error: OSError):
+        key = error_type(error)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def worker(self) -> WorkerProfile:
+        """当前线程的WorkerProfile，第一次调用时创建"""
+        worker = getattr(self._local, "worker", None)
+        if worker is None:
+            worker = self._local.worker = WorkerProfile(threading.current_thread().name)
+            with self._lock:
+                self.workers[worker.name] = worker
+        return worker
+
+    def merge_worker(self, data: Dict[str, Any]):
+        """并入工作进程返回的计数（WorkerProfile.take的结果）"""
+        with self._lock:
+            worker = self.workers.get(data["name"])
+            if worker is None:
+                worker = self.workers[data["name"]] = WorkerProfile(data["name"])
+        worker.busy += data["busy"]
+        worker.directories += data["directories"]
+        for phase, (seconds, count) in data["phases"].items():
+            _accumulate(worker.phases, phase, seconds, count)
+        for key, count in data["errors"].items():
+            worker.errors[key] = worker.errors.get(key, 0) + count
+
+    def sample_queue(self, queued: int, in_flight: int):
+        """记录一次调度时的待读目录数和在途读取数"""
+        self.queue_samples += 1
+        self.queued_total += queued
+        self.in_flight_total += in_flight
+        if queued > self.queued_max:
+            self.queued_max = queued
+        if in_flight > self.in_flight_max:
+            self.in_flight_max = in_flight
+
+    def report(self, stats: ScanStats = None, **info) -> Dict[str, Any]:
+        """生成JSON可序列化的报告，info中的字段（路径、后端等）原样放在最前面"""
+        elapsed = time.perf_counter() - self._start
+        phases = {name: list(entry) for name, entry in self.phases.items()}
+        errors = dict(self.errors)
+        workers = []
+        # 工作线程的利用率以遍历阶段的墙钟时间为分母，没有遍历时用整次分析的时间
+        walk = phases.pop("walk", [elapsed])[0] or elapsed
+        with self._lock:
+            snapshot = list(self.workers.values())
+        for worker in snapshot:
+            for phase, (seconds, count) in worker.phases.items():
+                _accumulate(phases, phase, seconds, count)
+            for key, count in worker.errors.items():
+                errors[key] = errors.get(key, 0) + count
+            workers.append({"name": worker.name, "busy": worker.busy, "directories": worker.directories,
+                            "utilization": min(1.0, worker.busy / walk) if walk > 0 else 0.0})
+        workers.sort(key=lambda worker: worker["name"])
+
+        samples = self.queue_samples
+        return {
+            **info,
+            "elapsed": elapsed,
+            "walk": walk,
+            "phases": {name: {"seconds": phases[name][0], "count": phases[name][1]}
+                       for name in sorted(phases, key=self._phase_order)},
+            "counts": stats.to_dict() if stats is not None else {},
+            "errors": errors,
+            "workers": workers,
+            "queue": {
+                "samples": samples,
+                "max_queued": self.queued_max,
+                "mean_queued": self.queued_total / samples if samples else 0.0,
+                "max_in_flight": self.in_flight_max,
+                "mean_in_flight": self.in_flight_total / samples if samples else 0.0,
+            },
+        }
+
+    @staticmethod
+    def _phase_order(name: str):
+        order = list(PHASES)
+        return (order.index(name), name) if name in PHASES else (len(order), name)
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> List[str]:
+        """把报告格式化为文本行（命令行和调试面板使用）
+
+        工作线程上的阶段（缓存验证、遍历目录、lstat）是各线程之和，并行时占比可能超过100%。
+        """
+        elapsed = report.get("elapsed", 0.0)
+        lines = [f"路径: {report.get('path') or '所有磁盘'}  后端: {report.get('backend', '-')}"
+                 f"  总耗时: {elapsed:.3f}s  遍历: {report.get('walk', 0.0):.3f}s"]
+
+        lines.append(f"{'阶段':<14}{'耗时(s)':>10}{'占比':>8}{'次数':>10}  说明")
+        for name, entry in report.get("phases", {}).items():
+            share = entry["seconds"] / elapsed if elapsed > 0 else 0.0
+            lines.append(f"{name:<14}{entry['seconds']:>10.3f}{share:>8.1%}{entry['count']:>10,}  "
+                         f"{PHASES.get(name, '')}")
+
+        counts = report.get("counts", {})
+        if counts:
+            lines.append("计数: " + ", ".join(f"{name}={value:,}" for name, value in counts.items()))
+        errors = report.get("errors", {})
+        if errors:
+            lines.append("错误: " + ", ".join(f"{name}={count:,}"
+                                             for name, count in sorted(errors.items(), key=lambda item: -item[1])))
+
+        for worker in report.get("workers", []):
+            lines.append(f"工作线程 {worker['name']}: 忙碌 {worker['busy']:.3f}s"
+                         f"（{worker['utilization']:.0%}），{worker['directories']:,} 个目录")
+        queue = report.get("queue", {})
+        if queue.get("samples"):
+            lines.append(f"队列: 待读 平均 {queue['mean_queued']:.1f} / 最大 {queue['max_queued']:,}，"
+                         f"在途 平均 {queue['mean_in_flight']:.1f} / 最大 {queue['max_in_flight']:,}")
+        return lines
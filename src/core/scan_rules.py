@@ -0,0 +1,137 @@
+import fnmatch
+import os
+import re
+import time
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+# 大小单位（规则中的 size>10M 等写法）
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+# 时间单位（规则中的 age>30d 等写法）
+_AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+
+_PREDICATE = re.compile(r'^(size|age)\s*([<>])\s*(\d+(?:\.\d+)?)\s*([A-Za-z]?)B?$')
+
+
+def _combine(patterns: List[str]) -> Optional[Pattern]:
+    """多个正则合并为一个，匹配时只需一次调用"""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+class _Matcher:
+    """一组规则编译后的匹配器"""
+
+    def __init__(self, rules: Iterable[str], now: float):
+        name_patterns = []
+        path_patterns = []
+        self.prefixes = set()
+        self.size_above: Optional[int] = None
+        self.size_below: Optional[int] = None
+        self.mtime_before: Optional[float] = None  # 修改时间早于此时刻（age>）
+        self.mtime_after: Optional[float] = None  # 修改时间晚于此时刻（age<）
+
+        for rule in rules:
+            rule = rule.strip()
+            predicate = _PREDICATE.match(rule)
+            if rule.startswith('re:'):
+                path_patterns.append(rule[3:])
+            elif rule.startswith('path:'):
+                self.prefixes.add(os.path.normpath(rule[5:]))
+            elif predicate:
+                self._add_predicate(*predicate.groups(), now=now)
+            elif os.sep in rule or '/' in rule:
+                path_patterns.append(fnmatch.translate(os.path.normpath(rule)))
+            else:
+                name_patterns.append(fnmatch.translate(rule))
+
+        self.names = _combine(name_patterns)
+        self.paths = _combine(path_patterns)
+        self.has_file_predicates = any(value is not None for value in (
+            self.size_above, self.size_below, self.mtime_before, self.mtime_after))
+        self.active = bool(self.names or self.paths or self.prefixes or self.has_file_predicates)
+
+    def _add_predicate(self, kind: str, op: str, number: str, unit: str, now: float):
+        """解析 size>10M / age>30d 形式的谓词"""
+        units = _SIZE_UNITS if kind == 'size' else _AGE_UNITS
+        key = unit.upper() if kind == 'size' else (unit.lower() or 'd')
+        if key not in units:
+            raise ValueError(f"无效的规则单位: {kind}{op}{number}{unit}")
+        if kind == 'size':
+            value = int(float(number) * units[key])
+            if op == '>':
+                self.size_above = value
+            else:
+                self.size_below = value
+        else:
+            moment = now - float(number) * units[key]
+            if op == '>':
+                self.mtime_before = moment
+            else:
+                self.mtime_after = moment
+
+    def matches_path(self, name: str, path: str) -> bool:
+        """名称通配、路径通配/正则和路径前缀"""
+        if self.names is not None and self.names.match(name):
+            return True
+        if self.paths is not None and self.paths.search(path):
+            return True
+        return path in self.prefixes
+
+    def matches_file(self, name: str, path: str, st: os.stat_result) -> bool:
+        """文件额外匹配大小和修改时间谓词"""
+        if self.matches_path(name, path):
+            return True
+        if not self.has_file_predicates:
+            return False
+        return ((self.size_above is not None and st.st_size > self.size_above) or
+                (self.size_below is not None and st.st_size < self.size_below) or
+                (self.mtime_before is not None and st.st_mtime < self.mtime_before) or
+                (self.mtime_after is not None and st.st_mtime > self.mtime_after))
+
+
+class ScanRules:
+    """扫描排除/包含规则 - 编译一次，在目录入队前判断，被排除的子树不会被打开
+
+    每条规则是一个字符串：
+      node_modules / *.tmp      按名称通配
+      /home/*/.cache            含路径分隔符时按完整路径通配
+      re:/snapshots?/           对完整路径做正则搜索
+      path:/proc                路径前缀（该目录及其整棵子树）
+      size>10G / size<4K        文件大小
+      age>365d / age<1h         文件修改时间距今（单位 s/m/h/d/w/y）
+    条目命中任一排除规则且不命中任何包含规则时被排除。大小和时间谓词只作用于文件，
+    使用扫描时本来就会取得的lstat结果，不增加系统调用。时间谓词相对创建规则的时刻，
+    结果随时间变化，含时间谓词时不复用持久化缓存中过滤后的条目列表（见time_dependent）。
+    """
+
+    def __init__(self, exclude: Iterable[str] = (), include: Iterable[str] = ()):
+        self.exclude_rules: Tuple[str, ...] = tuple(exclude)
+        self.include_rules: Tuple[str, ...] = tuple(include)
+        now = time.time()
+        self._exclude = _Matcher(self.exclude_rules, now)
+        self._include = _Matcher(self.include_rules, now)
+
+    @property
+    def active(self) -> bool:
+        """是否有任何排除规则"""
+        return self._exclude.active
+
+    @property
+    def time_dependent(self) -> bool:
+        """是否含age谓词：目录未变时过滤结果也会随时间变化"""
+        return any(matcher.mtime_before is not None or matcher.mtime_after is not None
+                   for matcher in (self._exclude, self._include))
+
+    @property
+    def signature(self) -> str:
+        """规则集的标识，规则变化时持久化缓存中按旧规则过滤的条目列表随之失效"""
+        return repr((sorted(self.exclude_rules), sorted(self.include_rules)))
+
+    def excludes_directory(self, name: str, path: str) -> bool:
+        """目录是否排除（入队前调用）"""
+        return self._exclude.matches_path(name, path) and not self._include.matches_path(name, path)
+
+    def excludes_file(self, name: str, path: str, st: os.stat_result) -> bool:
+        """文件是否排除"""
+        return self._exclude.matches_file(name, path, st) and not self._include.matches_file(name, path, st)
@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.models.disk_item import SIZE_ESTIMATED, SIZE_PARTIAL
+from src.models.scan_stats import ScanStats
+from src.models.size_node import SizeNode
+
+
+@dataclass
+class ScanBudget:
+    """一次分析可用的预算 - 时间和/或读取的目录数，None表示不限"""
+    seconds: Optional[float] = None
+    directories: Optional[int] = None
+    _deadline: Optional[float] = field(default=None, init=False, repr=False)
+
+    def start(self):
+        """开始计时"""
+        self._deadline = time.monotonic() + self.seconds if self.seconds else None
+
+    def exhausted(self, stats: ScanStats) -> bool:
+        """预算是否已用完（目录数包含直接复用缓存的目录）"""
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return True
+        return self.directories is not None and stats.directories + stats.revalidated >= self.directories
+
+
+class ScanQueue:
+    """待读取目录的优先队列 - 预计大小越大越先读取
+
+    预计大小优先取缓存中上次扫描的结果；没有历史记录时由父目录的预计大小平均分给各子目录，
+    因此预算耗尽时剩下的通常是较小的子树。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()  # 预计大小相同时按入队顺序，即广度优先
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, node: SizeNode, path: str, expected: float, history: Optional[int] = None):
+        """入队，history为缓存中该目录上次的聚合大小"""
+        heapq.heappush(self._heap, (-expected, next(self._counter), node, path, history))
+
+    def pop(self) -> Tuple[SizeNode, str, float, Optional[int]]:
+        """取出预计最大的目录"""
+        expected, _, node, path, history = heapq.heappop(self._heap)
+        return node, path, -expected, history
+
+    def drain(self) -> Iterator[Tuple[SizeNode, str, float, Optional[int]]]:
+        """按优先级依次取出所有剩余目录"""
+        while self._heap:
+            yield self.pop()
+
+
+class ScanFrontier:
+    """预算耗尽或中途停止时尚未读取的目录 - 保留在树中，之后可以从这里继续扫描
+
+    有历史记录的目录以上次的大小计入树中，标记为估算；没有历史的目录只能计为0，
+    其所有祖先的大小都只是下限，标记为部分统计。
+    """
+
+    def __init__(self):
+        self.pending: Dict[SizeNode, Tuple[str, float]] = {}  # 目录 -> (路径, 预计大小)
+        self.estimates: Dict[SizeNode, int] = {}  # 有历史记录的目录 -> 计入树中的估算大小
+        self.states: Dict[SizeNode, str] = {}  # 大小不精确的节点 -> 大小状态，其余节点均为精确值
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def add(self, node: SizeNode, path: str, expected: float, history: Optional[int] = None):
+        """记录一个未读取的目录"""
+        self.pending[node] = (path, expected)
+        if history is not None:
+            self.estimates[node] = history
+
+    def apply(self):
+        """把估算大小计入节点及其祖先，并推导各节点的大小状态（在树汇总之后调用）"""
+        for node, estimate in self.estimates.items():
+            self._propagate(node, estimate)
+        self.update_states()
+
+    def update_states(self):
+        """从未读取的目录向上推导大小状态，部分统计优先于估算"""
+        states: Dict[SizeNode, str] = {}
+        for node in self.pending:
+            state = SIZE_ESTIMATED if node in self.estimates else SIZE_PARTIAL
+            current = node
+            while current is not None:
+                existing = states.get(current)
+                if existing == state or existing == SIZE_PARTIAL:
+                    break
+                states[current] = state
+                current = current.parent
+        self.states = states
+
+    def take(self, node: SizeNode) -> List[Tuple[SizeNode, str, float, Optional[int]]]:
+        """取出node子树内的未读取目录并撤回其估算大小，用于继续扫描"""
+        taken = []
+        for pending, (path, expected) in list(self.pending.items()):
+            if not self._contains(node, pending):
+                continue
+            del self.pending[pending]
+            history = self.estimates.pop(pending, None)
+            if history is not None:
+                self._propagate(pending, -history)
+            taken.append((pending, path, expected, history))
+        self.update_states()
+        return taken
+
+    def merge(self, other: 'ScanFrontier'):
+        """并入另一次扫描留下的未读取目录（其估算值应已计入树中）"""
+        self.pending.update(other.pending)
+        self.estimates.update(other.estimates)
+        self.update_states()
+
+    def discard(self, node: SizeNode):
+        """子树已被替换时丢弃其中的记录（估算值随旧子树一起移除）"""
+        for pending in [n for n in self.pending if self._contains(node, n)]:
+            del self.pending[pending]
+            self.estimates.pop(pending, None)
+        self.update_states()
+
+    @staticmethod
+    def _contains(ancestor: SizeNode, node: SizeNode) -> bool:
+        """node是否在ancestor的子树内（含自身）"""
+        while node is not None:
+            if node is ancestor:
+                return True
+            node = node.parent
+        return False
+
+    @staticmethod
+    def _propagate(node: SizeNode, delta: int):
+        """把大小变化累加到node及其所有祖先"""
+        while node is not None:
+            node.size += delta
+            node = node.parent
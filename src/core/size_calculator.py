@@ -1,50 +1,439 @@
 import os
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from src.core.aggregators import Aggregation, Aggregator
+from src.core.file_utils import FileUtils
+from src.core.largest_files import LargestFiles
+from src.core.progress_tracker import ProgressTracker
+from src.core.scan_cache import CachedDirectory, ScanCache
+from src.core.scan_profile import ScanProfile
+from src.core.scan_rules import ScanRules
+from src.core.scan_scheduler import ScanBudget, ScanFrontier, ScanQueue
+from src.models.scan_stats import ScanStats
+from src.models.size_node import SizeNode
+
+
+class DirectoryListing(NamedTuple):
+    """单个目录的读取结果"""
+    files: List[Tuple[str, int]]  # (文件名, 大小)
+    dirs: List[str]  # 子目录名
+    stats: ScanStats  # 本次读取的统计
+    dir_stat: Optional[os.stat_result] = None  # 目录自身的stat（启用缓存时）
+    cached: Optional[CachedDirectory] = None  # 缓存中的旧记录（可能已过期）
+    from_cache: bool = False  # 是否直接复用了缓存的条目列表
+    times: Optional[List[Tuple[int, int]]] = None  # 与files对应的(访问时间, 修改时间)，取自同一次lstat
 
 
 class SizeCalculator:
     """大小计算器 - 简化版本，移除信号"""
 
-    def __init__(self):
+    LARGEST_FILES = 100  # 扫描时维护的最大文件数
+
+    def __init__(self, workers: int = 1, cache: ScanCache = None, rules: ScanRules = None,
+                 aggregators: Sequence[Aggregator] = None):
         self._is_running = True
+        self.workers = max(1, workers)  # 大于1时使用线程池并行遍历
+        self.rules = rules or ScanRules()  # 排除/包含规则，被排除的目录不会被打开
+        self.aggregators = tuple(aggregators or ())  # 聚合插件，每个文件在合并目录时交给插件一次
+        self.cache = cache  # 持久化缓存，设置后按目录mtime增量复扫
+        # 为True时不复用缓存的条目列表（文件原地追加不改变目录mtime），读取结果仍写回缓存
+        self.revalidate = False
+        if cache is not None:
+            # 缓存的条目列表是按规则过滤后的结果，规则变化时整体失效
+            cache.bind_rules(self.rules.signature)
+        self.stats = ScanStats()  # 最近一次build_tree的统计
+        self.progress: Optional[ProgressTracker] = None  # 设置后每读完一个目录上报一次进度
+        # 设置后扫描期间按snapshot_interval回调(根节点, 仍在增长的一级子目录集合)
+        self.on_snapshot: Optional[Callable[[SizeNode, Set[SizeNode]], None]] = None
+        self.snapshot_interval = 1.0
+        self.budget: Optional[ScanBudget] = None  # 最近一次扫描的预算
+        self.frontier = ScanFrontier()  # 最近一次扫描结束时尚未读取的目录
+        self.largest = LargestFiles(self.LARGEST_FILES)  # 最近一次扫描读取到的最大文件
+        self.aggregation = Aggregation(self.aggregators)  # 最近一次扫描各目录的聚合状态
+        self.profile: Optional[ScanProfile] = None  # 设置后记录各阶段耗时、错误类型和队列深度
+        self._stream_root: Optional[SizeNode] = None
+        self._outstanding: Dict[SizeNode, int] = {}
+        self._last_snapshot = 0.0
+        self._cache_records: List[Tuple[SizeNode, str, DirectoryListing]] = []
 
     def stop_calculation(self):
         """停止计算"""
         self._is_running = False
 
     def calculate_directory_size_iterative(self, path: str, timeout=30) -> int:
-        """迭代方式计算目录大小 - 简化版本"""
+        """计算目录大小 - 超时后返回已统计部分加上估算值，未读取的目录见self.frontier"""
+        return self.build_tree(path, ScanBudget(seconds=timeout)).size
+
+    def build_tree(self, path: str, budget: ScanBudget = None) -> SizeNode:
+        """一次遍历构建整棵目录树，目录大小自底向上汇总
+
+        设置budget时按预计大小从大到小读取目录，预算耗尽后剩下的目录记入self.frontier，
+        可以之后用resume_tree继续。
+        """
+        path = os.path.normpath(path)
+        root = SizeNode(path, "directory")
+        queue = ScanQueue()
+        queue.push(root, path, self._root_history(path) or 1.0)
+        self._begin_scan(root, budget)
+
+        try:
+            self._walk(root, queue)
+            started = time.perf_counter()
+            root.aggregate()
+            self.aggregation.rollup(root)
+            self.frontier.apply()
+            self._timed("rollup", started)
+            # 中途停止或未扫描完的树不完整，不写回缓存
+            if self.cache is not None and self._is_running and not self.frontier:
+                started = time.perf_counter()
+                self._save_cache()
+                self._timed("cache_save", started)
+        finally:
+            self._end_scan()
+        return root
+
+    def resume_tree(self, node: SizeNode, frontier: ScanFrontier, budget: ScanBudget = None) -> SizeNode:
+        """继续一次未完成的扫描 - 只读取frontier中位于node子树内的目录，结果直接合并到原树
+
+        剩余的未读取目录重新并入frontier，frontier之外的节点保持不变。
+        继续扫描得到的结果不写回持久化缓存。
+        """
+        taken = frontier.take(node)
+        self._begin_scan(node, budget)
+        queue = ScanQueue()
+        for pending, path, expected, history in taken:
+            queue.push(pending, path, expected, history)
+            if self.on_snapshot is not None and pending is not node:
+                top = pending
+                while top.parent is not node:
+                    top = top.parent
+                self._outstanding[top] = self._outstanding.get(top, 0) + 1
+
+        try:
+            before = node.size
+            self._walk(node, queue)
+            node.aggregate()
+            self.aggregation.rollup(node)
+            delta = node.size - before
+            ancestor = node.parent
+            while ancestor is not None:
+                ancestor.size += delta
+                ancestor = ancestor.parent
+            self.frontier.apply()
+            frontier.merge(self.frontier)
+            self.frontier = frontier
+        finally:
+            self._end_scan()
+        return node
+
+    def _begin_scan(self, root: SizeNode, budget: Optional[ScanBudget]):
+        """重置一次扫描的状态"""
         self._is_running = True
-        total = 0
-        stack = [path]
-        start_time = time.time()
+        self.stats = ScanStats()
+        self.frontier = ScanFrontier()
+        self.largest = LargestFiles(self.LARGEST_FILES)
+        self.aggregation = Aggregation(self.aggregators)
+        self.budget = budget
+        if budget is not None:
+            budget.start()
+        self._cache_records = []
+        self._stream_root = root
+        self._outstanding = {}
+        self._last_snapshot = time.monotonic()
 
-        while stack and self._is_running:
-            # 检查超时
-            if time.time() - start_time > timeout:
+    def _end_scan(self):
+        """释放扫描期间的临时状态"""
+        self.largest.freeze()
+        self._cache_records = []
+        self._stream_root = None
+        self._outstanding = {}
+
+    def _root_history(self, path: str) -> Optional[int]:
+        """缓存中扫描根目录上次的大小"""
+        if self.cache is None:
+            return None
+        totals = self.cache.get_totals(path)
+        return totals[0] if totals else None
+
+    def _budget_exhausted(self) -> bool:
+        """扫描预算是否已用完"""
+        return self.budget is not None and self.budget.exhausted(self.stats)
+
+    def _timed(self, phase: str, started: float):
+        """剖析时记录从started（perf_counter）到现在的耗时"""
+        if self.profile is not None:
+            self.profile.add(phase, time.perf_counter() - started)
+
+    def _walk(self, root: SizeNode, queue: ScanQueue):
+        """按队列读取目录，预算耗尽或停止时剩下的目录记入frontier"""
+        started = time.perf_counter()
+        if self.workers > 1:
+            self._walk_parallel(root, queue)
+        else:
+            self._walk_serial(root, queue)
+        self._timed("walk", started)
+
+        for node, path, expected, history in queue.drain():
+            self.frontier.add(node, path, expected, history)
+
+    def _walk_serial(self, root: SizeNode, queue: ScanQueue):
+        """单线程遍历，每次读取预计最大的目录"""
+        profile = self.profile
+        while queue and self._is_running and not self._budget_exhausted():
+            if profile is not None:
+                profile.sample_queue(len(queue), 1)
+            node, node_path, expected, history = queue.pop()
+            try:
+                listing = self._read_directory(node_path)
+            except (PermissionError, OSError) as e:
+                # 根目录不可访问时交给调用方处理
+                if node is root:
+                    raise
+                self._skip_directory(node, e)
+                continue
+
+            if not self._is_running:
+                # 停止时正在读的目录可能不完整，放回队列
+                queue.push(node, node_path, expected, history)
                 break
+            self._enqueue_children(queue, node, node_path, expected, listing)
+
+    def _walk_parallel(self, root: SizeNode, queue: ScanQueue):
+        """线程池并行遍历 - 工作线程只负责读目录，树的合并全部在当前线程完成
+
+        在途任务数限制为线程数的两倍，其余目录留在队列中按预计大小排序，
+        预算耗尽后不再提交新任务，只等待在途任务完成。
+        """
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="size-walker")
+        pending = {}
+        profile = self.profile
+        try:
+            while self._is_running:
+                while queue and len(pending) < self.workers * 2 and not self._budget_exhausted():
+                    item = queue.pop()
+                    pending[pool.submit(self._read_directory, item[1])] = item
+                if not pending:
+                    break
 
-            current_path = stack.pop()
+                if profile is not None:
+                    profile.sample_queue(len(queue), len(pending))
+                started = time.perf_counter()
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                self._timed("wait", started)
+                for future in done:
+                    node, node_path, expected, history = pending.pop(future)
+                    try:
+                        listing = future.result()
+                    except (PermissionError, OSError) as e:
+                        if node is root:
+                            raise
+                        self._skip_directory(node, e)
+                        continue
+                    self._enqueue_children(queue, node, node_path, expected, listing)
+        finally:
+            # 停止时丢弃尚未开始的目录，正在读的目录会在_is_running检查处尽快返回
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        # 停止时未合并的目录放回队列，记入frontier
+        for item in pending.values():
+            queue.push(*item)
+
+    def _enqueue_children(self, queue: ScanQueue, node: SizeNode, path: str, expected: float,
+                          listing: 'DirectoryListing'):
+        """合并目录读取结果，子目录按预计大小入队"""
+        subdirs = self._merge_listing(node, path, listing)
+        if not subdirs:
+            return
+        history = listing.cached.subdir_history() if listing.cached is not None else {}
+        share = expected / len(subdirs)
+        for child, child_path in subdirs:
+            size = history.get(child.name)
+            queue.push(child, child_path, share if size is None else size, size)
+
+    def _read_directory(self, path: str) -> DirectoryListing:
+        """读取单个目录 - 启用缓存时先stat目录，mtime未变则直接复用缓存的条目列表，
+        revalidate或规则含age谓词时总是重新读取（可在工作线程中执行）"""
+        if self.cache is None:
+            return self._list_directory(path)
+
+        started = time.perf_counter()
+        stats = ScanStats()
+        stats.stat_calls += 1
+        dir_stat = os.stat(path, follow_symlinks=False)
+        cached = self.cache.get(path, dir_stat)
+        # age规则的过滤结果随时间变化，缓存的条目列表可能已按过期的时刻过滤
+        hit = (cached is not None and not self.revalidate and not self.rules.time_dependent
+               and cached.matches(dir_stat))
+        if self.profile is not None:
+            worker = self.profile.worker()
+            worker.add("cache_lookup", time.perf_counter() - started)
+            if hit:
+                worker.directories += 1
+
+        if hit:
+            stats.revalidated += 1
+            stats.excluded_entries += cached.excluded_entries
+            stats.excluded_bytes += cached.excluded_bytes
+            return DirectoryListing(cached.files, cached.subdirs, stats, dir_stat, cached, True, cached.file_times)
+
+        listing = self._list_directory(path)
+        stats.merge(listing.stats)
+        stats.reread += 1
+        return DirectoryListing(listing.files, listing.dirs, stats, dir_stat, cached, times=listing.times)
+
+    def _list_directory(self, path: str) -> DirectoryListing:
+        """读取单个目录，返回文件(名称, 大小)、子目录名和本次读取的统计（可在工作线程中执行）
+
+        类型判断只用DirEntry缓存的d_type，只有文件和符号链接会发出一次lstat，
+        符号链接不跟随，避免重复统计链接目标。被规则排除的子目录不入队，
+        被排除的文件只计入排除统计。文件的访问/修改时间直接取自同一次lstat。
+        剖析时lstat单独计时，其余时间记为遍历目录
+        """
+        stats = ScanStats()
+        files = []
+        times = []
+        dirs = []
+        rules = self.rules if self.rules.active else None
+        profile = self.profile
+        if profile is not None:
+            started = time.perf_counter()
+            stat_seconds = 0.0
+        for entry in FileUtils.scan_directory(path, stats):
+            if not self._is_running:
+                break
 
             try:
-                with os.scandir(current_path) as it:
-                    for entry in it:
-                        if not self._is_running:
-                            break
-
-                        try:
-                            if entry.is_file():
-                                total += entry.stat().st_size
-                            elif entry.is_dir() and not entry.name.startswith('.'):
-                                stack.append(entry.path)
-                        except (OSError, PermissionError):
-                            continue
-
-            except (PermissionError, OSError):
+                if entry.is_dir(follow_symlinks=False):
+                    if rules is not None and rules.excludes_directory(entry.name, entry.path):
+                        stats.excluded_entries += 1
+                    else:
+                        dirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                    if profile is None:
+                        st = FileUtils.entry_stat(entry, stats)
+                    else:
+                        stat_started = time.perf_counter()
+                        st = FileUtils.entry_stat(entry, stats)
+                        stat_seconds += time.perf_counter() - stat_started
+                    if rules is not None and rules.excludes_file(entry.name, entry.path, st):
+                        stats.excluded_entries += 1
+                        stats.excluded_bytes += st.st_size
+                        continue
+                    files.append((entry.name, st.st_size))
+                    times.append((int(st.st_atime), int(st.st_mtime)))
+                    stats.files += 1
+            except (OSError, PermissionError) as e:
+                stats.errors += 1
+                if profile is not None:
+                    profile.worker().error(e)
+                continue
+
+        if profile is not None:
+            worker = profile.worker()
+            worker.add("stat", stat_seconds, stats.stat_calls)
+            worker.add("scandir", time.perf_counter() - started - stat_seconds)
+            worker.directories += 1
+        return DirectoryListing(files, dirs, stats, times=times)
+
+    def _merge_listing(self, node: SizeNode, path: str, listing: DirectoryListing) -> List[Tuple[SizeNode, str]]:
+        """把目录读取结果挂到树上，按名称排序保证合并结果与调度顺序无关"""
+        started = time.perf_counter()
+        files, dirs, stats = listing.files, listing.dirs, listing.stats
+        self.stats.merge(stats)
+        if listing.dir_stat is not None:
+            self._cache_records.append((node, path, listing))
+        if self.aggregators:
+            self.aggregation.add_files(node, files, listing.times)
+        largest = self.largest
+        for name, size in sorted(files):
+            child = node.add_child(SizeNode(name, "file", size))
+            if size > largest.threshold:
+                largest.push(size, child)
+
+        subdirs = []
+        for name in sorted(dirs):
+            child = node.add_child(SizeNode(name, "directory"))
+            subdirs.append((child, os.path.join(path, name)))
+        self._timed("merge", started)
+
+        # 进度和中间结果的回调由引擎计时（事件投递），不计入合并
+        if self.progress is not None:
+            self.progress.add(len(files) + len(dirs), sum(size for _, size in files))
+        if self.on_snapshot is not None:
+            self._track_directory(node, sum(size for _, size in files), [child for child, _ in subdirs])
+        return subdirs
+
+    def _skip_directory(self, node: SizeNode, error: OSError = None):
+        """无法读取的目录：计入错误（剖析时按错误类型），并视为已完成"""
+        self.stats.errors += 1
+        if self.profile is not None and error is not None:
+            self.profile.error(error)
+        if self.on_snapshot is not None:
+            self._track_directory(node, 0, [])
+
+    def _track_directory(self, node: SizeNode, added_bytes: int, new_dirs: List[SizeNode]):
+        """流式模式下记录一个目录已读完：字节数即时累加到所有祖先，并维护各一级子目录的未完成目录数"""
+        root = self._stream_root
+        top = None
+        current = node
+        while current is not root:
+            current.size += added_bytes
+            if current.parent is root:
+                top = current
+            current = current.parent
+        root.size += added_bytes
+
+        if node is root:
+            for child in new_dirs:
+                self._outstanding[child] = 1
+        elif top is not None:
+            self._outstanding[top] = self._outstanding.get(top, 1) + len(new_dirs) - 1
+
+        now = time.monotonic()
+        if now - self._last_snapshot >= self.snapshot_interval:
+            self._last_snapshot = now
+            growing = {child for child, count in self._outstanding.items() if count > 0}
+            self.on_snapshot(root, growing)
+
+    def _save_cache(self):
+        """把本次扫描结果写回缓存 - 只写重新读取过或聚合值变化的目录"""
+        entry_counts: Dict[SizeNode, int] = {}
+        records = []
+        removed = []
+
+        # 记录按父先子后的顺序追加，倒序即可自底向上统计条目数
+        for node, path, listing in reversed(self._cache_records):
+            count = len(listing.files) + len(listing.dirs)
+            count += sum(entry_counts.get(child, 0) for child in node.iter_children() if child.is_directory)
+            entry_counts[node] = count
+
+            cached = listing.cached
+            subdir_sizes = [node.children[name].size for name in listing.dirs]
+            if (listing.from_cache and cached.size == node.size and cached.entry_count == count
+                    and cached.subdir_sizes == subdir_sizes):
                 continue
 
-        return total
+            st = listing.dir_stat
+            records.append(CachedDirectory(
+                path=path, dev=st.st_dev, ino=st.st_ino,
+                mtime_ns=st.st_mtime_ns, ctime_ns=st.st_ctime_ns,
+                size=node.size, entry_count=count,
+                files=listing.files, file_times=listing.times or [], subdirs=listing.dirs,
+                subdir_sizes=subdir_sizes,
+                excluded_entries=listing.stats.excluded_entries,
+                excluded_bytes=listing.stats.excluded_bytes
+            ))
+            if cached is not None and not listing.from_cache:
+                gone = set(cached.subdirs) - set(listing.dirs)
+                removed.extend(os.path.join(path, name) for name in gone)
+
+        if removed:
+            self.cache.remove_tree(removed)
+        if records:
+            self.cache.put_many(records)
 
     @staticmethod
     def format_size(size_bytes: int) -> str:
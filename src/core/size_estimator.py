@@ -0,0 +1,214 @@
+import math
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.core.aggregators import Aggregation, Aggregator
+from src.core.largest_files import LargestFiles
+from src.core.scan_cache import ScanCache
+from src.core.scan_rules import ScanRules
+from src.core.size_calculator import DirectoryListing, SizeCalculator
+from src.models.disk_item import SIZE_ESTIMATED
+from src.models.scan_stats import ScanStats
+from src.models.size_node import SizeNode
+
+
+@dataclass
+class SizeEstimate:
+    """一轮抽样后的估算结果"""
+    root: SizeNode
+    size: int  # 根目录的估算大小
+    margin: int  # 置信区间半宽（字节），精确值时为0
+    rate: float  # 本轮的抽样比例
+    directories: int  # 累计读取的目录数
+    exact: bool = False  # 所有目录均已读取
+    states: Dict[SizeNode, str] = field(default_factory=dict)  # 尚未精确的目录 -> 大小状态
+    errors: Dict[SizeNode, int] = field(default_factory=dict)  # 尚未精确的目录 -> 置信区间半宽
+
+    @property
+    def relative_error(self) -> float:
+        """置信区间半宽相对估算值的比例"""
+        return self.margin / self.size if self.size > 0 else 0.0
+
+    @property
+    def interval(self) -> Tuple[int, int]:
+        """置信区间"""
+        return max(0, self.size - self.margin), self.size + self.margin
+
+
+class SizeEstimator(SizeCalculator):
+    """抽样估算器 - 海量目录树上快速给出总大小的估计和置信区间
+
+    每个目录只读取随机抽取的一部分子目录，按两阶段抽样（无放回）外推：
+    目录大小 = 直接文件大小 + 子目录数 / 抽样数 × 抽样子目录的估算之和，
+    方差 = N²(1 - n/N)s²/n + (N/n)Σ各抽样子目录的方差。
+    各轮依次提高抽样比例并沿用之前的抽样（每个目录的子目录顺序只打乱一次），
+    最后一轮比例为1，读取全部目录，得到与SizeCalculator相同的精确结果。
+    估算通过estimate_tree逐轮产出，不使用on_snapshot流式快照。
+    """
+
+    RATES = (1 / 64, 1 / 16, 1 / 4, 1.0)  # 默认的逐轮抽样比例
+    FULL_DEPTH = 1  # 根目录下这几层的子目录全部读取，保证界面上每一项都有自己的估算
+    MIN_SAMPLES = 2  # 每个目录至少抽取的子目录数，少于2个无法估计方差
+    Z = 1.96  # 95%置信水平
+
+    def __init__(self, workers: int = 1, cache: ScanCache = None, seed: int = None, rules: ScanRules = None,
+                 aggregators: Sequence[Aggregator] = None):
+        super().__init__(workers=workers, cache=cache, rules=rules, aggregators=aggregators)
+        self.root: Optional[SizeNode] = None
+        self._random = random.Random(seed)
+        self._order: Dict[SizeNode, List[Tuple[SizeNode, str]]] = {}  # 已读取的目录 -> 打乱后的子目录
+        self._sampled: Dict[SizeNode, int] = {}  # 已读取的目录 -> 已抽取的子目录数（_order的前缀）
+        self._direct: Dict[SizeNode, int] = {}  # 已读取的目录 -> 直接包含的文件大小
+
+    def estimate_tree(self, path: str, rates: Sequence[float] = None) -> Iterator[SizeEstimate]:
+        """逐轮抽样，每轮结束后产出一次估算；比例为1的一轮结束后树与精确扫描相同"""
+        self._is_running = True
+        self.stats = ScanStats()
+        self._cache_records = []
+        self.largest = LargestFiles(self.LARGEST_FILES)
+        self.aggregation = Aggregation(self.aggregators)
+        self._order = {}
+        self._sampled = {}
+        self._direct = {}
+        path = os.path.normpath(path)
+        self.root = SizeNode(path, "directory")
+
+        try:
+            for rate in rates or self.RATES:
+                self._refine(path, rate)
+                if not self._is_running:
+                    return
+                estimate = self._estimate(rate)
+                if estimate.exact:
+                    self.root.aggregate()
+                    self.aggregation.rollup(self.root)
+                    if self.cache is not None:
+                        self._save_cache()
+                yield estimate
+                if estimate.exact:
+                    return
+        finally:
+            self.largest.freeze()
+            self._cache_records = []
+
+    def _sample_size(self, count: int, depth: int, rate: float) -> int:
+        """某一深度的目录在给定比例下应抽取的子目录数"""
+        if count == 0 or rate >= 1.0 or depth < self.FULL_DEPTH:
+            return count
+        return min(count, max(self.MIN_SAMPLES, math.ceil(count * rate)))
+
+    def _refine(self, path: str, rate: float):
+        """把抽样扩大到rate：已读取的目录补抽子目录，新抽中的目录读取后继续向下抽样"""
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="size-sampler") \
+            if self.workers > 1 else None
+        stack = [(self.root, path, 0)]
+        reads = {}
+        try:
+            while (stack or reads) and self._is_running:
+                while stack and self._is_running:
+                    node, node_path, depth = stack.pop()
+                    if node in self._order:
+                        self._expand(node, depth, rate, stack)
+                    elif pool is not None:
+                        reads[pool.submit(self._read_directory, node_path)] = (node, node_path, depth)
+                    else:
+                        self._load(node, node_path, self._try_read(node, node_path))
+                        self._expand(node, depth, rate, stack)
+
+                if reads:
+                    done, _ = wait(reads, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node, node_path, depth = reads.pop(future)
+                        try:
+                            listing = future.result()
+                        except (PermissionError, OSError):
+                            if node is self.root:
+                                raise
+                            listing = None
+                        self._load(node, node_path, listing)
+                        self._expand(node, depth, rate, stack)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _try_read(self, node: SizeNode, path: str) -> Optional[DirectoryListing]:
+        """读取目录，非根目录无法读取时返回None"""
+        try:
+            return self._read_directory(path)
+        except (PermissionError, OSError):
+            if node is self.root:
+                raise
+            return None
+
+    def _load(self, node: SizeNode, path: str, listing: Optional[DirectoryListing]):
+        """把读取结果挂到树上，子目录顺序随机打乱一次，之后各轮按前缀抽样"""
+        if listing is None:
+            # 与精确扫描一致：无法读取的目录计入错误，大小按0计
+            self.stats.errors += 1
+            subdirs = []
+        else:
+            subdirs = self._merge_listing(node, path, listing)
+            self._random.shuffle(subdirs)
+        self._order[node] = subdirs
+        self._sampled[node] = 0
+        self._direct[node] = sum(child.size for child in node.iter_children() if not child.is_directory)
+
+    def _expand(self, node: SizeNode, depth: int, rate: float, stack):
+        """扩大目录的抽样数，所有已抽中的子目录都要在本轮继续扩大抽样"""
+        order = self._order[node]
+        count = max(self._sampled[node], self._sample_size(len(order), depth, rate))
+        self._sampled[node] = count
+        stack.extend((child, child_path, depth + 1) for child, child_path in order[:count])
+
+    def _estimate(self, rate: float) -> SizeEstimate:
+        """自底向上计算各已读取目录的估算值和方差，估算值写入节点大小"""
+        visit = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            visit.append(node)
+            stack.extend(child for child, _ in self._order[node][:self._sampled[node]])
+
+        values: Dict[SizeNode, Tuple[float, float, bool]] = {}  # 节点 -> (估算值, 方差, 是否精确)
+        estimate = SizeEstimate(self.root, 0, 0, rate, self.stats.directories + self.stats.revalidated)
+        for node in reversed(visit):
+            order = self._order[node]
+            count = self._sampled[node]
+            total = len(order)
+            sampled = [values[child] for child, _ in order[:count]]
+
+            if count == 0:
+                size, variance = float(self._direct[node]), 0.0
+            else:
+                mean = sum(value for value, _, _ in sampled) / count
+                if count == total:
+                    spread = 0.0
+                elif count > 1:
+                    spread = sum((value - mean) ** 2 for value, _, _ in sampled) / (count - 1)
+                else:
+                    spread = mean ** 2
+                size = self._direct[node] + total * mean
+                variance = (total ** 2 * (1 - count / total) * spread / count +
+                            total / count * sum(var for _, var, _ in sampled))
+
+                # 未抽中的子目录用同级抽样的均值作为估计
+                for child, _ in order[count:]:
+                    child.size = round(mean)
+                    estimate.states[child] = SIZE_ESTIMATED
+                    estimate.errors[child] = round(self.Z * math.sqrt(spread))
+
+            exact = count == total and all(done for _, _, done in sampled)
+            values[node] = (size, variance, exact)
+            node.size = round(size)
+            if not exact:
+                estimate.states[node] = SIZE_ESTIMATED
+                estimate.errors[node] = round(self.Z * math.sqrt(variance))
+
+        size, variance, exact = values[self.root]
+        estimate.size = round(size)
+        estimate.margin = round(self.Z * math.sqrt(variance))
+        estimate.exact = exact
+        return estimate
@@ -0,0 +1,223 @@
+import json
+import lzma
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.models.tree_store import TYPE_DIRECTORY, TreeStore
+
+SNAPSHOT_SUFFIX = ".nsnap"
+MAGIC = b"NOTOSNAP"
+VERSION = 2  # 版本2增加了子树指纹段，版本1的快照仍可打开（对比时再计算指纹）
+
+# 压缩方式
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZMA = 2
+COMPRESSIONS = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lzma": COMPRESSION_LZMA}
+
+# 文件头: 魔数, 版本, 压缩方式, 节点数, 段数
+HEADER = struct.Struct("<8sHHQQ")
+# 段表每项: 偏移, 存储长度, 原始长度
+SECTION = struct.Struct("<QQQ")
+# 按顺序保存的段: (TreeStore列名, 元素类型)，之后是子树指纹（'Q'，版本2起），最后一段为JSON元数据
+COLUMNS = (("parent", "i"), ("size", "q"), ("count", "q"), ("kind", "B"), ("first_child", "i"),
+           ("child_count", "i"), ("name_offsets", "q"), ("names", "B"))
+FINGERPRINT_TYPE = "Q"
+MASK = (1 << 64) - 1
+ALIGNMENT = 8  # 各段起始偏移按8字节对齐，未压缩时可直接把映射的内存视为数组
+
+
+class SnapshotError(Exception):
+    """快照文件无法识别或已损坏"""
+
+
+@dataclass
+class Snapshot:
+    """打开的快照 - store的各列直接引用内存映射（未压缩时）或解压后的数组"""
+    store: TreeStore
+    root: str  # 扫描时的根路径
+    created: float  # 保存时间（时间戳）
+    complete: bool  # 扫描是否完整（预算耗尽时目录大小为下限）
+    compression: str
+    largest_files: List[Tuple[str, int]] = field(default_factory=list)  # (路径, 大小)，按大小降序
+    metadata: Dict[str, Any] = field(default_factory=dict)  # 其余元数据（扫描统计、版本等）
+    fingerprints: Optional[Any] = None  # 每个节点的子树指纹（'Q'数组或内存映射视图），版本1的快照为None
+    _mmap: Optional[mmap.mmap] = field(default=None, repr=False)
+
+    @property
+    def mapped(self) -> bool:
+        """各列是否直接引用内存映射（只有未压缩、小端平台上才是零拷贝）"""
+        return self._mmap is not None
+
+
+def _little_endian(column):
+    """按小端序输出的列，大端平台上返回交换字节序后的副本"""
+    if sys.byteorder == "little" or column.itemsize == 1:
+        return column
+    swapped = array(column.typecode, column)
+    swapped.byteswap()
+    return swapped
+
+
+def fingerprint_tree(store: TreeStore, mtime_hash: Callable[[int], int] = None) -> array:
+    """计算每个节点的子树指纹（64位）
+
+    指纹由名称、类型、大小、条目数、子树修改时间散列（mtime_hash按目录编号给出，
+    来自 FingerprintAggregator，没有时为0）和各子节点指纹之和混合而成，
+    所以任何后代的增删、改名或大小变化都会改变所有祖先的指纹。节点按广度优先编号，
+    逆序遍历时子节点总在父节点之前。
+    """
+    nodes = len(store)
+    fingerprints = array(FINGERPRINT_TYPE, bytes(8 * nodes))
+    child_sums = array(FINGERPRINT_TYPE, bytes(8 * nodes))
+    parent, size, count, kind = store.parent, store.size, store.count, store.kind
+    names, offsets = store.names, store.name_offsets
+    for index in range(nodes - 1, -1, -1):
+        value = (zlib.crc32(names[offsets[index]:offsets[index + 1]]) * 0x9E3779B97F4A7C15
+                 + (size[index] * 2 + kind[index]) * 0xC2B2AE3D27D4EB4F
+                 + count[index] * 0x165667B19E3779F9 + child_sums[index])
+        if mtime_hash is not None and kind[index] == TYPE_DIRECTORY:
+            value += mtime_hash(index) * 0x27D4EB2F165667C5
+        value &= MASK
+        # 终混合（MurmurHash3 fmix64）
+        value = (value ^ (value >> 33)) * 0xFF51AFD7ED558CCD & MASK
+        value = (value ^ (value >> 33)) * 0xC4CEB9FE1A85EC53 & MASK
+        value ^= value >> 33
+        fingerprints[index] = value
+        if parent[index] >= 0:
+            child_sums[parent[index]] = (child_sums[parent[index]] + value) & MASK
+    return fingerprints
+
+
+def write_snapshot(path: str, store: TreeStore, largest_files: List[Tuple[str, int]] = None,
+                   complete: bool = True, compression: str = "none", metadata: Dict[str, Any] = None,
+                   fingerprints: array = None) -> int:
+    """把列式目录树写入快照文件，返回文件大小
+
+    每列单独保存（compression为zlib/lzma时单独压缩），先写入临时文件再改名，中途失败不会留下半个快照。
+    fingerprints未给出时按名称、大小和条目数计算（不含修改时间）。
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"未知的压缩方式: {compression}")
+    info = dict(metadata or {}, root=store.name(0), created=time.time(), complete=complete,
+                largest_files=[list(item) for item in largest_files or []])
+    sections = [_little_endian(getattr(store, name)) for name, _ in COLUMNS]
+    sections.append(_little_endian(fingerprints if fingerprints is not None else fingerprint_tree(store)))
+    sections.append(json.dumps(info, ensure_ascii=False).encode("utf-8"))
+
+    method = COMPRESSIONS[compression]
+    table = []
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"\0" * (HEADER.size + SECTION.size * len(sections)))
+        for data in sections:
+            raw_length = len(memoryview(data).cast("B"))
+            if method == COMPRESSION_ZLIB:
+                data = zlib.compress(data, 6)
+            elif method == COMPRESSION_LZMA:
+                data = lzma.compress(data)
+            f.write(b"\0" * (-f.tell() % ALIGNMENT))
+            offset = f.tell()
+            f.write(data)
+            table.append((offset, f.tell() - offset, raw_length))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, method, len(store), len(sections)))
+        for entry in table:
+            f.write(SECTION.pack(*entry))
+        size = f.seek(0, os.SEEK_END)
+    os.replace(temp_path, path)
+    return size
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """打开快照 - 未压缩的快照用内存映射，只读取文件头和元数据，各列在访问时才由操作系统按页读入"""
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SnapshotError(f"快照文件为空: {path}")
+    view = memoryview(mapped)
+
+    if len(view) < HEADER.size:
+        raise SnapshotError(f"不是快照文件: {path}")
+    magic, version, method, nodes, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError(f"不是快照文件: {path}")
+    if version not in (1, VERSION) or method not in COMPRESSIONS.values() or count != _section_count(version):
+        raise SnapshotError(f"不支持的快照版本或格式: {path}")
+    if len(view) < HEADER.size + SECTION.size * count:
+        raise SnapshotError(f"快照文件已截断: {path}")
+    table = [SECTION.unpack_from(view, HEADER.size + SECTION.size * i) for i in range(count)]
+    for offset, stored, _ in table:
+        if offset + stored > len(view):
+            raise SnapshotError(f"快照文件已截断: {path}")
+
+    # 只有未压缩且字节序一致时才能零拷贝
+    zero_copy = method == COMPRESSION_NONE and sys.byteorder == "little"
+    typecodes = [typecode for _, typecode in COLUMNS] + ([FINGERPRINT_TYPE] if version >= 2 else [])
+    columns = []
+    try:
+        for typecode, (offset, stored, raw_length) in zip(typecodes, table):
+            data = _section(view, offset, stored, raw_length, method)
+            if zero_copy:
+                columns.append(data.cast(typecode))
+            elif typecode == "B":
+                columns.append(bytearray(data))
+            else:
+                column = array(typecode)
+                column.frombytes(data)
+                if sys.byteorder != "little":
+                    column.byteswap()
+                columns.append(column)
+        offset, stored, raw_length = table[-1]
+        info = json.loads(bytes(_section(view, offset, stored, raw_length, method)).decode("utf-8"))
+    except (zlib.error, lzma.LZMAError, TypeError, ValueError) as e:
+        raise SnapshotError(f"快照文件已损坏: {path} - {e}")
+
+    store = TreeStore.from_columns(*columns[:len(COLUMNS)])
+    fingerprints = columns[len(COLUMNS)] if version >= 2 else None
+    if (len(store) != nodes or len(store.name_offsets) != nodes + 1
+            or (fingerprints is not None and len(fingerprints) != nodes)):
+        raise SnapshotError(f"快照文件已损坏: {path}")
+    if not zero_copy:
+        # 数据已复制到数组，映射不再需要
+        view.release()
+        mapped.close()
+        mapped = None
+
+    return Snapshot(
+        store=store,
+        root=info.pop("root"),
+        created=info.pop("created"),
+        complete=info.pop("complete"),
+        compression={value: name for name, value in COMPRESSIONS.items()}[method],
+        largest_files=[(file_path, size) for file_path, size in info.pop("largest_files", [])],
+        metadata=info,
+        fingerprints=fingerprints,
+        _mmap=mapped
+    )
+
+
+def _section_count(version: int) -> int:
+    """各版本的段数：各列、指纹（版本2起）和元数据"""
+    return len(COLUMNS) + (2 if version >= 2 else 1)
+
+
+def _section(view: memoryview, offset: int, stored: int, raw_length: int, method: int) -> memoryview:
+    """取出一段的原始字节（压缩时解压）"""
+    data = view[offset:offset + stored]
+    if method == COMPRESSION_ZLIB:
+        data = memoryview(zlib.decompress(data))
+    elif method == COMPRESSION_LZMA:
+        data = memoryview(lzma.decompress(data))
+    if len(data) != raw_length:
+        raise ValueError("段长度不符")
+    return data
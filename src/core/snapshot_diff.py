@@ -0,0 +1,178 @@
+import heapq
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.core.snapshot import Snapshot, fingerprint_tree
+from src.models.analysis_result import AnalysisResult
+from src.models.disk_item import DiskItem
+from src.models.tree_store import TreeStore
+
+# 变化类型
+DIFF_ADDED = "added"  # 只在新快照中
+DIFF_REMOVED = "removed"  # 只在旧快照中
+DIFF_CHANGED = "changed"  # 两边都有，指纹不同
+
+
+@dataclass
+class DiffEntry:
+    """一个发生变化的节点"""
+    path: str
+    item_type: str  # 'directory' or 'file'（两边类型不同时取新快照中的类型）
+    status: str
+    old_size: int
+    new_size: int
+    old_count: int = 0  # 子树条目数
+    new_count: int = 0
+
+    @property
+    def delta(self) -> int:
+        """大小变化（字节），缩小时为负"""
+        return self.new_size - self.old_size
+
+
+@dataclass
+class SnapshotDiff:
+    """两个快照的对比结果
+
+    只记录指纹不同的节点：changes为每个发生变化的目录中、大小有变化或新增/删除的直接子项；
+    指纹相同的子树在对比时直接跳过，compared/skipped为实际比较的节点对数和跳过的子树数。
+    """
+    old_root: str
+    new_root: str
+    old_created: float
+    new_created: float
+    root: Optional[DiffEntry]  # 根目录的变化，两个快照完全相同时为None
+    entries: Dict[str, DiffEntry] = field(default_factory=dict)  # 路径 -> 变化（新快照中的路径）
+    changes: Dict[str, List[DiffEntry]] = field(default_factory=dict)  # 目录路径 -> 有变化的直接子项
+    compared: int = 0
+    skipped: int = 0
+    new_store: Optional[TreeStore] = field(default=None, repr=False)  # 浏览新增子树时读取其内容
+
+    def entry(self, path: str) -> Optional[DiffEntry]:
+        """路径的变化，未变化时返回None"""
+        return self.entries.get(os.path.normpath(path))
+
+    def top_growers(self, limit: int = 20) -> List[DiffEntry]:
+        """增长最多的节点（不含根目录）- 增长全部来自某一个子项的目录不列出（列出更具体的子项）"""
+        return heapq.nlargest(limit, (entry for entry in self.entries.values()
+                                      if entry.delta > 0 and self._reportable(entry)),
+                              key=lambda entry: entry.delta)
+
+    def top_shrinkers(self, limit: int = 20) -> List[DiffEntry]:
+        """缩小最多的节点，规则同top_growers"""
+        return heapq.nsmallest(limit, (entry for entry in self.entries.values()
+                                       if entry.delta < 0 and self._reportable(entry)),
+                               key=lambda entry: entry.delta)
+
+    def _reportable(self, entry: DiffEntry) -> bool:
+        """不是根目录，且变化不是全部来自同一个子项"""
+        return entry is not self.root and not any(child.delta == entry.delta
+                                                  for child in self.changes.get(entry.path, ()))
+
+    def result(self, path: str) -> Optional[AnalysisResult]:
+        """目录在对比模式下的结果，path不在对比范围内时返回None
+
+        子项的size为增长量（缩小和删除的为0，饼图只显示增长部分），size_delta为带符号的变化量；
+        按变化量降序，增长最多的在前、缩小最多的在后。
+        """
+        path = os.path.normpath(path)
+        root = os.path.normpath(self.new_root)
+        if path != root and not path.startswith(root.rstrip(os.sep) + os.sep):
+            return None
+
+        entry = self.entries.get(path)
+        if entry is not None and entry.status == DIFF_ADDED:
+            children = self._added_children(path)
+        else:
+            children = self.changes.get(path, [])
+        growth = sum(child.delta for child in children if child.delta > 0)
+        items = [DiskItem(name=os.path.basename(child.path), path=child.path, size=max(child.delta, 0),
+                          item_type=child.item_type,
+                          percentage=child.delta / growth * 100 if growth > 0 and child.delta > 0 else 0.0,
+                          parent_path=path, size_delta=child.delta, diff_status=child.status)
+                 for child in sorted(children, key=lambda child: child.delta, reverse=True)]
+        return AnalysisResult(items=items, total_size=growth, path=path, result_type="diff")
+
+    def _added_children(self, path: str) -> List[DiffEntry]:
+        """新增目录的直接子项（均为新增）"""
+        index = self.new_store.find(path) if self.new_store is not None else None
+        if index is None:
+            return []
+        store = self.new_store
+        return [DiffEntry(os.path.join(path, store.name(child)),
+                          "directory" if store.is_directory(child) else "file", DIFF_ADDED,
+                          0, store.size[child], 0, store.count[child])
+                for child in store.children(index)]
+
+
+def diff_stores(old: TreeStore, new: TreeStore, old_fingerprints=None, new_fingerprints=None) -> SnapshotDiff:
+    """对比两棵列式目录树，按名称逐级匹配，只进入指纹不同的目录
+
+    耗时与变化的目录数及其子项数成正比：指纹相同的子树O(1)跳过，新增和删除的子树不展开。
+    指纹未给出时现场计算（需要遍历整棵树）。
+    """
+    if old_fingerprints is None:
+        old_fingerprints = fingerprint_tree(old)
+    if new_fingerprints is None:
+        new_fingerprints = fingerprint_tree(new)
+    new_root = os.path.normpath(new.name(0))
+    diff = SnapshotDiff(old_root=os.path.normpath(old.name(0)), new_root=new_root, old_created=0.0,
+                        new_created=0.0, root=None, new_store=new, compared=1)
+    if old_fingerprints[0] == new_fingerprints[0]:
+        diff.skipped = 1
+        return diff
+
+    diff.root = _changed(old, new, 0, 0, new_root)
+    diff.entries[new_root] = diff.root
+    stack = [(0, 0, new_root)]
+    while stack:
+        old_index, new_index, path = stack.pop()
+        old_children = {bytes(old.names[old.name_offsets[child]:old.name_offsets[child + 1]]): child
+                        for child in old.children(old_index)}
+        changes = []
+        for child in new.children(new_index):
+            name = bytes(new.names[new.name_offsets[child]:new.name_offsets[child + 1]])
+            child_path = os.path.join(path, os.fsdecode(name))
+            previous = old_children.pop(name, None)
+            if previous is None:
+                entry = DiffEntry(child_path, _item_type(new, child), DIFF_ADDED,
+                                  0, new.size[child], 0, new.count[child])
+            else:
+                diff.compared += 1
+                if old_fingerprints[previous] == new_fingerprints[child]:
+                    diff.skipped += 1
+                    continue
+                entry = _changed(old, new, previous, child, child_path)
+                if old.is_directory(previous) and new.is_directory(child):
+                    stack.append((previous, child, child_path))
+            diff.entries[child_path] = entry
+            if entry.delta != 0 or entry.status != DIFF_CHANGED:
+                changes.append(entry)
+
+        for name, child in old_children.items():
+            child_path = os.path.join(path, os.fsdecode(name))
+            entry = DiffEntry(child_path, _item_type(old, child), DIFF_REMOVED,
+                              old.size[child], 0, old.count[child], 0)
+            diff.entries[child_path] = entry
+            changes.append(entry)
+        if changes:
+            diff.changes[path] = changes
+    return diff
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> SnapshotDiff:
+    """对比两个快照（版本1的快照没有保存指纹，现场计算）"""
+    diff = diff_stores(old.store, new.store, old.fingerprints, new.fingerprints)
+    diff.old_created = old.created
+    diff.new_created = new.created
+    return diff
+
+
+def _item_type(store: TreeStore, index: int) -> str:
+    return "directory" if store.is_directory(index) else "file"
+
+
+def _changed(old: TreeStore, new: TreeStore, old_index: int, new_index: int, path: str) -> DiffEntry:
+    return DiffEntry(path, _item_type(new, new_index), DIFF_CHANGED, old.size[old_index], new.size[new_index],
+                     old.count[old_index], new.count[new_index])
@@ -0,0 +1,337 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from src.core.aggregators import AgeAggregator, Aggregation
+from src.core.largest_files import LargestFiles
+from src.core.scan_scheduler import ScanFrontier
+from src.models.analysis_result import AnalysisResult
+from src.models.disk_item import DiskItem
+from src.models.size_node import SizeNode
+from src.models.tree_store import StoreNode, TreeStore
+
+
+class SizeTreeCache:
+    """目录树缓存 - 根目录扫描一次，之后的进入/返回/跳转都直接读树
+
+    compact为True时，扫描完成的树压缩为列式的TreeStore保存，lookup返回只读的StoreNode；
+    未扫描完的树（需要继续扫描）和需要实时监视的树保持可修改的SizeNode。
+    """
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+        self._roots: Dict[str, Union[SizeNode, TreeStore]] = {}
+        self._frontiers: Dict[str, ScanFrontier] = {}  # 未扫描完的树 -> 尚未读取的目录
+        self._largest: Dict[str, LargestFiles] = {}  # 根路径 -> 整棵树的最大文件
+        self._aggregations: Dict[str, Aggregation] = {}  # 根路径 -> 各目录的聚合统计
+        self._fingerprints: Dict[str, Tuple[TreeStore, Any]] = {}  # 根路径 -> 从快照打开的树及其子树指纹
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        """统一路径格式"""
+        return os.path.normpath(os.path.abspath(path))
+
+    def lookup(self, path: str) -> Optional[Union[SizeNode, StoreNode]]:
+        """查找路径对应的节点，任一已扫描的根包含该路径即可命中"""
+        path = self._normalize(path)
+        with self._lock:
+            roots = list(self._roots.values())
+        for root in roots:
+            if isinstance(root, TreeStore):
+                index = root.find(path)
+                node = root.node(index) if index is not None else None
+            else:
+                node = root.find(path)
+            if node is not None and node.is_directory:
+                return node
+        return None
+
+    def roots(self) -> List[SizeNode]:
+        """所有可修改的根节点（列式保存的树不在其中）"""
+        with self._lock:
+            return [root for root in self._roots.values() if isinstance(root, SizeNode)]
+
+    def root_paths(self) -> List[str]:
+        """所有已扫描的根目录（含列式保存的树）"""
+        with self._lock:
+            return list(self._roots)
+
+    @staticmethod
+    def _key(node):
+        """节点在聚合状态中的键：列式树中为编号，SizeNode树中为节点本身"""
+        return node.index if isinstance(node, StoreNode) else node
+
+    @classmethod
+    def _ancestor_keys(cls, node) -> List[Any]:
+        """节点之上各祖先的键（由近到远）"""
+        keys = []
+        node = node.parent
+        while node is not None:
+            keys.append(cls._key(node))
+            node = node.parent
+        return keys
+
+    @staticmethod
+    def _directories(node) -> List[Any]:
+        """子树中的所有目录（第一个为node）"""
+        directories = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            directories.append(current)
+            stack.extend(child for child in current.iter_children() if child.is_directory)
+        return directories
+
+    @staticmethod
+    def _root_of(node):
+        """节点所在树的根"""
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def frontier(self, node: SizeNode) -> Optional[ScanFrontier]:
+        """节点所在的树未扫描完时返回其frontier"""
+        with self._lock:
+            frontier = self._frontiers.get(self._root_of(node).name)
+        return frontier if frontier else None
+
+    def largest_files(self, node) -> List[Tuple[str, int]]:
+        """节点子树内的最大文件 (路径, 大小)，按大小降序"""
+        with self._lock:
+            largest = self._largest.get(self._root_of(node).name)
+        return largest.under(node.path) if largest is not None else []
+
+    def aggregates(self, node) -> Dict[str, List[Tuple[str, int, int]]]:
+        """节点子树的聚合统计"""
+        with self._lock:
+            aggregation = self._aggregations.get(self._root_of(node).name)
+        return aggregation.summary(self._key(node)) if aggregation is not None else {}
+
+    def aggregation(self, node) -> Optional[Aggregation]:
+        """节点所在树的聚合状态（键见_key），没有时返回None"""
+        with self._lock:
+            return self._aggregations.get(self._root_of(node).name)
+
+    def fingerprints(self, store: TreeStore):
+        """从快照打开的树保存的子树指纹，树已被修改或不是来自快照时返回None"""
+        with self._lock:
+            entry = self._fingerprints.get(store.name(0))
+        return entry[1] if entry is not None and entry[0] is store else None
+
+    def cold_items(self, node) -> List[DiskItem]:
+        """直接子目录按冷数据字节数降序，百分比为冷数据占该子目录的比例（需启用age聚合器）"""
+        with self._lock:
+            aggregation = self._aggregations.get(self._root_of(node).name)
+        if aggregation is None:
+            return []
+        path = node.path
+        items = []
+        for child in node.iter_children():
+            if not child.is_directory:
+                continue
+            child_path = os.path.join(path, child.name)
+            state = aggregation.state(self._key(child), AgeAggregator.name)
+            cold = AgeAggregator.cold_bytes(state) if state is not None else 0
+            if cold > 0:
+                items.append(DiskItem(name=child.name, path=child_path, size=cold, item_type="directory",
+                                      percentage=cold / child.size * 100 if child.size > 0 else 0.0,
+                                      parent_path=path))
+        items.sort(key=lambda item: item.size, reverse=True)
+        return items
+
+    def result(self, node) -> AnalysisResult:
+        """从缓存的树生成节点的分析结果，附带最大文件、冷数据排行和聚合统计"""
+        result = AnalysisResult.from_size_node(node, self.size_states(node))
+        result.set_largest_files(self.largest_files(node))
+        result.cold_items = self.cold_items(node)
+        result.aggregates = self.aggregates(node)
+        return result
+
+    def merge_scan(self, node: SizeNode, largest: LargestFiles = None, aggregation: Aggregation = None,
+                   replace: bool = False, old: SizeNode = None):
+        """并入扫描node子树得到的最大文件和聚合统计，replace为True时先丢弃该子树（旧节点为old）中的旧数据"""
+        key = self._root_of(node).name
+        removed = self._directories(old) if replace and old is not None and aggregation else ()
+        ancestors = self._ancestor_keys(node) if aggregation else ()
+        with self._lock:
+            self._merge(key, node.path, node, largest, aggregation, ancestors, removed, replace)
+
+    def _merge(self, key: str, path: str, root_key, largest: Optional[LargestFiles], aggregation: Optional[Aggregation],
+               ancestors, removed, replace: bool):
+        """merge_scan的实现，各节点已换成聚合状态的键（调用者持有锁）"""
+        if largest is not None:
+            existing = self._largest.get(key)
+            if existing is None:
+                self._largest[key] = existing = LargestFiles(largest.limit)
+            if replace:
+                existing.replace(path, largest.items())
+            else:
+                existing.merge(largest.items())
+        if aggregation:
+            existing = self._aggregations.get(key)
+            if existing is None:
+                self._aggregations[key] = existing = Aggregation(aggregation.aggregators)
+            existing.merge_subtree(aggregation, root_key, ancestors, removed)
+
+    def size_states(self, node: SizeNode) -> Optional[Dict[SizeNode, str]]:
+        """节点所在树中大小不精确的节点及其状态"""
+        frontier = self.frontier(node)
+        return frontier.states if frontier is not None else None
+
+    def store(self, root: SizeNode, frontier: ScanFrontier = None, largest: LargestFiles = None,
+              aggregation: Aggregation = None):
+        """保存一棵新扫描的树，被其包含的旧树一并丢弃"""
+        root.name = self._normalize(root.name)
+        with self._lock:
+            for key in list(self._roots):
+                if root.find(key) is not None:
+                    del self._roots[key]
+                    self._frontiers.pop(key, None)
+                    self._largest.pop(key, None)
+                    self._aggregations.pop(key, None)
+                    self._fingerprints.pop(key, None)
+            if largest is not None:
+                self._largest[root.name] = largest
+            if aggregation:
+                self._aggregations[root.name] = aggregation
+            if frontier:
+                self._roots[root.name] = root
+                self._frontiers[root.name] = frontier
+            else:
+                self._roots[root.name] = self._compact(root) if self.compact else root
+
+    def _compact(self, root: SizeNode) -> TreeStore:
+        """把树压缩为列式存储，聚合状态改用节点编号作键（调用者持有锁）"""
+        order = []
+        store = TreeStore.from_size_node(root, order=order)
+        aggregation = self._aggregations.get(root.name)
+        if aggregation is not None:
+            aggregation.rekey((node, index) for index, node in enumerate(order) if node.is_directory)
+        return store
+
+    def load_store(self, store: TreeStore, largest: LargestFiles = None, fingerprints=None):
+        """加入一棵已压缩的树（如从快照打开），与其重叠的旧树一并丢弃；聚合统计不随快照保存，子树指纹随树保存"""
+        key = store.name(0)
+        with self._lock:
+            for existing in list(self._roots):
+                if existing == key or self._contains(key, existing) or self._contains(existing, key):
+                    del self._roots[existing]
+                    self._frontiers.pop(existing, None)
+                    self._largest.pop(existing, None)
+                    self._aggregations.pop(existing, None)
+                    self._fingerprints.pop(existing, None)
+            self._roots[key] = store
+            if largest is not None:
+                self._largest[key] = largest
+            if fingerprints is not None:
+                self._fingerprints[key] = (store, fingerprints)
+
+    @staticmethod
+    def _contains(root: str, path: str) -> bool:
+        """path是否位于root之下"""
+        return path.startswith(root.rstrip(os.sep) + os.sep)
+
+    def replace_subtree(self, node: SizeNode, frontier: ScanFrontier = None, largest: LargestFiles = None,
+                        aggregation: Aggregation = None):
+        """用重新扫描的子树替换缓存中的旧节点，并修正祖先大小
+
+        列式保存的树直接把新子树拼接进去；只有重新扫描未完成（有frontier）时才还原为SizeNode。
+        """
+        path = self._normalize(node.name)
+        old = self.lookup(path)
+        if isinstance(old, StoreNode) and old.parent is not None and not frontier:
+            if self._splice(old, node, largest, aggregation):
+                return
+        if isinstance(old, StoreNode):
+            old = self._thaw(old) if old.parent is not None else None
+        if old is None or old.parent is None:
+            self.store(node, frontier, largest, aggregation)
+            return
+
+        existing = self.frontier(old)
+        if existing is not None:
+            existing.discard(old)
+
+        parent = old.parent
+        node.name = old.name
+        parent.add_child(node)
+
+        delta = node.size - old.size
+        ancestor = parent
+        while ancestor is not None:
+            ancestor.size += delta
+            ancestor = ancestor.parent
+
+        self.merge_scan(node, largest, aggregation, replace=True, old=old)
+
+        root = self._root_of(parent)
+        if existing is not None:
+            if frontier:
+                existing.merge(frontier)
+        elif frontier:
+            frontier.update_states()
+            with self._lock:
+                self._frontiers[root.name] = frontier
+        elif self.compact:
+            with self._lock:
+                self._roots[root.name] = self._compact(root)
+
+    def _splice(self, old: StoreNode, node: SizeNode, largest: Optional[LargestFiles],
+                aggregation: Optional[Aggregation]) -> bool:
+        """把重新扫描的子树拼接进列式保存的树（见TreeStore.splice），不再可达的旧行超过一半时重新压缩
+
+        内存映射打开的只读树先复制为数组。树已被其他线程替换时返回False。
+        """
+        key = old.store.name(0)
+        path = old.path
+        with self._lock:
+            store = old.store
+            if self._roots.get(key) is not store:
+                return False
+            if not store.writable:
+                store = self._replace_store(key, store)
+                old = store.node(store.find(path))
+            self._fingerprints.pop(key, None)
+
+            removed = [directory.index for directory in self._directories(old)] if aggregation else ()
+            ancestors = self._ancestor_keys(old) if aggregation else ()
+            rows = store.splice(old.index, node)
+            if aggregation:
+                aggregation.rekey((child, row) for child, row in rows if child.is_directory)
+            self._merge(key, path, old.index, largest, aggregation, ancestors, removed, True)
+
+            if store.garbage * 2 > len(store):
+                self._replace_store(key, store)
+        return True
+
+    def _replace_store(self, key: str, store: TreeStore) -> TreeStore:
+        """把列式树复制为只含可达行的新数组，聚合状态随编号更换（调用者持有锁）"""
+        copy, rows = store.copy(0)
+        self._roots[key] = copy
+        aggregation = self._aggregations.get(key)
+        if aggregation is not None:
+            aggregation.rekey((row, index) for index, row in enumerate(rows))
+        return copy
+
+    def _thaw(self, node: StoreNode) -> Optional[SizeNode]:
+        """把列式保存的树还原为SizeNode以便修改，返回同一路径的节点"""
+        with self._lock:
+            key = node.store.name(0)
+            if self._roots.get(key) is node.store:
+                nodes = {}
+                self._roots[key] = node.store.to_size_node(0, nodes)
+                aggregation = self._aggregations.get(key)
+                if aggregation is not None:
+                    aggregation.rekey(nodes.items())
+            root = self._roots.get(key)
+        return root.find(node.path) if isinstance(root, SizeNode) else None
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._roots.clear()
+            self._frontiers.clear()
+            self._largest.clear()
+            self._aggregations.clear()
+            self._fingerprints.clear()
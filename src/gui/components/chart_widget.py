@@ -2,19 +2,21 @@ import os
 import platform
 import subprocess
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QMenu, QAction
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QApplication
 
 from src.models.analysis_result import AnalysisResult
+from src.models.disk_item import SIZE_EXACT
 from config.settings import Settings
 
 
 class ChartWidget(QWidget):
-    """图表组件 - 使用Settings配置优化"""
+    """图表组件 - 使用Settings配置优化
+
+    matplotlib导入较慢，启动时先放一个占位标签，第一次需要绘图时才导入并创建画布，
+    且推迟到事件循环的下一轮，让同一批更新的列表先完成绘制。
+    """
 
     # 添加点击信号
     chart_item_clicked = pyqtSignal(object)  # 传递DiskItem
@@ -25,15 +27,20 @@ class ChartWidget(QWidget):
         self.wedges = None
         self.is_dark_mode = False
         self.other_item = False
-        self._setup_matplotlib()
+        self._last_signature = None  # 上次绘制的数据摘要
+        self.figure = None  # matplotlib图形和画布，第一次绘图前才创建
+        self.canvas = None
+        self._pending_result = None  # 画布创建前收到的最新结果
         self.init_ui()
 
-    def _setup_matplotlib(self):
+    @staticmethod
+    def _setup_matplotlib():
         """设置matplotlib配置"""
+        import matplotlib
         try:
             # 使用Settings中的字体配置
-            plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Arial Unicode MS']
-            plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+            matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Arial Unicode MS']
+            matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
         except Exception:
             # 如果字体设置失败，使用默认设置
             pass
@@ -48,6 +55,27 @@ class ChartWidget(QWidget):
         self.update_title_style()  # 使用统一的方法设置样式
         layout.addWidget(self.chart_title)
 
+        # 画布创建前的占位
+        self.placeholder = QLabel("")
+        self.placeholder.setAlignment(Qt.AlignCenter)
+        self.placeholder.setMinimumSize(300, 300)
+        layout.addWidget(self.placeholder, 1)
+
+        # 添加提示标签
+        self.hint_label = QLabel("")
+        self.hint_label.setAlignment(Qt.AlignCenter)
+        self.hint_label.setStyleSheet("color: #666; font-size: 12px; margin: 5px;")
+        self.hint_label.setWordWrap(True)
+        layout.addWidget(self.hint_label)
+
+    def load_canvas(self):
+        """导入matplotlib并用画布替换占位标签，之前收到的结果随后绘制"""
+        if self.canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        self._setup_matplotlib()
         # 创建matplotlib图形
         self.figure = Figure(figsize=(6, 6), dpi=100)
         self.canvas = FigureCanvas(self.figure)
@@ -55,17 +83,33 @@ class ChartWidget(QWidget):
         # 连接点击事件
         self.canvas.mpl_connect('button_press_event', self.on_chart_click)
 
-        layout.addWidget(self.canvas)
+        self.layout().replaceWidget(self.placeholder, self.canvas)
+        self.placeholder.deleteLater()
+        self.placeholder = None
 
-        # 添加提示标签
-        self.hint_label = QLabel("")
-        self.hint_label.setAlignment(Qt.AlignCenter)
-        self.hint_label.setStyleSheet("color: #666; font-size: 12px; margin: 5px;")
-        self.hint_label.setWordWrap(True)
-        layout.addWidget(self.hint_label)
+        if self._pending_result is not None:
+            result, self._pending_result = self._pending_result, None
+            self.update_chart(result)
 
     def update_chart(self, analysis_result: AnalysisResult):
-        """更新图表 - 使用Settings配置"""
+        """更新图表 - 使用Settings配置，扫描中的中间结果数据未变化时跳过重绘"""
+        if self.canvas is None:
+            if self._pending_result is None:
+                QTimer.singleShot(0, self.load_canvas)
+            self._pending_result = analysis_result
+            self.placeholder.setText("正在加载图表...")
+            return
+
+        signature = (
+            analysis_result.path,
+            analysis_result.is_partial,
+            tuple((item.path, item.size, item.size_state)
+                  for item in analysis_result.items[:Settings.MAX_DIRECTORY_ITEMS])
+        )
+        if analysis_result.is_partial and signature == self._last_signature:
+            return
+        self._last_signature = signature
+
         self.current_result = analysis_result
         self.figure.clear()
         ax = self.figure.add_subplot(111)
@@ -87,6 +131,10 @@ class ChartWidget(QWidget):
         if sum(sizes) > 0:
             self._draw_pie_chart(ax, labels, sizes, colors)
             self.update_chart_title(analysis_result)
+            if analysis_result.is_partial:
+                self.chart_title.setText(self.chart_title.text() + " (扫描中...)")
+            elif analysis_result.size_state != SIZE_EXACT:
+                self.chart_title.setText(self.chart_title.text() + " (未扫描完)")
 
             # 如果有"其他"类别，显示提示
             if self.other_item:
@@ -94,7 +142,7 @@ class ChartWidget(QWidget):
                 self.hint_label.setText(hint_text)
         else:
             self._show_no_data_message(ax)
-            self.chart_title.setText("无数据可用")
+            self.chart_title.setText("没有增长" if analysis_result.result_type == "diff" else "无数据可用")
 
         self.canvas.draw()
 
@@ -121,6 +169,10 @@ class ChartWidget(QWidget):
 
         # 计算总大小
         total_size = sum(item.size for item in items)
+        if total_size <= 0:
+            # 全部为空文件，或对比模式下只有缩小和删除（增长量均为0）
+            self.other_item = False
+            return labels, sizes, colors
 
         # 分离主要项目和其他项目
         main_items = []
@@ -195,6 +247,9 @@ class ChartWidget(QWidget):
         """更新图表标题 - 使用更清晰的结构"""
         if analysis_result.result_type == "disk":
             self.chart_title.setText("🖥️ 磁盘使用情况")
+        elif analysis_result.result_type == "diff":
+            name = os.path.basename(analysis_result.path.rstrip('\\/')) or analysis_result.path
+            self.chart_title.setText(f"增长: {name}（相对旧快照）")
         else:
             clean_path = analysis_result.path.rstrip('\\/')
             is_disk_root = (
@@ -0,0 +1,53 @@
+import json
+
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QPlainTextEdit, QApplication
+from PyQt5.QtGui import QFont
+
+from src.core.scan_profile import ScanProfile
+
+
+class DebugPanel(QWidget):
+    """调试面板 - 显示最近一次分析的扫描剖析报告和界面更新耗时，可复制为JSON"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.report = None  # 最近一次显示的报告（含界面耗时）
+        self.init_ui()
+
+    def init_ui(self):
+        """初始化UI"""
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(15, 5, 15, 5)
+
+        header = QHBoxLayout()
+        self.title_label = QLabel("扫描剖析（F12 隐藏）")
+        header.addWidget(self.title_label)
+        header.addStretch()
+        self.copy_button = QPushButton("复制JSON")
+        self.copy_button.setEnabled(False)
+        self.copy_button.clicked.connect(self.copy_report)
+        header.addWidget(self.copy_button)
+        layout.addLayout(header)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("Consolas, Menlo, monospace", 9))
+        self.text.setPlaceholderText("下一次分析完成后显示各阶段耗时、错误类型、工作线程利用率和队列深度")
+        self.text.setMinimumHeight(180)
+        layout.addWidget(self.text)
+
+    def show_report(self, report, gui_report=None):
+        """显示一次分析的报告，gui_report为界面线程上处理该次分析信号的耗时"""
+        self.report = dict(report, gui=gui_report["phases"] if gui_report else {})
+        lines = ScanProfile.format_report(report)
+        if gui_report and gui_report["phases"]:
+            lines.append("界面线程:")
+            for name, entry in gui_report["phases"].items():
+                lines.append(f"  {name:<16}{entry['seconds']:>10.3f}s{entry['count']:>8,} 次")
+        self.text.setPlainText("\n".join(lines))
+        self.copy_button.setEnabled(True)
+
+    def copy_report(self):
+        """把报告以JSON复制到剪贴板"""
+        if self.report is not None:
+            QApplication.clipboard().setText(json.dumps(self.report, ensure_ascii=False, indent=2))
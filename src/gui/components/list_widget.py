@@ -11,8 +11,15 @@ class DirectoryListWidget(QListWidget):
 
     item_clicked = pyqtSignal(object)
 
+    BATCH_SIZE = 500  # 每次加载的行数，滚动到底部时再加载下一批
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.current_path = None
+        self._rows = {}  # 路径 -> 列表行，用于中间结果的就地更新
+        self._items = []  # 当前结果的全部子项（可能是按需创建DiskItem的LazyItems）
+        self._loaded = 0  # 已加载为列表行的子项数
+        self.view = "children"  # 'children'(直接子项)、'largest'(子树内最大文件) 或 'cold'(子目录按冷数据排序)
         self.setup_ui()
 
     def setup_ui(self):
@@ -20,34 +27,96 @@ class DirectoryListWidget(QListWidget):
         self.setFont(QFont("Arial", 10))
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_context_menu)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+
+    def set_view(self, view, analysis_result=None):
+        """切换列表视图，给出结果时立即重建列表"""
+        self.view = view
+        if analysis_result is not None:
+            self.current_path = None
+            self.update_list(analysis_result)
+
+    def _visible_items(self, analysis_result):
+        """当前视图要显示的项"""
+        if analysis_result.result_type == "directory":
+            if self.view == "largest":
+                return analysis_result.largest_files
+            if self.view == "cold":
+                return analysis_result.cold_items
+        return analysis_result.items
 
     def update_list(self, analysis_result):
-        """更新列表"""
+        """更新列表 - 同一目录的连续结果（扫描中的中间结果）就地更新，不整表重建"""
+        items = self._visible_items(analysis_result)
+        if items and self._rows and analysis_result.path == self.current_path:
+            self._update_rows(items)
+            return
+
         self.clear()
+        self._rows = {}
+        self._items = items
+        self._loaded = 0
+        self.current_path = analysis_result.path
 
-        if not analysis_result.items:
+        if not items:
             item = QListWidgetItem("无数据或目录为空")
             item.setFlags(item.flags() & ~Qt.ItemIsEnabled)
             self.addItem(item)
             return
 
-        for item in analysis_result.items:
-            list_item = QListWidgetItem(item.display_name)
-            list_item.setData(Qt.UserRole, item)
-
-            # 根据类型设置不同的样式和提示
-            if item.item_type == "disk":
-                list_item.setToolTip(f"点击进入磁盘根目录")
-            elif item.item_type == "directory":
-                list_item.setToolTip(f"点击进入目录: {item.name}\n右键菜单可打开文件浏览器")
-            else:  # file
-                list_item.setToolTip(f"文件: {item.name}\n大小: {item.formatted_size}")
-                # 文件不可点击进入
-                if not item.is_clickable:
-                    list_item.setFlags(list_item.flags() & ~Qt.ItemIsEnabled)
-                    list_item.setForeground(Qt.gray)
+        self._load_more()
 
+    def _load_more(self):
+        """追加下一批行，子项只在这里才被取出（创建）"""
+        end = min(len(self._items), self._loaded + self.BATCH_SIZE)
+        for item in self._items[self._loaded:end]:
+            list_item = QListWidgetItem()
+            self._apply_item(list_item, item)
+            self._rows[item.path] = list_item
             self.addItem(list_item)
+        self._loaded = end
+
+    def _on_scrolled(self, value):
+        """滚动到底部时加载下一批"""
+        if value >= self.verticalScrollBar().maximum() and self._loaded < len(self._items):
+            self._load_more()
+
+    def _update_rows(self, items):
+        """按路径匹配已有行，更新文字并调整顺序，新出现的项插入、消失的项移除（只处理已加载的行数）"""
+        self._items = items
+        self._loaded = min(len(self._items), max(self._loaded, self.BATCH_SIZE))
+        seen = set()
+        for index, item in enumerate(self._items[:self._loaded]):
+            seen.add(item.path)
+            list_item = self._rows.get(item.path)
+            if list_item is None:
+                list_item = QListWidgetItem()
+                self._rows[item.path] = list_item
+                self.insertItem(index, list_item)
+            elif self.row(list_item) != index:
+                self.takeItem(self.row(list_item))
+                self.insertItem(index, list_item)
+            self._apply_item(list_item, item)
+
+        for path in [path for path in self._rows if path not in seen]:
+            self.takeItem(self.row(self._rows.pop(path)))
+
+    def _apply_item(self, list_item, item):
+        """设置单行的文字、数据和提示"""
+        list_item.setText(item.display_name)
+        list_item.setData(Qt.UserRole, item)
+
+        # 根据类型设置不同的样式和提示
+        if item.item_type == "disk":
+            list_item.setToolTip(f"点击进入磁盘根目录")
+        elif item.item_type == "directory":
+            list_item.setToolTip(f"点击进入目录: {item.name}\n右键菜单可打开文件浏览器")
+        else:  # file
+            list_item.setToolTip(f"文件: {item.name}\n大小: {item.formatted_size}")
+            # 文件不可点击进入
+            if not item.is_clickable:
+                list_item.setFlags(list_item.flags() & ~Qt.ItemIsEnabled)
+                list_item.setForeground(Qt.gray)
 
     def mousePressEvent(self, event):
         """处理鼠标点击事件 - 修复右键问题"""
@@ -100,7 +100,12 @@ class NavigationBar(QWidget):
 
     back_clicked = pyqtSignal()
     home_clicked = pyqtSignal()
+    refresh_clicked = pyqtSignal()
+    continue_clicked = pyqtSignal()
+    view_changed = pyqtSignal(str)  # 列表视图: 'children'、'largest' 或 'cold'
     stop_clicked = pyqtSignal()
+    snapshot_clicked = pyqtSignal()
+    diff_toggled = pyqtSignal(bool)  # 选中时选择旧快照进入对比模式
     theme_toggled = pyqtSignal(bool)
 
     def __init__(self, parent=None):
@@ -125,7 +130,22 @@ class NavigationBar(QWidget):
         # 导航按钮
         self.back_button = QPushButton("返回上级")
         self.home_button = QPushButton("返回首页")
+        self.refresh_button = QPushButton("重新扫描")
+        self.refresh_button.setToolTip("重新读取磁盘并更新当前目录的缓存结果")
+        self.continue_button = QPushButton("继续扫描")
+        self.continue_button.setToolTip("扫描预算已用完，继续读取当前目录下尚未读取的子目录")
+        self.largest_button = QPushButton("最大文件")
+        self.largest_button.setCheckable(True)
+        self.largest_button.setToolTip("列表切换为当前目录下（含所有子目录）最大的文件")
+        self.cold_button = QPushButton("冷数据")
+        self.cold_button.setCheckable(True)
+        self.cold_button.setToolTip("子目录按超过一年未访问且未修改的数据量排序")
         self.stop_button = QPushButton("停止分析")
+        self.snapshot_button = QPushButton("打开快照")
+        self.snapshot_button.setToolTip("浏览命令行 --snapshot 保存的扫描快照，不重新扫描")
+        self.diff_button = QPushButton("对比快照")
+        self.diff_button.setCheckable(True)
+        self.diff_button.setToolTip("选择较早的快照，图表和列表改为显示各目录的增长和缩小")
 
         # 设置按钮样式
         button_style = """
@@ -142,6 +162,9 @@ class NavigationBar(QWidget):
             QPushButton:hover {
                 background-color: #5a6268;
             }
+            QPushButton:checked {
+                background-color: #007bff;
+            }
             QPushButton:disabled {
                 background-color: #cccccc;
                 color: #666666;
@@ -170,18 +193,34 @@ class NavigationBar(QWidget):
 
         self.back_button.setStyleSheet(button_style)
         self.home_button.setStyleSheet(button_style)
+        self.refresh_button.setStyleSheet(button_style)
+        self.continue_button.setStyleSheet(button_style)
+        self.largest_button.setStyleSheet(button_style)
+        self.cold_button.setStyleSheet(button_style)
+        self.snapshot_button.setStyleSheet(button_style)
+        self.diff_button.setStyleSheet(button_style)
         self.stop_button.setStyleSheet(stop_button_style)
 
         # 初始状态
         self.back_button.setEnabled(False)
         self.home_button.setEnabled(False)
+        self.refresh_button.setEnabled(False)
+        self.continue_button.setVisible(False)
+        self.largest_button.setEnabled(False)
+        self.cold_button.setEnabled(False)
         self.stop_button.setEnabled(False)
         self.stop_button.setVisible(False)
 
         # 连接信号
         self.back_button.clicked.connect(self.back_clicked)
         self.home_button.clicked.connect(self.home_clicked)
+        self.refresh_button.clicked.connect(self.refresh_clicked)
+        self.continue_button.clicked.connect(self.continue_clicked)
+        self.largest_button.toggled.connect(lambda checked: self._on_view_toggled("largest", checked))
+        self.cold_button.toggled.connect(lambda checked: self._on_view_toggled("cold", checked))
         self.stop_button.clicked.connect(self.stop_clicked)
+        self.snapshot_button.clicked.connect(self.snapshot_clicked)
+        self.diff_button.toggled.connect(self.diff_toggled)
         self.theme_switch.theme_toggled.connect(self.on_theme_toggled)
 
         # 布局
@@ -189,6 +228,12 @@ class NavigationBar(QWidget):
         layout.addStretch()
         layout.addWidget(self.theme_switch)  # 使用优化后的开关
         layout.addWidget(self.stop_button)
+        layout.addWidget(self.continue_button)
+        layout.addWidget(self.largest_button)
+        layout.addWidget(self.cold_button)
+        layout.addWidget(self.refresh_button)
+        layout.addWidget(self.snapshot_button)
+        layout.addWidget(self.diff_button)
         layout.addWidget(self.back_button)
         layout.addWidget(self.home_button)
 
@@ -205,6 +250,31 @@ class NavigationBar(QWidget):
         """设置导航按钮状态"""
         self.back_button.setEnabled(can_go_back)
         self.home_button.setEnabled(can_go_back)
+        self.refresh_button.setEnabled(can_go_back)
+        self.largest_button.setEnabled(can_go_back)
+        self.cold_button.setEnabled(can_go_back)
+        if not can_go_back:
+            self.largest_button.setChecked(False)
+            self.cold_button.setChecked(False)
+
+    def _on_view_toggled(self, view, checked):
+        """视图按钮互斥，都未选中时回到直接子项"""
+        other = self.cold_button if view == "largest" else self.largest_button
+        if checked and other.isChecked():
+            other.blockSignals(True)
+            other.setChecked(False)
+            other.blockSignals(False)
+        self.view_changed.emit(view if checked else "children")
+
+    def set_diff_checked(self, checked):
+        """设置对比按钮状态（不发出信号）"""
+        self.diff_button.blockSignals(True)
+        self.diff_button.setChecked(checked)
+        self.diff_button.blockSignals(False)
+
+    def set_continue_visible(self, visible):
+        """设置继续扫描按钮可见性（当前目录未扫描完时显示）"""
+        self.continue_button.setVisible(visible)
 
     def set_stop_button_visible(self, visible):
         """设置停止按钮可见性"""
@@ -1,8 +1,12 @@
+import importlib.util
+import os
 import sys
+import time
 import traceback
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout,
-                             QWidget, QProgressBar, QSplitter, QMessageBox)
+                             QWidget, QProgressBar, QSplitter, QMessageBox, QShortcut, QFileDialog)
 from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QKeySequence
 
 from config.style import StyleManager
 from src.services.analysis_service import AnalysisService
@@ -11,7 +15,11 @@ from src.gui.components.navigation_bar import NavigationBar
 from src.gui.components.chart_widget import ChartWidget
 from src.gui.components.list_widget import DirectoryListWidget
 from src.gui.components.custom_title_bar import CustomTitleBar
+from src.gui.components.debug_panel import DebugPanel
+from src.core.scan_profile import ScanProfile
+from src.core.snapshot import SNAPSHOT_SUFFIX
 from config.settings import Settings
+from src.models.disk_item import SIZE_EXACT
 
 
 class MainWindow(QMainWindow):
@@ -23,14 +31,15 @@ class MainWindow(QMainWindow):
         self.navigation_service = NavigationService()
         self.is_analyzing = False
         self.is_dark_mode = False  # 新增：主题状态
+        self.gui_profile = None  # 开启剖析时记录界面线程处理本次分析信号的耗时
 
         self.setWindowFlags(Qt.FramelessWindowHint)
 
         self.init_ui()
         self.connect_signals()
 
-        # 延迟启动初始分析
-        QTimer.singleShot(500, self.start_initial_analysis)
+        # 事件循环启动后立即开始初始分析（在后台线程中进行，不阻塞首帧绘制）
+        QTimer.singleShot(0, self.start_initial_analysis)
 
     def init_ui(self):
         """初始化UI"""
@@ -91,6 +100,12 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(content_splitter, 1)
         main_layout.addWidget(content_container)
 
+        # 调试面板 - F12切换，显示时开启扫描剖析
+        self.debug_panel = DebugPanel()
+        self.debug_panel.setVisible(self.analysis_service.profiling)
+        main_layout.addWidget(self.debug_panel)
+        QShortcut(QKeySequence("F12"), self, activated=self.toggle_debug_panel)
+
         # 状态栏
         self.statusBar().showMessage("准备就绪")
 
@@ -349,7 +364,12 @@ class MainWindow(QMainWindow):
         # 导航信号
         self.navigation_bar.back_clicked.connect(self.go_back)
         self.navigation_bar.home_clicked.connect(self.go_home)
+        self.navigation_bar.refresh_clicked.connect(self.refresh_current)
+        self.navigation_bar.continue_clicked.connect(self.continue_current)
+        self.navigation_bar.view_changed.connect(self.change_list_view)
         self.navigation_bar.stop_clicked.connect(self.stop_analysis)
+        self.navigation_bar.snapshot_clicked.connect(self.open_snapshot)
+        self.navigation_bar.diff_toggled.connect(self.toggle_diff)
         self.navigation_bar.theme_toggled.connect(self.on_theme_toggled)  # 新增主题切换
 
         # 列表点击信号
@@ -361,30 +381,48 @@ class MainWindow(QMainWindow):
         # 分析服务信号
         self.analysis_service.analysis_started.connect(self.on_analysis_started)
         self.analysis_service.analysis_finished.connect(self.on_analysis_finished)
+        self.analysis_service.partial_result.connect(self.on_partial_result)
         self.analysis_service.progress_updated.connect(self.on_progress_updated)
         self.analysis_service.error_occurred.connect(self.on_error_occurred)
+        self.analysis_service.tree_updated.connect(self.on_tree_updated)
 
     def start_initial_analysis(self):
         """开始初始分析"""
         if not self.is_analyzing:
             self.analysis_service.analyze_disks()
 
+    def toggle_debug_panel(self):
+        """显示或隐藏调试面板，扫描剖析随之开关（从下一次分析开始生效）"""
+        visible = not self.debug_panel.isVisible()
+        self.debug_panel.setVisible(visible)
+        self.analysis_service.set_profiling(visible)
+        self.statusBar().showMessage("扫描剖析已开启，下一次分析完成后显示报告" if visible else "扫描剖析已关闭")
+
+    def _gui_timed(self, phase, started):
+        """剖析时记录界面线程上一次信号处理的耗时"""
+        if self.gui_profile is not None:
+            self.gui_profile.add(phase, time.perf_counter() - started)
+
     def on_analysis_started(self):
         """分析开始"""
+        self.gui_profile = ScanProfile() if self.analysis_service.profiling else None
         self.is_analyzing = True
         self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(0)
         self.navigation_bar.set_stop_button_visible(True)
         self.statusBar().showMessage("正在分析...")
 
     def on_analysis_finished(self, result):
         """分析完成"""
+        started = time.perf_counter()
         self.is_analyzing = False
         self.progress_bar.setVisible(False)
         self.progress_bar.setValue(0)
         self.navigation_bar.set_stop_button_visible(False)
 
         try:
+            result = self._diff_view(result)
             self.chart_widget.update_chart(result)
             self.list_widget.update_list(result)
             self.navigation_bar.update_path_display(
@@ -393,14 +431,66 @@ class MainWindow(QMainWindow):
 
             is_at_root = self.navigation_service.current_path is None
             self.navigation_bar.set_navigation_buttons(not is_at_root)
-            self.statusBar().showMessage("分析完成")
+            self.navigation_bar.set_continue_visible(self._is_incomplete(result))
+            if result.scan_stats is None:
+                self.statusBar().showMessage("分析完成")
         except Exception as e:
             self.statusBar().showMessage(f"更新UI时出错: {str(e)}")
 
-    def on_progress_updated(self, progress, current_item):
-        """进度更新"""
-        self.progress_bar.setValue(progress)
-        self.statusBar().showMessage(f"正在分析: {current_item}")
+        self._gui_timed("finished", started)
+        if result.profile is not None:
+            gui_report = self.gui_profile.report() if self.gui_profile is not None else None
+            self.debug_panel.show_report(result.profile, gui_report)
+
+    def on_partial_result(self, result):
+        """扫描中的中间结果 - 先显示已统计出的大目录，完成的子目录会逐步定稿"""
+        if not self.is_analyzing or result.path != self._current_scan_path():
+            return
+        started = time.perf_counter()
+        try:
+            self.chart_widget.update_chart(result)
+            self.list_widget.update_list(result)
+        except Exception as e:
+            self.statusBar().showMessage(f"更新UI时出错: {str(e)}")
+        self._gui_timed("partial", started)
+
+    @staticmethod
+    def _is_incomplete(result):
+        """结果中是否有因扫描预算耗尽而未读取的目录"""
+        return result.result_type == "directory" and result.size_state != SIZE_EXACT
+
+    def _current_scan_path(self):
+        """当前导航路径的规范形式"""
+        current_path = self.navigation_service.current_path
+        return os.path.normpath(current_path) if current_path else None
+
+    def on_progress_updated(self, progress, message):
+        """进度更新 - progress为-1时无法估计百分比，进度条显示为忙碌状态"""
+        started = time.perf_counter()
+        if progress < 0:
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(progress)
+        self.statusBar().showMessage(message)
+        self._gui_timed("progress", started)
+
+    def on_tree_updated(self, changed_paths):
+        """实时监视发现变化时，就地刷新当前目录的图表和列表"""
+        current_path = self.navigation_service.current_path
+        if self.is_analyzing or current_path is None or self.analysis_service.diff is not None:
+            return
+
+        prefix = current_path.rstrip('\\/') + os.sep
+        if not any(path == current_path or path.startswith(prefix) for path in changed_paths):
+            return
+
+        result = self.analysis_service.cached_result(current_path)
+        if result is not None:
+            self.chart_widget.update_chart(result)
+            self.list_widget.update_list(result)
+            self.navigation_bar.set_continue_visible(self._is_incomplete(result))
+            self.statusBar().showMessage("已根据文件系统变化更新")
 
     def on_error_occurred(self, error_message):
         """错误处理"""
@@ -440,11 +530,96 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, "错误", f"返回首页失败: {str(e)}")
 
+    def refresh_current(self):
+        """重新扫描当前目录"""
+        try:
+            if not self.is_analyzing:
+                current_path = self.navigation_service.current_path
+                if current_path is None:
+                    self.analysis_service.analyze_disks()
+                else:
+                    self.analysis_service.refresh_directory(current_path)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"重新扫描失败: {str(e)}")
+
+    def continue_current(self):
+        """继续扫描当前目录中尚未读取的子目录"""
+        try:
+            current_path = self.navigation_service.current_path
+            if not self.is_analyzing and current_path is not None:
+                self.analysis_service.continue_directory(current_path)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"继续扫描失败: {str(e)}")
+
+    def open_snapshot(self, file=None):
+        """打开扫描快照浏览，file为None时弹出文件选择框"""
+        if file is None:
+            file, _ = QFileDialog.getOpenFileName(self, "打开快照", "",
+                                                  f"扫描快照 (*{SNAPSHOT_SUFFIX});;所有文件 (*)")
+            if not file:
+                return
+        if self.is_analyzing:
+            self.stop_analysis()
+
+        snapshot = self.analysis_service.open_snapshot(file)
+        if snapshot is None:
+            return
+        self.navigation_bar.set_diff_checked(False)
+        self.navigation_service.go_home()
+        self.navigation_service.navigate_to(snapshot.root)
+        self.analysis_service.analyze_directory(snapshot.root)
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(snapshot.created))
+        incomplete = "，扫描未完成，部分目录大小为下限" if not snapshot.complete else ""
+        self.statusBar().showMessage(f"已打开快照: {file}（保存于 {created}{incomplete}）")
+
+    def toggle_diff(self, checked):
+        """进入或退出快照对比模式：选择较早的快照，与当前浏览的树（扫描结果或打开的快照）对比"""
+        if not checked:
+            self.analysis_service.clear_diff()
+            self._show_current()
+            self.statusBar().showMessage("已退出对比模式")
+            return
+
+        file, _ = QFileDialog.getOpenFileName(self, "选择较早的快照", "",
+                                              f"扫描快照 (*{SNAPSHOT_SUFFIX});;所有文件 (*)")
+        diff = self.analysis_service.compare_snapshot(file) if file else None
+        if diff is None:
+            self.navigation_bar.set_diff_checked(False)
+            return
+
+        current_path = self._current_scan_path()
+        if self.analysis_service.diff_result(current_path) is None:
+            self.navigation_service.navigate_to(diff.new_root)
+        self._show_current()
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(diff.old_created))
+        change = f"{diff.root.delta:+,} 字节" if diff.root is not None else "没有变化"
+        self.statusBar().showMessage(f"对比 {created} 的快照: {change}，"
+                                     f"比较了 {diff.compared:,} 项，跳过 {diff.skipped:,} 个未变化的子树")
+
+    def _diff_view(self, result):
+        """对比模式下把目录结果换成该目录的变化"""
+        if result.result_type != "directory" or self.list_widget.view != "children":
+            return result
+        return self.analysis_service.diff_result(result.path) or result
+
+    def _show_current(self):
+        """按当前模式重新显示当前目录"""
+        current_path = self.navigation_service.current_path
+        if current_path is not None:
+            self.analysis_service.analyze_directory(current_path)
+
+    def change_list_view(self, view):
+        """列表在直接子项、子树内最大文件和冷数据排行之间切换，对比模式下直接子项显示为变化"""
+        current_path = self.navigation_service.current_path
+        result = self.analysis_service.cached_result(current_path) if current_path else None
+        if result is not None and view == "children":
+            result = self.analysis_service.diff_result(result.path) or result
+        self.list_widget.set_view(view, result)
+
     def closeEvent(self, event):
         """关闭事件 - 确保安全退出"""
-        self.analysis_service.stop_analysis()
+        self.analysis_service.shutdown()
         # 等待分析停止
-        import time
         time.sleep(0.5)
         event.accept()
 
@@ -465,16 +640,17 @@ def main():
         app.setApplicationName(Settings.APP_NAME)
         app.setApplicationVersion(Settings.APP_VERSION)
 
-        # 检查依赖
-        try:
-            import psutil
-            import matplotlib
-        except ImportError as e:
-            QMessageBox.critical(None, "错误", f"缺少依赖库: {e}\n请安装: pip install psutil matplotlib")
+        # 检查依赖 - 只查找不导入，matplotlib在第一次绘图时才导入
+        missing = [name for name in ("psutil", "matplotlib") if importlib.util.find_spec(name) is None]
+        if missing:
+            QMessageBox.critical(None, "错误", f"缺少依赖库: {', '.join(missing)}\n请安装: pip install psutil matplotlib")
             return 1
 
         window = MainWindow()
         window.show()
+        # main.py 快照文件: 启动后直接打开快照
+        if len(sys.argv) > 1 and sys.argv[1].endswith(SNAPSHOT_SUFFIX):
+            QTimer.singleShot(0, lambda: window.open_snapshot(sys.argv[1]))
 
         return app.exec_()
 
@@ -1,16 +1,41 @@
-from dataclasses import dataclass
-from typing import Dict, Any, List
+import os
+from dataclasses import dataclass, asdict, field
+from typing import Dict, Any, Iterable, List, Mapping, Optional, Sequence, Tuple
 
-from src.models.disk_item import DiskItem
+from src.models.disk_item import DiskItem, SIZE_EXACT
+from src.models.scan_stats import ScanStats
+from src.models.size_node import SizeNode
+from src.models.tree_store import StoreNode
 
 
 @dataclass
 class AnalysisResult:
     """分析结果数据模型"""
-    items: List[DiskItem]
+    items: Sequence[DiskItem]  # 来自列式目录树时为按需创建DiskItem的LazyItems
     total_size: int
     path: str
-    result_type: str  # 'disk' or 'directory'
+    result_type: str  # 'disk'、'directory' 或 'diff'（快照对比，子项size为增长量）
+    scan_stats: Optional[ScanStats] = None  # 本次结果实际扫描磁盘时的统计，来自缓存时为None
+    is_partial: bool = False  # 扫描过程中推送的中间结果
+    size_state: str = SIZE_EXACT  # 当前目录自身大小的状态，预算耗尽时为部分统计或估算
+    largest_files: List[DiskItem] = field(default_factory=list)  # 子树内的最大文件，按大小降序
+    cold_items: List[DiskItem] = field(default_factory=list)  # 子目录按冷数据字节数降序（需启用age聚合器）
+    aggregates: Dict[str, List[Tuple[str, int, int]]] = field(default_factory=dict)  # 聚合插件名 -> (标签, 文件数, 字节数)
+    profile: Optional[Dict[str, Any]] = None  # 启用扫描剖析时本次分析的报告（ScanProfile.report）
+
+    def set_largest_files(self, entries: Iterable[Tuple[str, int]]):
+        """由 (路径, 大小) 生成最大文件列表，名称显示为相对当前目录的路径"""
+        self.largest_files = [
+            DiskItem(
+                name=os.path.relpath(path, self.path),
+                path=path,
+                size=size,
+                item_type="file",
+                percentage=size / self.total_size * 100 if self.total_size > 0 else 0.0,
+                parent_path=os.path.dirname(path)
+            )
+            for path, size in entries
+        ]
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -18,7 +43,14 @@ class AnalysisResult:
             'items': [item.__dict__ for item in self.items],
             'total_size': self.total_size,
             'path': self.path,
-            'result_type': self.result_type
+            'result_type': self.result_type,
+            'scan_stats': asdict(self.scan_stats) if self.scan_stats else None,
+            'is_partial': self.is_partial,
+            'size_state': self.size_state,
+            'largest_files': [item.__dict__ for item in self.largest_files],
+            'cold_items': [item.__dict__ for item in self.cold_items],
+            'aggregates': self.aggregates,
+            'profile': self.profile
         }
 
     @classmethod
@@ -29,5 +61,54 @@ class AnalysisResult:
             items=items,
             total_size=data['total_size'],
             path=data['path'],
-            result_type=data['result_type']
+            result_type=data['result_type'],
+            scan_stats=ScanStats(**data['scan_stats']) if data.get('scan_stats') else None,
+            is_partial=data.get('is_partial', False),
+            size_state=data.get('size_state', SIZE_EXACT),
+            largest_files=[DiskItem(**item_data) for item_data in data.get('largest_files', [])],
+            cold_items=[DiskItem(**item_data) for item_data in data.get('cold_items', [])],
+            aggregates={name: [tuple(row) for row in rows] for name, rows in data.get('aggregates', {}).items()},
+            profile=data.get('profile')
+        )
+
+    @classmethod
+    def from_size_node(cls, node: SizeNode, size_states: Mapping[SizeNode, str] = None,
+                       is_partial: bool = False, size_errors: Mapping[SizeNode, int] = None) -> 'AnalysisResult':
+        """从目录树节点生成单层分析结果，size_states中的节点按其状态标记（其余为精确值），
+        size_errors为抽样估算的置信区间半宽"""
+        if isinstance(node, StoreNode):
+            # 列式存储只保存扫描完成的树，所有大小均为精确值
+            items = node.store.items(node.index)
+            return cls(items=items, total_size=items.total, path=node.path, result_type="directory")
+
+        size_states = size_states or {}
+        size_errors = size_errors or {}
+        path = node.path
+        items = [
+            DiskItem(
+                name=child.name,
+                path=os.path.join(path, child.name),
+                size=child.size,
+                item_type=child.item_type,
+                parent_path=path,
+                size_state=size_states.get(child, SIZE_EXACT),
+                size_error=size_errors.get(child, 0)
+            )
+            for child in node.iter_children()
+        ]
+
+        # 按大小排序并计算百分比
+        total_size = sum(item.size for item in items)
+        items.sort(key=lambda x: x.size, reverse=True)
+        for item in items:
+            if total_size > 0:
+                item.percentage = (item.size / total_size) * 100
+
+        return cls(
+            items=items,
+            total_size=total_size,
+            path=path,
+            result_type="directory",
+            is_partial=is_partial,
+            size_state=size_states.get(node, SIZE_EXACT)
         )
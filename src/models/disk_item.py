@@ -1,6 +1,12 @@
 from dataclasses import dataclass
 from typing import Optional
 
+# 大小状态
+SIZE_EXACT = "exact"  # 已完整统计
+SIZE_GROWING = "growing"  # 扫描仍在进行，当前值为下限
+SIZE_PARTIAL = "partial"  # 扫描预算耗尽，部分子目录未读取，当前值为下限
+SIZE_ESTIMATED = "estimated"  # 未读取的子目录按上次扫描的大小估算
+
 
 @dataclass
 class DiskItem:
@@ -14,6 +20,15 @@ class DiskItem:
     total_size: int = 0
     used_size: int = 0
     free_size: int = 0
+    size_state: str = SIZE_EXACT
+    size_error: int = 0  # 抽样估算时置信区间的半宽（字节）
+    size_delta: Optional[int] = None  # 快照对比时相对旧快照的大小变化（此时size为增长量）
+    diff_status: Optional[str] = None  # 快照对比时的变化类型: 'added'、'removed' 或 'changed'
+
+    @property
+    def is_final(self) -> bool:
+        """大小是否已统计完成"""
+        return self.size_state == SIZE_EXACT
 
     @property
     def formatted_size(self) -> str:
@@ -23,18 +38,31 @@ class DiskItem:
     @property
     def display_name(self) -> str:
         """显示名称 - 支持文件类型"""
-        if self.item_type == 'disk':
+        if self.size_delta is not None:
+            icon = "📁" if self.item_type == 'directory' else "📄"
+            sign = "+" if self.size_delta >= 0 else "-"
+            status = {"added": " (新增)", "removed": " (已删除)"}.get(self.diff_status, "")
+            return f"{icon} {self.name} {sign}{self._format_size(abs(self.size_delta))}{status}"
+        elif self.item_type == 'disk':
             used_percent = (self.used_size / self.total_size) * 100 if self.total_size > 0 else 0
             return f"{self.name} - 已用: {self._format_size(self.used_size)} / {self._format_size(self.total_size)} ({used_percent:.1f}%)"
         elif self.item_type == 'file':
             return f"📄 {self.name} - {self.formatted_size} ({self.percentage:.1f}%)"
+        elif self.size_state == SIZE_GROWING:
+            return f"📁 {self.name} - ≥{self.formatted_size} (统计中...)"
+        elif self.size_state == SIZE_PARTIAL:
+            return f"📁 {self.name} - ≥{self.formatted_size} (未扫描完)"
+        elif self.size_state == SIZE_ESTIMATED and self.size_error and self.size > 0:
+            return f"📁 {self.name} - ~{self.formatted_size} ±{self.size_error / self.size * 100:.0f}%"
+        elif self.size_state == SIZE_ESTIMATED:
+            return f"📁 {self.name} - ~{self.formatted_size} (估算)"
         else:
             return f"📁 {self.name} - {self.formatted_size} ({self.percentage:.1f}%)"
 
     @property
     def is_clickable(self) -> bool:
         """是否可点击进入"""
-        return self.item_type in ['disk', 'directory']
+        return self.item_type in ['disk', 'directory'] and self.diff_status != "removed"
 
     def _format_size(self, size_bytes: int) -> str:
         """格式化文件大小"""
@@ -0,0 +1,32 @@
+from dataclasses import dataclass, asdict
+from typing import Dict
+
+
+@dataclass
+class ScanStats:
+    """单次扫描统计 - 记录实际发出的系统调用次数"""
+    scandir_calls: int = 0
+    stat_calls: int = 0
+    directories: int = 0
+    files: int = 0
+    errors: int = 0
+    revalidated: int = 0  # 持久化缓存验证通过、直接复用的目录数
+    reread: int = 0  # 启用缓存时重新读取的目录数
+    excluded_entries: int = 0  # 被排除规则跳过的文件和目录数（排除的目录不会被打开）
+    excluded_bytes: int = 0  # 被排除文件的大小，不计入总大小
+
+    @property
+    def syscalls(self) -> int:
+        """系统调用总数"""
+        return self.scandir_calls + self.stat_calls
+
+    def merge(self, other: 'ScanStats'):
+        """合并另一份统计（并行扫描时每个任务单独计数，最后在主线程合并）"""
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict[str, int]:
+        """转换为字典"""
+        data = asdict(self)
+        data['syscalls'] = self.syscalls
+        return data
@@ -0,0 +1,76 @@
+import os
+from typing import Dict, Iterator, List, Optional
+
+
+class SizeNode:
+    """目录树节点 - 保存聚合后的大小，整棵树常驻内存供导航复用"""
+
+    __slots__ = ('name', 'item_type', 'size', 'parent', 'children')
+
+    def __init__(self, name: str, item_type: str, size: int = 0, parent: 'SizeNode' = None):
+        self.name = name
+        self.item_type = item_type  # 'directory' or 'file'
+        self.size = size
+        self.parent = parent
+        self.children: Optional[Dict[str, 'SizeNode']] = {} if item_type == "directory" else None
+
+    @property
+    def path(self) -> str:
+        """按需拼接完整路径（根节点的name即为扫描根路径）"""
+        parts = []
+        node = self
+        while node is not None:
+            parts.append(node.name)
+            node = node.parent
+        return os.path.join(*reversed(parts))
+
+    @property
+    def is_directory(self) -> bool:
+        """是否为目录节点"""
+        return self.item_type == "directory"
+
+    def add_child(self, child: 'SizeNode') -> 'SizeNode':
+        """添加子节点"""
+        child.parent = self
+        self.children[child.name] = child
+        return child
+
+    def iter_children(self) -> Iterator['SizeNode']:
+        """遍历直接子节点"""
+        if self.children:
+            yield from self.children.values()
+
+    def find(self, path: str) -> Optional['SizeNode']:
+        """按路径查找后代节点，不在本树内时返回None"""
+        root_path = os.path.normpath(self.path)
+        path = os.path.normpath(path)
+        if path == root_path:
+            return self
+
+        try:
+            relative = os.path.relpath(path, root_path)
+        except ValueError:
+            # Windows下不同盘符无法计算相对路径
+            return None
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None
+
+        node = self
+        for part in relative.split(os.sep):
+            if not node.children or part not in node.children:
+                return None
+            node = node.children[part]
+        return node
+
+    def aggregate(self):
+        """自底向上汇总目录大小（迭代后序遍历，避免深目录递归溢出）"""
+        order: List[SizeNode] = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.is_directory:
+                order.append(node)
+                stack.extend(child for child in node.iter_children() if child.is_directory)
+
+        for node in reversed(order):
+            node.size = sum(child.size for child in node.iter_children())
@@ -0,0 +1,329 @@
+import os
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.models.disk_item import DiskItem
+from src.models.size_node import SizeNode
+
+# 类型编码
+TYPE_DIRECTORY = 0
+TYPE_FILE = 1
+
+
+class TreeStore:
+    """列式目录树 - 每个节点只占几组定长数组中的一行，适合千万级节点常驻内存
+
+    节点按广度优先编号，同一目录的子节点编号连续，因此子节点范围只需
+    first_child/child_count 两个整数。名称统一编码后存放在一个字节串中，按偏移取出；
+    完整路径不保存，需要时沿parent拼接。重新扫描的子树用splice追加在末尾，
+    父节点编号仍小于子节点，被替换的旧行不再可达（计入garbage），用copy去除。
+    """
+
+    __slots__ = ('parent', 'size', 'count', 'kind', 'first_child', 'child_count', 'name_offsets', 'names',
+                 'garbage')
+
+    def __init__(self):
+        self.parent = array('i')  # 父节点编号，根为-1
+        self.size = array('q')  # 聚合大小
+        self.count = array('q')  # 聚合条目数（不含自身）
+        self.kind = bytearray()  # TYPE_DIRECTORY / TYPE_FILE
+        self.first_child = array('i')
+        self.child_count = array('i')
+        self.name_offsets = array('q', [0])  # 第i个名称为 names[offsets[i]:offsets[i+1]]
+        self.names = bytearray()
+        self.garbage = 0  # 不再可达的行数
+
+    @classmethod
+    def from_columns(cls, parent, size, count, kind, first_child, child_count, name_offsets, names) -> 'TreeStore':
+        """由已有的各列创建（列可以是数组，也可以是引用内存映射文件的memoryview，此时树为只读）"""
+        store = cls.__new__(cls)
+        store.parent = parent
+        store.size = size
+        store.count = count
+        store.kind = kind
+        store.first_child = first_child
+        store.child_count = child_count
+        store.name_offsets = name_offsets
+        store.names = names
+        store.garbage = 0
+        return store
+
+    @classmethod
+    def from_size_node(cls, root: SizeNode, name: str = None, order: List[SizeNode] = None) -> 'TreeStore':
+        """把SizeNode树压缩为列式存储（根节点名称保存完整路径，root不是树根时由name给出）
+
+        order为空列表时依次填入各编号对应的节点，用于把以节点为键的数据换成编号。
+        """
+        store = cls()
+        store._append(-1, root, name)
+        nodes = order if order is not None else []
+        nodes.append(root)
+        position = 0
+        while position < len(nodes):
+            node = nodes[position]
+            children = list(node.iter_children())
+            store.first_child[position] = len(nodes)
+            store.child_count[position] = len(children)
+            for child in children:
+                store._append(position, child)
+                nodes.append(child)
+            position += 1
+
+        # 编号逆序即自底向上，汇总条目数
+        for index in range(len(nodes) - 1, 0, -1):
+            store.count[store.parent[index]] += store.count[index] + 1
+        return store
+
+    def _append(self, parent: int, node: SizeNode, name: str = None):
+        """追加一行"""
+        self.parent.append(parent)
+        self.size.append(node.size)
+        self.count.append(0)
+        self.kind.append(TYPE_DIRECTORY if node.is_directory else TYPE_FILE)
+        self.first_child.append(0)
+        self.child_count.append(0)
+        self.names += os.fsencode(node.name if name is None else name)
+        self.name_offsets.append(len(self.names))
+
+    def splice(self, index: int, root: SizeNode) -> List[Tuple[SizeNode, int]]:
+        """用root子树替换index的子树（index行保留名称和位置），修正祖先的大小和条目数，返回各节点及其编号
+
+        新的子节点按广度优先追加在末尾，旧子树的其余行计入garbage。index的子节点范围最后才改写，
+        其他线程同时读取时看到的是旧子树或新子树，不会越界。
+        """
+        base = len(self.parent)
+        nodes = [root]
+        rows = [index]
+        position = 0
+        while position < len(nodes):
+            children = list(nodes[position].iter_children())
+            row = rows[position]
+            first = base + len(nodes) - 1
+            if position == 0:
+                root_first = first
+            else:
+                self.first_child[row] = first
+                self.child_count[row] = len(children)
+            for child in children:
+                rows.append(len(self.parent))
+                self._append(row, child)
+                nodes.append(child)
+            position += 1
+
+        for row in range(len(self.parent) - 1, base - 1, -1):
+            if self.parent[row] != index:
+                self.count[self.parent[row]] += self.count[row] + 1
+
+        size_delta = root.size - self.size[index]
+        count_delta = len(nodes) - 1 - self.count[index]
+        self.garbage += self.count[index]
+        self.child_count[index] = 0
+        self.first_child[index] = root_first
+        self.child_count[index] = len(list(root.iter_children()))
+        self.size[index] = root.size
+        self.count[index] = len(nodes) - 1
+        parent = self.parent[index]
+        while parent >= 0:
+            self.size[parent] += size_delta
+            self.count[parent] += count_delta
+            parent = self.parent[parent]
+        return list(zip(nodes, rows))
+
+    @property
+    def writable(self) -> bool:
+        """各列是否为可追加的数组（从内存映射快照打开的树为只读）"""
+        return isinstance(self.parent, array)
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @property
+    def nbytes(self) -> int:
+        """各数组和名称表占用的字节数"""
+        columns = (self.parent, self.size, self.count, self.first_child, self.child_count, self.name_offsets)
+        return sum(column.itemsize * len(column) for column in columns) + len(self.kind) + len(self.names)
+
+    def name(self, index: int) -> str:
+        """节点名称"""
+        return os.fsdecode(bytes(self.names[self.name_offsets[index]:self.name_offsets[index + 1]]))
+
+    def is_directory(self, index: int) -> bool:
+        """是否为目录"""
+        return self.kind[index] == TYPE_DIRECTORY
+
+    def path(self, index: int) -> str:
+        """沿父节点拼接完整路径"""
+        parts = []
+        while index >= 0:
+            parts.append(self.name(index))
+            index = self.parent[index]
+        return os.path.join(*reversed(parts))
+
+    def children(self, index: int) -> range:
+        """子节点编号范围"""
+        start = self.first_child[index]
+        return range(start, start + self.child_count[index])
+
+    def find(self, path: str) -> Optional[int]:
+        """按路径查找节点编号，不在本树内时返回None"""
+        root_path = os.path.normpath(self.name(0))
+        path = os.path.normpath(path)
+        if path == root_path:
+            return 0
+        try:
+            relative = os.path.relpath(path, root_path)
+        except ValueError:
+            return None
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None
+
+        index = 0
+        for part in relative.split(os.sep):
+            encoded = os.fsencode(part)
+            for child in self.children(index):
+                if self.names[self.name_offsets[child]:self.name_offsets[child + 1]] == encoded:
+                    index = child
+                    break
+            else:
+                return None
+        return index
+
+    def node(self, index: int = 0) -> 'StoreNode':
+        """节点视图"""
+        return StoreNode(self, index)
+
+    def to_size_node(self, index: int = 0, nodes: Dict[int, SizeNode] = None) -> SizeNode:
+        """还原为可修改的SizeNode树（需要修改树时使用），nodes给出时填入各目录编号对应的节点"""
+        root = SizeNode(self.path(index), "directory" if self.is_directory(index) else "file", self.size[index])
+        stack = [(index, root)]
+        while stack:
+            current, node = stack.pop()
+            if nodes is not None:
+                nodes[current] = node
+            for child in self.children(current):
+                item_type = "directory" if self.is_directory(child) else "file"
+                child_node = node.add_child(SizeNode(self.name(child), item_type, self.size[child]))
+                if item_type == "directory":
+                    stack.append((child, child_node))
+        return root
+
+    def copy(self, index: int = 0) -> Tuple['TreeStore', array]:
+        """把index的子树复制为按广度优先重新编号的新树（根节点名称为完整路径），不经过SizeNode
+
+        返回新树和各新编号对应的原编号。
+        """
+        store = TreeStore()
+        order = array('i', [index])
+        parents = array('i', [-1])
+        names, offsets = self.names, self.name_offsets
+        position = 0
+        while position < len(order):
+            old = order[position]
+            start, count = self.first_child[old], self.child_count[old]
+            store.parent.append(parents[position])
+            store.size.append(self.size[old])
+            store.count.append(self.count[old])
+            store.kind.append(self.kind[old])
+            store.first_child.append(len(order))
+            store.child_count.append(count)
+            store.names += os.fsencode(self.path(old)) if position == 0 else names[offsets[old]:offsets[old + 1]]
+            store.name_offsets.append(len(store.names))
+            order.extend(range(start, start + count))
+            parents.extend([position] * count)
+            position += 1
+        return store, order
+
+    def items(self, index: int) -> 'LazyItems':
+        """目录的直接子项，按大小降序，DiskItem在访问时才创建"""
+        children = self.children(index)
+        order = array('i', sorted(children, key=self.size.__getitem__, reverse=True))
+        total = sum(self.size[child] for child in children)
+        return LazyItems(self, order, self.path(index), total)
+
+
+class StoreNode:
+    """TreeStore中单个节点的只读视图，接口与SizeNode一致，供导航和结果生成复用"""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: TreeStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, StoreNode) and other.store is self.store and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.index))
+
+    @property
+    def name(self) -> str:
+        return self.store.name(self.index)
+
+    @property
+    def size(self) -> int:
+        return self.store.size[self.index]
+
+    @property
+    def item_type(self) -> str:
+        return "directory" if self.is_directory else "file"
+
+    @property
+    def is_directory(self) -> bool:
+        return self.store.is_directory(self.index)
+
+    @property
+    def parent(self) -> Optional['StoreNode']:
+        parent = self.store.parent[self.index]
+        return StoreNode(self.store, parent) if parent >= 0 else None
+
+    @property
+    def path(self) -> str:
+        return self.store.path(self.index)
+
+    def iter_children(self) -> Iterator['StoreNode']:
+        """遍历直接子节点"""
+        for child in self.store.children(self.index):
+            yield StoreNode(self.store, child)
+
+    def find(self, path: str) -> Optional['StoreNode']:
+        """按路径查找子树内的节点"""
+        root_path = os.path.normpath(self.path)
+        path = os.path.normpath(path)
+        if path != root_path and not path.startswith(root_path.rstrip(os.sep) + os.sep):
+            return None
+        index = self.store.find(path)
+        return StoreNode(self.store, index) if index is not None else None
+
+
+class LazyItems(Sequence):
+    """按需创建DiskItem的子项序列 - 界面只显示前若干行时，其余行不产生任何对象"""
+
+    def __init__(self, store: TreeStore, order: array, parent_path: str, total: int):
+        self.store = store
+        self.order = order  # 按大小降序的子节点编号
+        self.parent_path = parent_path
+        self.total = total
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._item(index) for index in self.order[position]]
+        return self._item(self.order[position])
+
+    def _item(self, index: int) -> DiskItem:
+        """创建单个子项"""
+        store = self.store
+        name = store.name(index)
+        size = store.size[index]
+        return DiskItem(
+            name=name,
+            path=os.path.join(self.parent_path, name),
+            size=size,
+            item_type="directory" if store.is_directory(index) else "file",
+            percentage=size / self.total * 100 if self.total > 0 else 0.0,
+            parent_path=self.parent_path
+        )
@@ -1,5 +1,16 @@
+import os
+import threading
+from collections import OrderedDict
+
 from PyQt5.QtCore import QObject, pyqtSignal, QTimer
-from src.core.analyzer import DiskAnalyzer
+from src.core.analyzer import DaemonAnalyzer, DiskAnalyzer
+from src.core.engine import ScanEngine
+from src.core.tree_cache import SizeTreeCache
+from src.core.backends import open_scan_cache
+from src.core.scan_daemon import DaemonError, ScanClient, ScanDaemon
+from src.core.snapshot import SnapshotError
+from src.services.watch_service import WatchService
+from config.settings import Settings
 
 
 class AnalysisService(QObject):
@@ -7,12 +18,60 @@ class AnalysisService(QObject):
 
     analysis_started = pyqtSignal()
     analysis_finished = pyqtSignal(object)
+    partial_result = pyqtSignal(object)
     progress_updated = pyqtSignal(int, str)
     error_occurred = pyqtSignal(str)
+    tree_updated = pyqtSignal(list)  # 实时监视发现的目录大小变化
+
+    DAEMON_RESULTS = 256  # 本地保留的守护进程结果数，超出时丢弃最久未用的
 
     def __init__(self):
         super().__init__()
         self.analyzer = None
+        self.scan_cache = self._open_scan_cache()  # 跨进程启动保留的持久化缓存
+        self.watch_service = WatchService() if WatchService.is_available() else None
+        # 跨多次分析共享的目录树；实时监视需要修改树，开启时不压缩
+        self.tree_cache = SizeTreeCache(compact=Settings.COMPACT_TREES and self.watch_service is None)
+        if self.watch_service:
+            self.watch_service.tree_updated.connect(self.tree_updated)
+        self.engine = ScanEngine(self.tree_cache, self.scan_cache)
+        self.diff = None  # 快照对比模式下的对比结果（SnapshotDiff）
+        # 扫描守护进程在运行时由它扫描目录，否则为None；启动时在后台线程探测，应答前在本进程扫描
+        self.daemon = None
+        self._daemon_probe = self._start_daemon_probe()
+        # 守护进程返回过的目录结果（规范化路径 -> AnalysisResult），再次进入时在界面线程直接返回
+        self._daemon_results = OrderedDict()
+
+    def _start_daemon_probe(self):
+        """在后台线程探测扫描守护进程，挂起的守护进程不会拖慢界面启动"""
+        if not ScanDaemon.is_available():
+            return None
+        thread = threading.Thread(target=self._probe_daemon, name="daemon-probe", daemon=True)
+        thread.start()
+        return thread
+
+    def _probe_daemon(self):
+        """连接扫描守护进程，应答后之后的目录分析交给它"""
+        client = ScanClient(Settings.SCAN_DAEMON_SOCKET, timeout=2)
+        try:
+            client.ping()
+        except DaemonError:
+            return
+        self.daemon = client
+
+    @staticmethod
+    def _open_scan_cache():
+        """打开持久化缓存，失败时退化为无缓存扫描"""
+        return open_scan_cache()
+
+    @property
+    def profiling(self) -> bool:
+        """是否记录扫描剖析"""
+        return self.engine.options.profile
+
+    def set_profiling(self, enabled: bool):
+        """开启或关闭扫描剖析，从下一次分析开始生效"""
+        self.engine.options.profile = enabled
 
     def analyze_disks(self):
         """分析磁盘"""
@@ -22,29 +81,96 @@ class AnalysisService(QObject):
         # 使用定时器延迟启动
         QTimer.singleShot(100, self._start_disk_analysis)
 
+    def cached_result(self, path: str):
+        """从目录树缓存（打开的快照等）或守护进程返回过的结果生成结果，都没有时返回None
+
+        在界面线程中调用，不访问守护进程：未取得过的目录由analyze_directory经DaemonAnalyzer在线程中取得。
+        """
+        result = self.engine.cached_result(path)
+        if result is None and path:
+            key = os.path.normpath(path)
+            result = self._daemon_results.get(key)
+            if result is not None:
+                self._daemon_results.move_to_end(key)
+        return result
+
     def analyze_directory(self, path: str):
-        """分析目录"""
+        """分析目录 - 已在目录树中或已从守护进程取得的路径直接返回结果，不再访问磁盘或守护进程"""
+        result = self.cached_result(path)
+        if result is not None:
+            self.analysis_finished.emit(result)
+            return
+
         self._safe_stop_previous_analysis()
         self.analysis_started.emit()
 
         # 使用定时器延迟启动
         QTimer.singleShot(100, lambda: self._start_directory_analysis(path))
 
+    def open_snapshot(self, file: str):
+        """打开快照文件，目录树加入缓存后与扫描结果一样浏览（不访问被扫描的磁盘），失败时返回None"""
+        self._safe_stop_previous_analysis()
+        try:
+            snapshot, _ = self.engine.open_snapshot(file)
+        except (OSError, SnapshotError) as e:
+            self.error_occurred.emit(f"无法打开快照: {file} - {str(e)}")
+            return None
+        self.diff = None
+        return snapshot
+
+    def compare_snapshot(self, file: str):
+        """以快照文件为旧版本，与目录树缓存中的同一目录对比并进入对比模式，失败时返回None"""
+        try:
+            self.diff = self.engine.diff_snapshot(file)
+        except (OSError, SnapshotError, ValueError) as e:
+            self.error_occurred.emit(f"无法对比快照: {file} - {str(e)}")
+            return None
+        return self.diff
+
+    def clear_diff(self):
+        """退出对比模式"""
+        self.diff = None
+
+    def diff_result(self, path: str):
+        """对比模式下目录的结果，不在对比模式或path不在对比范围内时返回None"""
+        return self.diff.result(path) if self.diff is not None and path else None
+
+    def refresh_directory(self, path: str):
+        """重新扫描子树 - 唯一会为已缓存路径访问磁盘的操作"""
+        self._forget_daemon_results(path)
+        self._safe_stop_previous_analysis()
+        self.analysis_started.emit()
+
+        QTimer.singleShot(100, lambda: self._start_directory_analysis(path, refresh=True))
+
+    def continue_directory(self, path: str):
+        """继续扫描 - 读取该目录下上次预算耗尽时尚未读取的目录"""
+        self._forget_daemon_results(path)
+        self._safe_stop_previous_analysis()
+        self.analysis_started.emit()
+
+        QTimer.singleShot(100, lambda: self._start_directory_analysis(path, resume=True))
+
     def _start_disk_analysis(self):
         """开始磁盘分析"""
         try:
-            self.analyzer = DiskAnalyzer()
+            self.analyzer = DiskAnalyzer(self.engine)
             self._connect_analyzer_signals()
             self.analyzer.analyze_path()
         except Exception as e:
             self.error_occurred.emit(f"启动磁盘分析失败: {str(e)}")
 
-    def _start_directory_analysis(self, path: str):
+    def _start_directory_analysis(self, path: str, refresh: bool = False, resume: bool = False):
         """开始目录分析"""
         try:
-            self.analyzer = DiskAnalyzer(path)
+            if self.daemon is not None and self.engine.cached_result(path) is None:
+                # 打开的快照只在本进程中，其余目录交给守护进程扫描
+                self.analyzer = DaemonAnalyzer(self.daemon.socket_path, path, refresh=refresh, resume=resume)
+                self.analyzer.daemon_lost.connect(lambda: self._on_daemon_lost(path, refresh, resume))
+            else:
+                self.analyzer = DiskAnalyzer(self.engine, path, refresh=refresh, resume=resume)
             self._connect_analyzer_signals()
-            self.analyzer.analyze_path(path)
+            self.analyzer.analyze_path()
         except Exception as e:
             self.error_occurred.emit(f"启动目录分析失败: {str(e)}")
 
@@ -52,8 +178,52 @@ class AnalysisService(QObject):
         """连接分析器信号 - 修复版本"""
         if self.analyzer:
             self.analyzer.progress_updated.connect(self.progress_updated)
-            self.analyzer.analysis_finished.connect(self.analysis_finished)
+            self.analyzer.partial_result.connect(self.partial_result)
+            self.analyzer.analysis_finished.connect(self._on_analyzer_finished)
             self.analyzer.error_occurred.connect(self.error_occurred)
+            self.analyzer.finished.connect(self._resume_watching)
+            if self.watch_service:
+                self.watch_service.pause()
+
+    def _on_daemon_lost(self, path: str, refresh: bool, resume: bool):
+        """守护进程已退出：之后在本进程扫描，并重新开始这次分析"""
+        self.daemon = None
+        self._daemon_results.clear()
+        self._safe_stop_previous_analysis()
+        self._start_directory_analysis(path, refresh, resume)
+
+    def _on_analyzer_finished(self, result):
+        """分析线程完成，新扫描的目录树加入实时监视"""
+        if isinstance(self.analyzer, DaemonAnalyzer) and result.path:
+            self._remember_daemon_result(result)
+        if self.watch_service and result.scan_stats is not None:
+            self.watch_service.watch_trees(self.tree_cache.roots(), rescanned_path=result.path)
+        self.analysis_finished.emit(result)
+
+    def _remember_daemon_result(self, result):
+        """保存守护进程返回的结果，超出DAEMON_RESULTS时丢弃最久未用的"""
+        key = os.path.normpath(result.path)
+        self._daemon_results[key] = result
+        self._daemon_results.move_to_end(key)
+        while len(self._daemon_results) > self.DAEMON_RESULTS:
+            self._daemon_results.popitem(last=False)
+
+    def _forget_daemon_results(self, path: str):
+        """重新扫描会改变该目录、其子目录和祖先的大小，丢弃它们的本地结果"""
+        path = os.path.normpath(path)
+        for key in list(self._daemon_results):
+            if key == path or self._contains(key, path) or self._contains(path, key):
+                del self._daemon_results[key]
+
+    @staticmethod
+    def _contains(root: str, path: str) -> bool:
+        """path是否位于root之下"""
+        return path.startswith(root.rstrip(os.sep) + os.sep)
+
+    def _resume_watching(self):
+        """分析线程退出后恢复应用监视到的变化"""
+        if self.watch_service:
+            self.watch_service.resume()
 
     def _safe_stop_previous_analysis(self):
         """安全停止之前的分析"""
@@ -63,8 +233,10 @@ class AnalysisService(QObject):
                 # 断开所有连接
                 try:
                     self.analyzer.progress_updated.disconnect()
+                    self.analyzer.partial_result.disconnect()
                     self.analyzer.analysis_finished.disconnect()
                     self.analyzer.error_occurred.disconnect()
+                    self.analyzer.finished.disconnect()
                 except:
                     pass
 
@@ -75,7 +247,14 @@ class AnalysisService(QObject):
                 pass
             finally:
                 self.analyzer = None
+                self._resume_watching()
 
     def stop_analysis(self):
         """停止分析"""
         self._safe_stop_previous_analysis()
+
+    def shutdown(self):
+        """退出前停止分析和实时监视"""
+        self._safe_stop_previous_analysis()
+        if self.watch_service:
+            self.watch_service.stop()
@@ -0,0 +1,76 @@
+from typing import Dict, Iterable
+
+from PyQt5.QtCore import QObject, pyqtSignal, QTimer
+
+from config.settings import Settings
+from src.core.fs_watcher import TreeWatcher
+from src.core.scan_rules import ScanRules
+from src.models.size_node import SizeNode
+
+
+class WatchService(QObject):
+    """实时监视服务 - 按固定频率把文件系统变化合并推送给界面"""
+
+    tree_updated = pyqtSignal(list)  # 大小发生变化的目录路径列表
+
+    def __init__(self):
+        super().__init__()
+        self.watchers: Dict[str, TreeWatcher] = {}
+        self.rules = ScanRules(Settings.SCAN_EXCLUDE, Settings.SCAN_INCLUDE)
+        self._paused = False
+
+        # 定时器在界面线程中应用变化，推送频率不超过 1000 / WATCH_UPDATE_INTERVAL_MS 次每秒
+        self.timer = QTimer(self)
+        self.timer.setInterval(Settings.WATCH_UPDATE_INTERVAL_MS)
+        self.timer.timeout.connect(self._flush)
+
+    @staticmethod
+    def is_available() -> bool:
+        """是否启用并支持实时监视"""
+        return Settings.WATCH_ENABLED and TreeWatcher.is_supported()
+
+    def watch_trees(self, roots: Iterable[SizeNode], rescanned_path: str = None):
+        """监视缓存中的所有目录树，被替换或刚重新扫描过子树的树重新建立监视"""
+        roots = {root.name: root for root in roots}
+        for path in list(self.watchers):
+            root = self.watchers[path].root
+            rescanned = rescanned_path is not None and root.find(rescanned_path) is not None
+            if roots.get(path) is not root or rescanned:
+                self.watchers.pop(path).stop()
+
+        for path, root in roots.items():
+            if path not in self.watchers:
+                watcher = TreeWatcher(root, poll_interval=Settings.WATCH_POLL_INTERVAL, rules=self.rules)
+                try:
+                    watcher.start()
+                except OSError:
+                    continue
+                self.watchers[path] = watcher
+
+        if self.watchers and not self.timer.isActive():
+            self.timer.start()
+
+    def pause(self):
+        """暂停应用变化（扫描线程修改目录树期间）"""
+        self._paused = True
+
+    def resume(self):
+        """恢复应用变化"""
+        self._paused = False
+
+    def stop(self):
+        """停止所有监视"""
+        self.timer.stop()
+        for watcher in self.watchers.values():
+            watcher.stop()
+        self.watchers.clear()
+
+    def _flush(self):
+        """应用累计的变化并通知界面"""
+        if self._paused:
+            return
+        changed = []
+        for watcher in self.watchers.values():
+            changed.extend(node.path for node in watcher.apply_pending())
+        if changed:
+            self.tree_updated.emit(sorted(set(changed)))
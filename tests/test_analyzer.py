@@ -0,0 +1,1013 @@
+import errno
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from benchmarks.synthetic_tree import TreeGenerator, remove_tree
+from config.settings import Settings
+from src import cli
+from src.core.size_calculator import SizeCalculator
+from src.core.aggregators import Aggregation, create_aggregators
+from src.core.async_calculator import AdaptiveLimit, AsyncSizeCalculator
+from src.core import fs_watcher
+from src.core.duplicate_finder import DuplicateFinder
+from src.core.fs_watcher import IN_Q_OVERFLOW, TreeWatcher
+from src.core.engine import CancelToken, EVENT_FINISHED, EVENT_PARTIAL, EVENT_PROGRESS, ScanEngine, ScanOptions
+from src.core import process_calculator
+from src.core.largest_files import LargestFiles
+from src.core.process_calculator import ProcessSizeCalculator
+from src.core.progress_tracker import ProgressTracker
+from src.core.scan_profile import ScanProfile, error_type
+from src.core.scan_cache import ScanCache
+from src.core.scan_daemon import DaemonError, ScanClient, ScanDaemon
+from src.core.scan_rules import ScanRules
+from src.core.scan_scheduler import ScanBudget
+from src.core.size_estimator import SizeEstimator
+from src.core.snapshot import SnapshotError, read_snapshot
+from src.core.snapshot_diff import DIFF_ADDED, DIFF_CHANGED, DIFF_REMOVED, diff_snapshots
+from src.core.tree_cache import SizeTreeCache
+from src.models.analysis_result import AnalysisResult
+from src.models.disk_item import SIZE_ESTIMATED, SIZE_EXACT, SIZE_GROWING, SIZE_PARTIAL
+from src.models.size_node import SizeNode
+from src.models.tree_store import StoreNode, TreeStore
+
+
+def make_tree(root, dirs=3, files=4):
+    """生成 dirs x dirs 个目录、每个目录 files 个文件的测试树"""
+    total = 0
+    for i in range(dirs):
+        for j in range(dirs):
+            path = root / f"d{i}" / f"e{j}"
+            path.mkdir(parents=True)
+            for k in range(files):
+                (path / f"f{k}").write_bytes(b"x" * (k + 1))
+                total += k + 1
+    return total
+
+
+@pytest.mark.parametrize("calculator", [
+    SizeCalculator(),
+    SizeCalculator(workers=4),
+    ProcessSizeCalculator(processes=2),
+    AsyncSizeCalculator(max_concurrency=4),
+], ids=["serial", "thread", "process", "async"])
+def test_build_tree_syscall_budget(tmp_path, calculator):
+    total = make_tree(tmp_path)
+
+    tree = calculator.build_tree(str(tmp_path))
+
+    # 1个根目录 + 3个一级目录 + 9个二级目录，每个目录只打开一次，每个文件只stat一次
+    assert tree.size == total
+    assert calculator.stats.scandir_calls == 13
+    assert calculator.stats.stat_calls == 36
+    assert calculator.stats.errors == 0
+
+
+def test_build_tree_does_not_follow_symlinks(tmp_path):
+    make_tree(tmp_path, dirs=1, files=1)
+    os.symlink(tmp_path, tmp_path / "loop")
+    calculator = SizeCalculator()
+
+    tree = calculator.build_tree(str(tmp_path))
+
+    assert tree.children["loop"].item_type == "file"
+    assert calculator.stats.scandir_calls == 3
+
+
+def test_incremental_rescan_rereads_only_changed_directories(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    total = make_tree(root)
+    calculator = SizeCalculator(cache=ScanCache(str(tmp_path / "cache.db")))
+    calculator.build_tree(str(root))
+
+    (root / "d1" / "e2" / "new").write_bytes(b"x" * 100)
+    tree = calculator.build_tree(str(root))
+
+    assert tree.size == total + 100
+    assert calculator.stats.reread == 1
+    assert calculator.stats.revalidated == 12
+    assert calculator.stats.scandir_calls == 1
+
+
+def test_refresh_picks_up_files_grown_in_place(tmp_path):
+    root = tmp_path / "root"
+    total = make_tree(root)
+    cache = ScanCache(str(tmp_path / "cache.db"))
+    engine = ScanEngine(SizeTreeCache(compact=True), cache, ScanOptions(budget_seconds=None))
+    assert engine.scan(str(root)).total_size == total
+
+    # 追加写入不改变目录的mtime，只有重新扫描会重新stat文件
+    with open(root / "d0" / "e0" / "f0", "ab") as f:
+        f.write(b"x" * 1000)
+    assert engine.scan(str(root)).total_size == total
+    assert engine.scan(str(root / "d0"), refresh=True).total_size == total // 3 + 1000
+    assert engine.cached_result(str(root)).total_size == total + 1000
+
+    # 重新扫描的结果写回了持久化缓存
+    fresh = ScanEngine(SizeTreeCache(), cache, ScanOptions(budget_seconds=None))
+    assert fresh.scan(str(root)).total_size == total + 1000
+
+
+@pytest.mark.parametrize("calculator", [
+    SizeCalculator(), SizeCalculator(workers=4), ProcessSizeCalculator(processes=2), AsyncSizeCalculator(),
+])
+def test_synthetic_trap_tree_matches_generator_counts(tmp_path, calculator):
+    spec = TreeGenerator(str(tmp_path / "traps"), scale=0.2, seed=1).generate("traps")
+    try:
+        tree = calculator.build_tree(spec.root)
+        files, size = spec.reachable()
+        assert (calculator.stats.files, tree.size) == (files, size)
+        assert TreeGenerator(str(tmp_path / "again"), scale=0.2, seed=1).generate("traps").bytes == spec.bytes
+    finally:
+        remove_tree(str(tmp_path))
+
+
+def flatten(node, path=""):
+    """整棵树的 {相对路径: (类型, 大小)}"""
+    items = {path: (node.item_type, node.size)}
+    for child in node.iter_children():
+        items.update(flatten(child, os.path.join(path, child.name)))
+    return items
+
+
+@pytest.mark.parametrize("calculator", [
+    SizeCalculator(workers=4), ProcessSizeCalculator(processes=2), AsyncSizeCalculator(max_concurrency=4),
+], ids=["thread", "process", "async"])
+def test_parallel_backends_build_the_same_tree_as_serial(tmp_path, calculator):
+    make_wide_tree(tmp_path, tops=3, subdirs=10)
+    aggregators = create_aggregators(["age"])
+    serial = SizeCalculator(aggregators=aggregators)
+    calculator.aggregators = aggregators
+    expected = serial.build_tree(str(tmp_path))
+
+    tree = calculator.build_tree(str(tmp_path) + os.sep)
+
+    assert tree.name == expected.name == str(tmp_path)
+    assert flatten(tree) == flatten(expected)
+    assert calculator.stats.files == serial.stats.files
+    assert calculator.aggregation.summary(tree) == serial.aggregation.summary(expected)
+    # 同样大小的文件先后顺序取决于读取顺序，只比较大小
+    assert [size for _, size in calculator.largest.items()] == [size for _, size in serial.largest.items()]
+
+
+def test_process_worker_packed_subtree_round_trips(tmp_path):
+    make_tree(tmp_path)
+    # 非UTF-8的文件名按surrogateescape还原
+    with open(os.path.join(os.fsencode(tmp_path / "d0"), b"caf\xe9"), "wb") as f:
+        f.write(b"x" * 7)
+    aggregators = create_aggregators(["age"])
+    serial = SizeCalculator(aggregators=aggregators)
+    expected = serial.build_tree(str(tmp_path))
+
+    process_calculator._init_worker(threading.Event(), None, aggregators)
+    packed = process_calculator._walk_subtree(str(tmp_path))
+    root = SizeNode(str(tmp_path), "directory")
+    largest = LargestFiles(serial.largest.limit)
+    aggregation = Aggregation(aggregators)
+    stats = process_calculator.unpack_subtree(root, packed, largest, aggregation)
+    root.aggregate()
+    aggregation.rollup(root)
+
+    assert flatten(root) == flatten(expected)
+    assert os.fsdecode(b"caf\xe9") in root.children["d0"].children
+    assert (stats.files, stats.scandir_calls) == (serial.stats.files, serial.stats.scandir_calls)
+    assert aggregation.summary(root) == serial.aggregation.summary(expected)
+    assert [size for _, size in largest.items()] == [size for _, size in serial.largest.items()]
+
+
+def test_stopping_process_scan_defers_unmerged_partitions(tmp_path):
+    total = make_tree(tmp_path)
+    calculator = ProcessSizeCalculator(processes=2)
+    report = calculator._report_progress
+
+    def stop_after_first_partition(node, packed):
+        report(node, packed)
+        calculator.stop_calculation()
+    calculator._report_progress = stop_after_first_partition
+
+    tree = calculator.build_tree(str(tmp_path))
+
+    # 9个二级目录各为一个划分：停止前合并的保留，其余（含正在读的）记入frontier，树保持一致
+    merged = [node for top in tree.children.values() for node in top.children.values() if node.children]
+    assert merged and len(merged) + len(calculator.frontier) == 9
+    assert tree.size == sum(node.size for node in merged) < total
+    assert calculator.frontier.states[tree] == SIZE_PARTIAL
+
+    calculator.resume_tree(tree, calculator.frontier)
+    assert not calculator.frontier and tree.size == total
+
+
+def test_budget_keeps_unread_directories_and_resumes(tmp_path):
+    total = make_tree(tmp_path)
+    calculator = SizeCalculator()
+
+    tree = calculator.build_tree(str(tmp_path), ScanBudget(directories=4))
+    frontier = calculator.frontier
+
+    # 根目录和3个一级目录已读取，9个二级目录留待继续扫描
+    assert len(frontier) == 9
+    assert tree.size == 0
+    assert frontier.states[tree] == SIZE_PARTIAL
+
+    calculator.resume_tree(tree, frontier)
+
+    assert not frontier
+    assert not frontier.states
+    assert tree.size == total
+
+
+def test_budget_reads_largest_history_first_and_estimates_the_rest(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    total = make_tree(root)
+    (root / "d1" / "e0" / "big").write_bytes(b"x" * 1000)
+    calculator = SizeCalculator(cache=ScanCache(str(tmp_path / "cache.db")))
+    calculator.build_tree(str(root))
+
+    (root / "d2" / "e0" / "new").write_bytes(b"x" * 10)
+    tree = calculator.build_tree(str(root), ScanBudget(directories=2))
+
+    # 按上次的大小先读取d1，其余一级目录按历史大小估算
+    assert tree.children["d1"].children
+    assert tree.children["d0"] in calculator.frontier.pending
+    assert tree.children["d2"] in calculator.frontier.pending
+    assert len(calculator.frontier) == 5
+    assert calculator.frontier.states[tree] == SIZE_ESTIMATED
+    assert tree.size == total + 1000
+
+
+def make_wide_tree(root, tops=2, subdirs=40, files=5, seed=1):
+    """生成宽目录树：每个一级目录下有大量大小各异的二级目录，返回总大小"""
+    rng = random.Random(seed)
+    total = 0
+    for i in range(tops):
+        for j in range(subdirs):
+            path = root / f"t{i}" / f"s{j}"
+            path.mkdir(parents=True)
+            for k in range(files):
+                size = rng.randint(100, 2000)
+                (path / f"f{k}").write_bytes(b"x" * size)
+                total += size
+    return total
+
+
+def test_estimator_converges_to_exact_tree(tmp_path):
+    total = make_wide_tree(tmp_path)
+    estimator = SizeEstimator(workers=4, seed=0)
+
+    estimates = list(estimator.estimate_tree(str(tmp_path)))
+
+    assert not any(estimate.exact for estimate in estimates[:-1])
+    assert estimates[-1].exact
+    assert estimates[-1].size == total
+    assert estimates[-1].margin == 0
+    assert estimator.root.size == total
+    assert estimates[0].directories < estimates[-1].directories == 83
+
+
+def test_estimator_confidence_interval_covers_true_size(tmp_path):
+    total = make_wide_tree(tmp_path)
+    runs = 100
+    covered = 0
+    errors = []
+    for seed in range(runs):
+        estimate = next(SizeEstimator(seed=seed).estimate_tree(str(tmp_path), rates=(0.1, 1.0)))
+        low, high = estimate.interval
+        covered += low <= total <= high
+        errors.append(estimate.size - total)
+
+    # 95%区间在小样本下的实际覆盖率略低，平均估计应近似无偏
+    assert covered >= runs * 0.8
+    assert abs(sum(errors) / runs) < total * 0.03
+
+
+def test_adaptive_limit_grows_at_baseline_and_backs_off_when_queueing():
+    limit = AdaptiveLimit(initial=4, maximum=16)
+    for _ in range(200):
+        limit.observe(0.002)
+    assert limit.current == 16
+
+    for _ in range(50):
+        limit.observe(0.02)
+    assert limit.current < 16
+
+
+def test_rules_prune_excluded_directories_and_report_excluded_bytes(tmp_path):
+    total = make_tree(tmp_path)
+    (tmp_path / ".cache").mkdir()
+    (tmp_path / ".cache" / "blob").write_bytes(b"x" * 50)
+    (tmp_path / "d0" / "e0" / "keep.log").write_bytes(b"x" * 7)
+    (tmp_path / "d0" / "e1" / "drop.log").write_bytes(b"x" * 9)
+    rules = ScanRules(exclude=["d1", "*.log", "re:/d2/e[01]$"], include=["keep.log"])
+    calculator = SizeCalculator(rules=rules)
+
+    tree = calculator.build_tree(str(tmp_path))
+
+    # 隐藏目录不再被跳过；d1整棵子树和d2下的两个目录从未被打开
+    assert tree.children[".cache"].size == 50
+    assert "d1" not in tree.children
+    assert set(tree.children["d2"].children) == {"e2"}
+    assert calculator.stats.scandir_calls == 1 + 1 + 2 + 3 + 1
+    assert calculator.stats.excluded_entries == 4
+    assert calculator.stats.excluded_bytes == 9
+    assert tree.size == total - 3 * 10 - 2 * 10 + 50 + 7
+
+
+def test_changing_rules_invalidates_cached_listings(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    total = make_tree(root)
+    cache = ScanCache(str(tmp_path / "cache.db"))
+    SizeCalculator(cache=cache).build_tree(str(root))
+
+    calculator = SizeCalculator(cache=cache, rules=ScanRules(exclude=["d0"]))
+    tree = calculator.build_tree(str(root))
+
+    assert tree.size == total - 3 * 10
+    assert calculator.stats.revalidated == 0
+
+
+def test_age_rules_refilter_unchanged_directories(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    total = make_tree(root)
+    cache = ScanCache(str(tmp_path / "cache.db"))
+    assert SizeCalculator(cache=cache, rules=ScanRules(exclude=["age>1d"])).build_tree(str(root)).size == total
+
+    # 文件变旧不改变目录的mtime，按新的时刻重新过滤
+    old = time.time() - 2 * 86400
+    os.utime(root / "d1" / "e1" / "f3", (old, old))
+    calculator = SizeCalculator(cache=cache, rules=ScanRules(exclude=["age>1d"]))
+    assert calculator.build_tree(str(root)).size == total - 4
+    assert calculator.stats.excluded_bytes == 4 and calculator.stats.revalidated == 0
+
+
+def test_compact_tree_cache_matches_size_node_tree(tmp_path):
+    total = make_tree(tmp_path)
+    tree = SizeCalculator().build_tree(str(tmp_path))
+    expected = AnalysisResult.from_size_node(tree.children["d1"]).items
+    cache = SizeTreeCache(compact=True)
+    cache.store(tree)
+
+    node = cache.lookup(str(tmp_path / "d1"))
+    result = AnalysisResult.from_size_node(node)
+
+    assert isinstance(node, StoreNode)
+    assert node.parent.size == total
+    assert [(item.path, item.size) for item in result.items] == [(item.path, item.size) for item in expected]
+    assert cache.lookup(str(tmp_path / "d1" / "e0" / "f0")) is None
+
+    # 重新扫描的子树直接拼接进列式树，不还原整棵树
+    store = node.store
+    (tmp_path / "d1" / "e0" / "new").write_bytes(b"x" * 100)
+    cache.replace_subtree(SizeCalculator().build_tree(str(tmp_path / "d1")))
+
+    assert cache.lookup(str(tmp_path)).store is store and store.garbage == 15
+    assert cache.lookup(str(tmp_path)).size == total + 100
+    assert cache.lookup(str(tmp_path / "d1" / "e0")).size == 10 + 100
+    assert store.count[0] == len(store) - store.garbage - 1
+
+    # 不再可达的行超过一半时重新压缩，结果与重新扫描整棵树一致
+    for _ in range(3):
+        cache.replace_subtree(SizeCalculator().build_tree(str(tmp_path / "d2")))
+    compacted = cache.lookup(str(tmp_path)).store
+    fresh = TreeStore.from_size_node(SizeCalculator().build_tree(str(tmp_path)))
+    assert compacted is not store and compacted.garbage == 0 and len(compacted) == len(fresh)
+    for path in (tmp_path, tmp_path / "d1", tmp_path / "d2" / "e1"):
+        index = fresh.find(str(path))
+        assert [(item.path, item.size) for item in cache.result(cache.lookup(str(path))).items] == \
+            [(item.path, item.size) for item in fresh.items(index)]
+
+
+def apply_until(watcher, condition, timeout=10):
+    """反复应用监视到的变化直到condition成立"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "监视的变化未在限定时间内应用"
+        watcher.apply_pending()
+        time.sleep(0.02)
+
+
+def assert_tree_matches_disk(root):
+    fresh = SizeCalculator().build_tree(root.name)
+    assert root.size == fresh.size
+    stack = [(root, fresh)]
+    while stack:
+        node, expected = stack.pop()
+        assert {name: child.size for name, child in node.children.items()} == \
+            {name: child.size for name, child in expected.children.items()}, node.path
+        stack.extend((child, expected.children[name]) for name, child in node.children.items() if child.is_directory)
+
+
+watcher_only = pytest.mark.skipif(not TreeWatcher.is_supported(), reason="需要inotify")
+
+
+@watcher_only
+def test_tree_watcher_reconciles_creates_deletes_and_moves(tmp_path):
+    base = tmp_path / "root"
+    total = make_tree(base)
+    root = SizeCalculator().build_tree(str(base))
+    watcher = TreeWatcher(root, poll_interval=60)
+    watcher.start()
+    try:
+        assert watcher.wait_ready(10) and watcher.watched_count == 13
+
+        (base / "d0" / "e0" / "new").write_bytes(b"x" * 100)
+        os.remove(base / "d0" / "e0" / "f0")
+        apply_until(watcher, lambda: root.size == total + 99)
+
+        # 新目录在后台线程中扫描，完成后挂到树上并加入监视
+        (base / "d2" / "new").mkdir()
+        (base / "d2" / "new" / "g").write_bytes(b"x" * 50)
+        apply_until(watcher, lambda: root.find(str(base / "d2" / "new")) is not None and root.size == total + 149)
+        (base / "d2" / "new" / "h").write_bytes(b"x" * 7)
+        apply_until(watcher, lambda: root.size == total + 156)
+
+        # 树内移动直接搬移节点，原有的watch继续有效
+        moved = root.find(str(base / "d1" / "e1"))
+        os.rename(base / "d1" / "e1", base / "d2" / "moved")
+        apply_until(watcher, lambda: root.find(str(base / "d2" / "moved")) is moved)
+        assert root.find(str(base / "d1" / "e1")) is None and root.size == total + 156
+        (base / "d2" / "moved" / "f9").write_bytes(b"x" * 3)
+        apply_until(watcher, lambda: root.size == total + 159)
+
+        shutil.rmtree(base / "d0")
+        apply_until(watcher, lambda: "d0" not in root.children)
+        assert_tree_matches_disk(root)
+    finally:
+        watcher.stop()
+
+
+@watcher_only
+def test_tree_watcher_resyncs_in_batches_after_queue_overflow(tmp_path):
+    base = tmp_path / "root"
+    make_tree(base)
+    root = SizeCalculator().build_tree(str(base))
+    watcher = TreeWatcher(root, poll_interval=60)
+    watcher.start()
+    assert watcher.wait_ready(10)
+    watcher.stop()
+
+    # 监视停止后的变化不会产生事件，只能靠溢出后的重新同步发现
+    with open(base / "d1" / "e1" / "f0", "ab") as f:
+        f.write(b"x" * 20)
+    os.remove(base / "d2" / "e2" / "f3")
+    shutil.rmtree(base / "d0" / "e1")
+    (base / "d2" / "extra").write_bytes(b"x" * 5)
+    watcher._collect([(0, IN_Q_OVERFLOW, 0, "")])
+
+    watcher.RESYNC_BATCH = 4
+    calls = 0
+    while True:
+        watcher.apply_pending()
+        calls += 1
+        if not watcher._resync_stack:
+            break
+    assert calls == 3  # 11个目录，每次最多读取4个
+    assert_tree_matches_disk(root)
+
+
+@watcher_only
+def test_tree_watcher_falls_back_to_polling_when_watches_run_out(tmp_path, monkeypatch):
+    class LimitedInotify(fs_watcher.Inotify):
+        """只允许添加一个watch，之后与max_user_watches耗尽时一样返回ENOSPC"""
+        remaining = 1
+
+        def add_watch(self, path, mask=fs_watcher.WATCH_MASK):
+            if self.remaining <= 0:
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+            self.remaining -= 1
+            return super().add_watch(path, mask)
+
+    monkeypatch.setattr(fs_watcher, "Inotify", LimitedInotify)
+    base = tmp_path / "root"
+    total = make_tree(base)
+    root = SizeCalculator().build_tree(str(base))
+    watcher = TreeWatcher(root, poll_interval=0.05)
+    watcher.start()
+    try:
+        assert watcher.wait_ready(10)
+        assert (watcher.watched_count, watcher.polled_count) == (1, 12)
+
+        (base / "d1" / "e2" / "new").write_bytes(b"x" * 100)
+        apply_until(watcher, lambda: root.size == total + 100)
+        (base / "d2" / "sub").mkdir()
+        (base / "d2" / "sub" / "g").write_bytes(b"x" * 9)
+        apply_until(watcher, lambda: root.size == total + 109)
+        assert watcher.polled_count == 13
+        assert_tree_matches_disk(root)
+    finally:
+        watcher.stop()
+
+
+def test_largest_files_are_tracked_during_scan(tmp_path):
+    make_tree(tmp_path)
+    (tmp_path / "d2" / "e1" / "big").write_bytes(b"x" * 500)
+    (tmp_path / "d0" / "huge").write_bytes(b"x" * 900)
+    calculator = SizeCalculator(workers=4)
+    calculator.LARGEST_FILES = 3
+    tree = calculator.build_tree(str(tmp_path))
+    cache = SizeTreeCache(compact=True)
+    cache.store(tree, largest=calculator.largest)
+
+    largest = calculator.largest.items()
+    assert largest[:2] == [(str(tmp_path / "d0" / "huge"), 900), (str(tmp_path / "d2" / "e1" / "big"), 500)]
+    assert len(largest) == 3 and largest[2][1] == 4
+    assert cache.largest_files(cache.lookup(str(tmp_path / "d2"))) == [(str(tmp_path / "d2" / "e1" / "big"), 500)]
+
+
+@pytest.mark.parametrize("backend", [SizeCalculator, ProcessSizeCalculator], ids=["serial", "process"])
+@pytest.mark.parametrize("compact", [False, True], ids=["nodes", "compact"])
+def test_aggregators_roll_up_and_follow_subtree_rescans(tmp_path, backend, compact):
+    root = tmp_path / "root"
+    root.mkdir()
+    total = make_tree(root)
+    (root / "d1" / "e0" / "photo.JPG").write_bytes(b"x" * 1000)
+    calculator = backend(aggregators=create_aggregators(["extension", "size_histogram"]))
+    tree = calculator.build_tree(str(root))
+    cache = SizeTreeCache(compact=compact)
+    cache.store(tree, aggregation=calculator.aggregation)
+    # 状态按节点（压缩后按编号）保存，不保存路径
+    assert not any(isinstance(key, str) for key in cache.aggregation(cache.lookup(str(root))).states)
+
+    extensions = cache.aggregates(cache.lookup(str(root)))["extension"]
+    assert extensions == [(".jpg", 1, 1000), ("(无扩展名)", 36, total)]
+    histogram = cache.aggregates(cache.lookup(str(root / "d1" / "e0")))["size_histogram"]
+    assert histogram == [("1 B - 2 B", 1, 1), ("2 B - 4 B", 2, 5), ("4 B - 8 B", 1, 4), ("512 B - 1 KB", 1, 1000)]
+
+    (root / "d1" / "e0" / "photo.JPG").unlink()
+    rescan = SizeCalculator(aggregators=create_aggregators(["extension", "size_histogram"]))
+    cache.replace_subtree(rescan.build_tree(str(root / "d1")), aggregation=rescan.aggregation)
+
+    assert cache.aggregates(cache.lookup(str(root)))["extension"] == [("(无扩展名)", 36, total)]
+    assert cache.aggregates(cache.lookup(str(root / "d1" / "e0")))["extension"] == [("(无扩展名)", 4, 10)]
+    assert cache.aggregates(cache.lookup(str(root / "d2")))["extension"] == [("(无扩展名)", 12, total // 3)]
+
+
+def test_age_aggregator_ranks_cold_subtrees_without_extra_stats(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(root)
+    old = time.time() - 2 * 365 * 86400
+    for path in [root / "d2" / "e0" / "f0", root / "d2" / "e1" / "f3", root / "d0" / "e2" / "f1"]:
+        os.utime(path, (old, old))
+    # 只是修改时间旧、最近访问过的文件不算冷数据
+    os.utime(root / "d1" / "e0" / "f3", (time.time(), old))
+    scan_cache = ScanCache(str(tmp_path / "cache.db"))
+    plain = SizeCalculator()
+    plain.build_tree(str(root))
+
+    for _ in range(2):  # 第二次目录未变化，时间来自持久化缓存
+        calculator = SizeCalculator(cache=scan_cache, aggregators=create_aggregators(["age"]))
+        tree = calculator.build_tree(str(root))
+        cache = SizeTreeCache(compact=True)
+        cache.store(tree, aggregation=calculator.aggregation)
+
+        cold = cache.result(cache.lookup(str(root))).cold_items
+        assert [(item.name, item.size) for item in cold] == [("d2", 1 + 4), ("d0", 2)]
+        assert cache.aggregates(cache.lookup(str(root)))["age"][0] == ("超过365天未访问且未修改", 3, 7)
+    assert calculator.stats.stat_calls <= plain.stats.stat_calls
+
+
+def test_duplicate_finder_narrows_by_size_then_partial_then_full_hash(tmp_path):
+    block = DuplicateFinder.PARTIAL_BYTES
+    content = b"a" * block + b"middle" + b"z" * block
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "copy1").write_bytes(content)
+    (tmp_path / "copy2").write_bytes(content)
+    # 首尾相同、中间不同：首尾摘要阶段无法排除，需要全文摘要
+    (tmp_path / "a" / "same_ends").write_bytes(content.replace(b"middle", b"MIDDLE"))
+    os.link(tmp_path / "copy2", tmp_path / "hardlink")
+    (tmp_path / "small1").write_bytes(b"xyz")
+    (tmp_path / "small2").write_bytes(b"xyz")
+    (tmp_path / "unique").write_bytes(b"q" * 100)
+    tree = SizeCalculator().build_tree(str(tmp_path))
+    cache = ScanCache(str(tmp_path.parent / "hashes.db"))
+
+    report = DuplicateFinder(cache=cache).find(tree)
+
+    assert [(group.paths, group.reclaimable) for group in report.groups] == [
+        ([str(tmp_path / "a" / "copy1"), str(tmp_path / "copy2")], len(content)),
+        ([str(tmp_path / "small1"), str(tmp_path / "small2")], 3)]
+    assert report.reclaimable == len(content) + 3
+    assert report.candidates == 6
+    assert report.full_hashed == 3
+
+    report = DuplicateFinder(cache=cache).find(tree)
+
+    assert report.bytes_read == 0
+    assert report.reclaimable == len(content) + 3
+
+
+def test_cli_dupes_writes_groups_and_reclaimable_bytes(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(Settings, "SCAN_CACHE_FILE", str(tmp_path / "scan_cache.db"))
+    root = tmp_path / "root"
+    (root / "a").mkdir(parents=True)
+    (root / "a" / "copy1").write_bytes(b"x" * 50)
+    (root / "copy2").write_bytes(b"x" * 50)
+    (root / "other").write_bytes(b"y" * 50)
+
+    assert cli.main(["dupes", str(root), "--json"]) == cli.EXIT_OK
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [(record["type"], record.get("paths")) for record in records] == [
+        ("group", [str(root / "a" / "copy1"), str(root / "copy2")]), ("summary", None)]
+    assert records[0]["reclaimable"] == 50 and records[-1]["reclaimable"] == 50
+    assert records[-1]["groups"] == 1 and records[-1]["candidates"] == 3
+
+    # 第二次运行时摘要来自扫描缓存
+    assert cli.main(["dupes", str(root), "--json"]) == cli.EXIT_OK
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert summary["reclaimable"] == 50 and summary["bytes_read"] == 0 and summary["cache_hits"] == 3
+
+
+def test_progress_tracker_coalesces_updates_and_estimates_remaining_time():
+    now = [100.0]
+    updates = []
+    tracker = ProgressTracker(updates.append, interval=0.1, expected_entries=1000, clock=lambda: now[0])
+
+    # 每10ms读完一个目录（10个条目），回调合并到每100ms一次，第一个目录立即回调
+    for _ in range(50):
+        now[0] += 0.01
+        tracker.add(10, 100)
+    assert len(updates) == 5
+    assert [info.entries for info in updates] == [10, 110, 210, 310, 410]
+    last = updates[-1]
+    assert last.percent == 41 and last.entries_per_second == pytest.approx(1000)
+    assert last.eta == pytest.approx(0.59)
+
+    # 超过历史条目数后保持99%，剩余时间为0
+    for _ in range(60):
+        now[0] += 0.01
+        tracker.add(10, 100)
+    assert updates[-1].percent == 99 and updates[-1].eta == 0
+    assert ProgressTracker(updates.append, clock=lambda: now[0]).snapshot().percent is None
+
+
+def test_scan_engine_runs_without_qt_and_honours_cancellation(tmp_path):
+    total = make_tree(tmp_path)
+    engine = ScanEngine(SizeTreeCache(), options=ScanOptions(progress_interval=0))
+
+    events = list(engine.iter_scan(str(tmp_path)))
+    assert events[-1].kind == EVENT_FINISHED and events[-1].result.total_size == total
+    assert any(event.kind == EVENT_PROGRESS and event.progress is not None for event in events)
+    sizes = {item.name: item.size for item in events[-1].result.items}
+    assert engine.cached_result(str(tmp_path / "d1")).total_size == sizes["d1"]
+
+    token = CancelToken()
+    token.cancel()
+    received = []
+    assert engine.scan(str(tmp_path), refresh=True, token=token, on_event=received.append) is None
+    assert received == []
+
+    job = engine.start(str(tmp_path / "d2"), refresh=True)
+    assert job.wait(5).total_size == engine.cached_result(str(tmp_path / "d2")).total_size
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_streaming_snapshots_only_grow_and_merge_into_the_list_in_place(tmp_path, monkeypatch, backend):
+    total = make_tree(tmp_path, dirs=4)
+    engine = ScanEngine(SizeTreeCache(), options=ScanOptions(backend=backend, stream_interval=0))
+    events = list(engine.iter_scan(str(tmp_path)))
+    partials = [event.result for event in events if event.kind == EVENT_PARTIAL]
+    final = events[-1].result
+
+    assert events[-1].kind == EVENT_FINISHED and final.total_size == total
+    assert partials and all(result.is_partial for result in partials)
+    assert any(item.size_state == SIZE_GROWING for item in partials[0].items)
+    sizes = {}
+    for result in partials + [final]:
+        assert result.total_size >= sizes.get(None, 0)
+        sizes[None] = result.total_size
+        for item in result.items:
+            assert item.size >= sizes.get(item.name, 0)
+            sizes[item.name] = item.size
+            assert item.size_state in (SIZE_EXACT, SIZE_GROWING)
+    # 已完成的子目录不再变化，最终结果全部精确
+    assert all(item.size_state == SIZE_EXACT for item in final.items)
+    exact = {item.name: item.size for item in final.items}
+    for result in partials:
+        for item in result.items:
+            if item.size_state == SIZE_EXACT:
+                assert item.size == exact[item.name]
+
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from src.gui.components.list_widget import DirectoryListWidget
+    app = QApplication.instance() or QApplication([])
+    widget = DirectoryListWidget()
+    widget.update_list(partials[0])
+    rows = dict(widget._rows)
+    for result in partials[1:] + [final]:
+        widget.update_list(result)
+    assert all(widget._rows[path] is row for path, row in rows.items())
+    assert [widget.item(i).text() for i in range(widget.count())] == [item.display_name for item in final.items]
+    widget.deleteLater()
+    app.processEvents()
+
+
+@pytest.mark.parametrize("backend", ["thread", "process", "async"])
+def test_scan_profile_reports_phases_workers_and_queue_depth(tmp_path, backend):
+    total = make_tree(tmp_path)
+    engine = ScanEngine(SizeTreeCache(), options=ScanOptions(backend=backend, profile=True))
+
+    result = engine.scan(str(tmp_path))
+    report = result.profile
+
+    assert result.total_size == total
+    assert json.loads(json.dumps(report))["backend"] == type(engine.job().calculator).__name__
+    assert {"scandir", "stat", "merge", "rollup"} <= set(report["phases"])
+    assert report["phases"]["stat"]["count"] == report["counts"]["stat_calls"] == 36
+    assert sum(worker["directories"] for worker in report["workers"]) == report["counts"]["directories"] == 13
+    assert report["queue"]["samples"] > 0
+    assert "\n".join(ScanProfile.format_report(report))
+    assert error_type(PermissionError(errno.EACCES, "denied")) == "EACCES"
+
+    plain = ScanEngine(SizeTreeCache(), options=ScanOptions(backend=backend))
+    assert plain.scan(str(tmp_path)).profile is None and plain.job().calculator.profile is None
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "lzma"])
+def test_snapshot_round_trips_and_opens_memory_mapped(tmp_path, compression):
+    root = tmp_path / "root"
+    total = make_tree(root)
+    engine = ScanEngine(SizeTreeCache(), options=ScanOptions())
+    result = engine.scan(str(root))
+    file = str(tmp_path / "scan.nsnap")
+    assert engine.save_snapshot(str(root), file, compression=compression) == os.path.getsize(file)
+
+    viewer = ScanEngine(SizeTreeCache(), options=ScanOptions())
+    snapshot, opened = viewer.open_snapshot(file)
+    assert snapshot.mapped == (compression == "none") and snapshot.root == str(root)
+    assert snapshot.complete and snapshot.largest_files[0][1] == 4
+    assert opened.total_size == total
+    assert [(item.name, item.size) for item in opened.items] == [(item.name, item.size) for item in result.items]
+    assert viewer.cached_result(str(root / "d1")).total_size == total // 3
+
+    # 截断的副本（不改动已映射的原文件）
+    data = (tmp_path / "scan.nsnap").read_bytes()
+    (tmp_path / "cut.nsnap").write_bytes(data[:len(data) // 2])
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(tmp_path / "cut.nsnap"))
+    (tmp_path / "junk.nsnap").write_bytes(b"x" * 100)
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(tmp_path / "junk.nsnap"))
+
+
+def test_snapshot_diff_skips_unchanged_subtrees_and_ranks_growers(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(Settings, "SCAN_AGGREGATORS", ["age", "fingerprint"])
+    root = tmp_path / "root"
+    make_tree(root)
+    engine = ScanEngine(SizeTreeCache(compact=True), options=ScanOptions())
+    engine.scan(str(root))
+    old = str(tmp_path / "old.nsnap")
+    engine.save_snapshot(str(root), old)
+
+    (root / "d1" / "e2" / "big").write_bytes(b"x" * 1000)
+    for name in os.listdir(root / "d0" / "e1"):
+        os.remove(root / "d0" / "e1" / name)
+    os.rmdir(root / "d0" / "e1")
+    os.utime(root / "d2" / "e0" / "f0", (1, 1))  # 只改修改时间
+    engine = ScanEngine(SizeTreeCache(), options=ScanOptions())
+    engine.scan(str(root))
+    diff = engine.diff_snapshot(old)
+
+    assert diff.root.delta == 1000 - 10
+    assert [(entry.path, entry.status) for entry in diff.top_growers()] == [(str(root / "d1" / "e2" / "big"), DIFF_ADDED)]
+    assert [(entry.path, entry.status) for entry in diff.top_shrinkers()] == [(str(root / "d0" / "e1"), DIFF_REMOVED)]
+    # 修改时间变化使指纹不同，但大小不变的目录不列入变化的子项
+    assert diff.entry(str(root / "d2" / "e0")).status == DIFF_CHANGED
+    assert str(root / "d2") not in [entry.path for entry in diff.changes[str(root)]]
+    # 未变化的子树不展开
+    assert diff.entry(str(root / "d1" / "e0")) is None and diff.skipped >= 5
+    assert diff.compared < 2 * len(diff.entries) + 10
+
+    result = diff.result(str(root))
+    assert [(item.name, item.size_delta) for item in result.items] == [("d1", 1000), ("d0", -10)]
+    assert result.total_size == 1000
+    assert not diff.result(str(root / "d0")).items[0].is_clickable
+
+    new = str(tmp_path / "new.nsnap")
+    engine.save_snapshot(str(root), new)
+    assert sorted(diff_snapshots(read_snapshot(old), read_snapshot(new)).entries) == sorted(diff.entries)
+    assert cli.main(["diff", old, new, "--json"]) == cli.EXIT_OK
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[0]["type"] == "diff" and records[0]["delta"] == 990
+    assert [record["delta"] for record in records[1:]] == [1000, -10]
+
+
+def test_snapshot_diff_of_a_tree_that_only_shrank(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    total = make_tree(root)
+    engine = ScanEngine(SizeTreeCache(compact=True), options=ScanOptions())
+    engine.scan(str(root))
+    old = str(tmp_path / "old.nsnap")
+    engine.save_snapshot(str(root), old)
+
+    os.remove(root / "d1" / "e0" / "f3")
+    (root / "d1" / "e1" / "f3").write_bytes(b"x")
+    engine = ScanEngine(SizeTreeCache(compact=True), options=ScanOptions())
+    engine.scan(str(root))
+    diff = engine.diff_snapshot(old)
+
+    assert diff.root.delta == -7 and engine.cached_result(str(root)).total_size == total - 7
+    result = diff.result(str(root / "d1"))
+    assert result.total_size == 0
+    assert [(item.name, item.size, item.size_delta) for item in result.items] == [("e1", 0, -3), ("e0", 0, -4)]
+
+    pytest.importorskip("PyQt5")
+    pytest.importorskip("matplotlib")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from src.gui.components.chart_widget import ChartWidget
+    app = QApplication.instance() or QApplication([])
+    chart = ChartWidget()
+    chart.load_canvas()
+    chart.update_chart(result)
+    assert chart.chart_title.text() == "没有增长"
+    chart.deleteLater()
+    app.processEvents()
+
+
+def test_cli_scan_streams_ndjson_and_reports_exit_codes(tmp_path, capsys):
+    total = make_tree(tmp_path)
+
+    assert cli.main(["scan", str(tmp_path), "--json", "--depth", "1", "--no-cache", "-q"]) == cli.EXIT_OK
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[0]["type"] == "start" and records[-1]["type"] == "summary"
+    assert records[-1]["size"] == total and records[-1]["exit_code"] == cli.EXIT_OK
+    entries = [(record["path"], record["depth"]) for record in records if record["type"] == "entry"]
+    assert entries[0] == (str(tmp_path), 0)
+    assert sorted(entries[1:]) == [(str(tmp_path / f"d{i}"), 1) for i in range(3)]
+
+    assert cli.main(["scan", str(tmp_path / "missing"), "--json"]) == cli.EXIT_ERROR
+    assert json.loads(capsys.readouterr().out)["type"] == "error"
+
+
+def test_cli_does_not_import_qt():
+    code = "import sys, src.cli; print(sorted(m for m in sys.modules if m.startswith(('PyQt5', 'matplotlib'))))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_gui_import_defers_matplotlib():
+    pytest.importorskip("PyQt5")
+    code = "import sys, src.gui.main_window; print(sorted(m for m in sys.modules if m.startswith(('matplotlib', 'psutil'))))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+@pytest.mark.skipif(not ScanDaemon.is_available(), reason="需要Unix套接字")
+def test_scan_daemon_shares_one_scan_between_concurrent_clients(tmp_path):
+    root = tmp_path / "root"
+    total = make_tree(root)
+    engine = ScanEngine(SizeTreeCache(compact=True), options=ScanOptions(progress_interval=0))
+    daemon = ScanDaemon(str(tmp_path / "scan.sock"), engine).start()
+    try:
+        client = ScanClient(daemon.socket_path, timeout=10)
+        assert client.children(str(root)) is None
+
+        # 扫描被阻塞期间到达的同一路径及其子目录的请求都等待同一次扫描
+        results = {}
+        paths = [str(root)] * 3 + [str(root / "d1"), str(root / "d1" / "e2")]
+        threads = [threading.Thread(target=lambda i, path: results.__setitem__(i, client.scan(path)), args=item)
+                   for item in enumerate(paths)]
+
+        def wait_for_clients(count):
+            deadline = time.monotonic() + 10
+            while sum(flight["clients"] for flight in client.ping()["in_flight"]) < count:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+        with daemon._scan_lock:
+            # 子目录的请求只加入已在进行的扫描，先等根目录的扫描登记
+            threads[0].start()
+            wait_for_clients(1)
+            for thread in threads[1:]:
+                thread.start()
+            wait_for_clients(len(paths))
+            assert len(client.ping()["in_flight"]) == 1
+        for thread in threads:
+            thread.join()
+        assert daemon.scans == 1
+        assert [results[i].total_size for i in range(3)] == [total] * 3
+        assert results[3].path == str(root / "d1") and results[4].total_size == 10
+
+        assert client.children(str(root / "d2")).total_size == total // 3
+        top = client.top(str(root), limit=2)
+        assert [size for _, size in top["largest_files"]] == [4, 4]
+        assert len(top["children"]) == 2
+        assert daemon.scans == 1 and client.ping()["roots"] == [str(root)]
+
+        (root / "d0" / "new").write_bytes(b"x" * 100)
+        assert client.scan(str(root), refresh=True).total_size == total + 100
+        assert daemon.scans == 2
+        with pytest.raises(DaemonError):
+            client.request("unknown")
+    finally:
+        daemon.shutdown()
+    assert not os.path.exists(daemon.socket_path)
+    with pytest.raises(DaemonError):
+        ScanClient(daemon.socket_path, timeout=1).ping()
+
+
+def test_analysis_service_queries_the_daemon_off_the_gui_thread(tmp_path, monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from src.services.analysis_service import AnalysisService
+    root = tmp_path / "root"
+    total = make_tree(root)
+    monkeypatch.setattr(Settings, "SCAN_CACHE_ENABLED", False)
+    app = QApplication.instance() or QApplication([])
+
+    # 接受连接却不应答的守护进程不阻塞启动，应答前在本进程扫描
+    hung = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    hung.bind(str(tmp_path / "hung.sock"))
+    hung.listen(1)
+    monkeypatch.setattr(Settings, "SCAN_DAEMON_SOCKET", str(tmp_path / "hung.sock"))
+    started = time.monotonic()
+    assert AnalysisService().daemon is None
+    assert time.monotonic() - started < 1
+    hung.close()
+
+    daemon = ScanDaemon(str(tmp_path / "scan.sock"), ScanEngine(SizeTreeCache(compact=True))).start()
+    monkeypatch.setattr(Settings, "SCAN_DAEMON_SOCKET", daemon.socket_path)
+    try:
+        service = AnalysisService()
+        service._daemon_probe.join(5)
+        assert service.daemon is not None
+        gui_thread = threading.current_thread()
+        calls = []
+        request = ScanClient.request
+
+        def record(self, op, *args, **kwargs):
+            calls.append(threading.current_thread() is gui_thread)
+            return request(self, op, *args, **kwargs)
+        monkeypatch.setattr(ScanClient, "request", record)
+        finished = []
+        service.analysis_finished.connect(finished.append)
+
+        def analyze(path, start=service.analyze_directory):
+            count = len(finished)
+            start(str(path))
+            deadline = time.monotonic() + 10
+            while len(finished) == count:
+                assert time.monotonic() < deadline
+                app.processEvents()
+                time.sleep(0.01)
+            return finished[-1]
+
+        assert analyze(root).total_size == total
+        assert service.cached_result(str(root / "d1")) is None
+        assert analyze(root / "d1").total_size == total // 3
+        assert service.cached_result(str(root / "d1")).total_size == total // 3
+        assert calls and not any(calls) and daemon.scans == 1
+
+        # 已取得的目录再次进入时在界面线程直接返回，重新扫描后丢弃该目录及其祖先的本地结果
+        requests = len(calls)
+        service.analyze_directory(str(root))
+        assert finished[-1].path == str(root) and len(calls) == requests
+        (root / "d1" / "new").write_bytes(b"x" * 100)
+        assert analyze(root / "d1", service.refresh_directory).total_size == total // 3 + 100
+        assert analyze(root).total_size == total + 100 and daemon.scans == 2
+
+        # 守护进程退出后改为在本进程扫描
+        daemon.shutdown()
+        assert analyze(root / "d2").total_size == total // 3
+        assert service.daemon is None and service.engine.cached_result(str(root / "d2")) is not None
+        service.shutdown()
+    finally:
+        daemon.shutdown()
+    app.processEvents()
+
+
+def test_default_daemon_socket_lives_in_a_private_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    daemon = ScanDaemon(engine=ScanEngine(SizeTreeCache())).start()
+    try:
+        directory = os.path.dirname(daemon.socket_path)
+        assert os.path.dirname(directory) == str(tmp_path)
+        assert os.stat(directory).st_mode & 0o777 == 0o700
+        assert ScanClient(timeout=5).ping()["roots"] == []
+
+        # 其他用户可访问的目录中的套接字可能是冒充的，客户端拒绝连接
+        os.chmod(directory, 0o755)
+        with pytest.raises(DaemonError, match="拒绝使用"):
+            ScanClient(timeout=5).ping()
+    finally:
+        daemon.shutdown()
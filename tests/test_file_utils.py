@@ -0,0 +1,29 @@
+import os
+
+from src.core.file_utils import FileUtils
+from src.models.scan_stats import ScanStats
+
+
+def test_scan_directory_counts_one_scandir(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"abc")
+    (tmp_path / "sub").mkdir()
+    stats = ScanStats()
+
+    names = sorted(entry.name for entry in FileUtils.scan_directory(str(tmp_path), stats))
+
+    assert names == ["a.txt", "sub"]
+    assert stats.scandir_calls == 1
+    assert stats.stat_calls == 0
+
+
+def test_entry_stat_does_not_follow_symlinks(tmp_path):
+    target = tmp_path / "big.bin"
+    target.write_bytes(b"x" * 4096)
+    os.symlink(target, tmp_path / "link")
+    stats = ScanStats()
+
+    entries = {entry.name: entry for entry in FileUtils.scan_directory(str(tmp_path), stats)}
+    link_size = FileUtils.entry_stat(entries["link"], stats).st_size
+
+    assert link_size == os.lstat(tmp_path / "link").st_size
+    assert stats.stat_calls == 1